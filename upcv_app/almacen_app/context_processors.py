@@ -1,40 +1,74 @@
 # context_processors.py
-from .models import FraseMotivacional
+# Todo se evalúa de forma perezosa: una página que no usa la variable no consulta nada,
+# y lo que sí se usa sale de la caché compartida (ver signals.py para la invalidación).
 import random
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from . import roles
+from .models import FraseMotivacional, Institucion
+
+CLAVE_FRASE = 'almacen:frase:{fecha}'
+
+# Marca guardada en caché cuando no hay frase, para no volver a consultar.
+SIN_VALOR = 'sin-valor'
+
+
+def _segundos_hasta_manana():
+    ahora = timezone.localtime()
+    manana = timezone.make_aware(datetime.combine(ahora.date() + timedelta(days=1), time.min))
+    return max(int((manana - ahora).total_seconds()), 1)
+
+
+def _elegir_frase():
+    # Un id al azar dentro del rango y el siguiente existente: usa el índice de la PK
+    # en vez de cargar toda la tabla.
+    rango = FraseMotivacional.objects.aggregate(minimo=Min('id'), maximo=Max('id'))
+    if rango['minimo'] is None:
+        return None
+    elegido = random.randint(rango['minimo'], rango['maximo'])
+    return FraseMotivacional.objects.filter(id__gte=elegido).order_by('id').first()
+
+
+def obtener_frase_del_dia():
+    clave = CLAVE_FRASE.format(fecha=timezone.localdate().isoformat())
+    frase = cache.get(clave)
+    if frase is None:
+        frase = _elegir_frase() or SIN_VALOR
+        cache.set(clave, frase, _segundos_hasta_manana())
+    return None if frase == SIN_VALOR else frase
+
+
+def invalidar_frase_del_dia():
+    cache.delete(CLAVE_FRASE.format(fecha=timezone.localdate().isoformat()))
+
 
 def frase_del_dia(request):
-    # Obtener todas las frases
-    frases = FraseMotivacional.objects.all()
-    
-    # Verificar si hay frases disponibles
-    if frases.exists():
-        frase = random.choice(frases)
-    else:
-        # Si no hay frases, puedes devolver un valor predeterminado o None
-        frase = None
-    
     return {
-        'frase_del_dia': frase
+        'frase_del_dia': SimpleLazyObject(obtener_frase_del_dia),
     }
 
+
 def grupo_usuario(request):
     if not request.user.is_authenticated:
         return {}
+
+    def grupos():
+        return roles.grupos(request.user, request)
+
     return {
-        'es_departamento': request.user.groups.filter(name='Departamento').exists(),
-        'es_administrador': request.user.groups.filter(name='Administrador').exists(),
-        'es_almacen': request.user.groups.filter(name='Almacen').exists(),
+        'grupos_usuario': SimpleLazyObject(lambda: sorted(grupos())),
+        'es_departamento': SimpleLazyObject(lambda: roles.DEPARTAMENTO in grupos()),
+        'es_administrador': SimpleLazyObject(lambda: roles.ADMINISTRADOR in grupos()),
+        'es_almacen': SimpleLazyObject(lambda: roles.ALMACEN in grupos()),
     }
 
 
-from .models import Institucion
-
 def datos_institucion(request):
-    try:
-        institucion = Institucion.objects.first()
-    except Institucion.DoesNotExist:
-        institucion = None
-
     return {
-        'institucion': institucion
+        'institucion': SimpleLazyObject(Institucion.obtener)
     }
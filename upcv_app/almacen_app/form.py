@@ -42,6 +42,18 @@ class InstitucionForm(forms.ModelForm):
             url = 'http://' + url
         return url
 
+    def save(self, commit=True):
+        institucion = super().save(commit)
+        if commit:
+            # Solo se regeneran las variantes de PDF de los logos que cambiaron o que aún no tienen
+            campos = [
+                campo for campo in ('logo', 'logo2')
+                if campo in self.changed_data or (getattr(institucion, campo) and not getattr(institucion, f'{campo}_pdf'))
+            ]
+            if campos:
+                institucion.generar_logos_pdf(campos)
+        return institucion
+
 
         
 class PerfilForm(forms.ModelForm):
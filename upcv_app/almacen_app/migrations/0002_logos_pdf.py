@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('almacen_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='institucion',
+            name='logo2_pdf',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='logos/pdf/'),
+        ),
+        migrations.AddField(
+            model_name='institucion',
+            name='logo_pdf',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='logos/pdf/'),
+        ),
+    ]
@@ -7,6 +7,38 @@ from django.dispatch import receiver
 from django.urls import reverse
 from django.db.models import Sum
 from django.db.models.signals import post_save
+from django.core.files.base import ContentFile
+from django.utils.functional import cached_property
+from io import BytesIO
+from pathlib import PurePath
+from PIL import Image
+import threading
+
+from . import versiones
+
+
+# Alto en píxeles de los logos usados en PDF (unos 60px CSS impresos a 300 ppp)
+ALTO_LOGO_PDF = 180
+
+
+def variante_logo_pdf(archivo, alto=ALTO_LOGO_PDF):
+    """Devuelve (nombre, contenido) del logo reducido y comprimido para incrustarlo en PDF."""
+    with archivo.open('rb'):
+        imagen = Image.open(archivo)
+        imagen.load()
+    if imagen.height > alto:
+        imagen = imagen.resize((max(1, round(imagen.width * alto / imagen.height)), alto), Image.LANCZOS)
+
+    salida = BytesIO()
+    transparente = imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info)
+    if transparente:
+        imagen.convert('RGBA').save(salida, 'PNG', optimize=True)
+        extension = 'png'
+    else:
+        imagen.convert('RGB').save(salida, 'JPEG', quality=85, optimize=True)
+        extension = 'jpg'
+    nombre = f'{PurePath(archivo.name).stem}_pdf.{extension}'
+    return nombre, ContentFile(salida.getvalue())
 
 
 class Institucion(models.Model):
@@ -16,10 +48,68 @@ class Institucion(models.Model):
     pagina_web = models.URLField(blank=True, null=True)
     logo = models.ImageField(upload_to='logos/', blank=True, null=True)
     logo2 = models.ImageField(upload_to='logos/', blank=True, null=True)
+    # Variantes derivadas de logo/logo2 para los PDF; se generan al guardar InstitucionForm
+    logo_pdf = models.ImageField(upload_to='logos/pdf/', blank=True, null=True, editable=False)
+    logo2_pdf = models.ImageField(upload_to='logos/pdf/', blank=True, null=True, editable=False)
+
+    # Caché del singleton en este proceso: (versión, instancia). La versión vive en la caché
+    # compartida y cambia con cada save/delete, así todos los workers recargan la fila.
+    CLAVE_VERSION = 'almacen:institucion:version'
+    _singleton = (None, None)
+    _singleton_lock = threading.Lock()
 
     def __str__(self):
         return self.nombre
 
+    @classmethod
+    def obtener(cls):
+        """La institución (o None) cacheada con sus URLs de logos ya resueltas. Solo lectura."""
+        version = versiones.obtener(cls.CLAVE_VERSION)
+        guardada, instancia = cls._singleton
+        if version is not None and guardada == version:
+            return instancia
+        instancia = cls.objects.first()
+        if instancia is not None:
+            instancia.logo_pdf_url, instancia.logo2_pdf_url
+        with cls._singleton_lock:
+            cls._singleton = (version, instancia)
+        return instancia
+
+    @classmethod
+    def invalidar_cache(cls):
+        versiones.renovar(cls.CLAVE_VERSION)
+        with cls._singleton_lock:
+            cls._singleton = (None, None)
+
+    @cached_property
+    def logo_pdf_url(self):
+        if self.logo_pdf:
+            return self.logo_pdf.url
+        if self.logo:
+            return self.logo.url
+        return ''
+
+    @cached_property
+    def logo2_pdf_url(self):
+        if self.logo2_pdf:
+            return self.logo2_pdf.url
+        if self.logo2:
+            return self.logo2.url
+        return ''
+
+    def generar_logos_pdf(self, campos=('logo', 'logo2')):
+        for campo in campos:
+            original = getattr(self, campo)
+            variante = getattr(self, f'{campo}_pdf')
+            if variante:
+                variante.delete(save=False)
+            if original:
+                nombre, contenido = variante_logo_pdf(original)
+                variante.save(nombre, contenido, save=False)
+        for propiedad in ('logo_pdf_url', 'logo2_pdf_url'):
+            self.__dict__.pop(propiedad, None)
+        self.save(update_fields=[f'{campo}_pdf' for campo in campos])
+
 
 class FraseMotivacional(models.Model):
     frase = models.CharField(max_length=500)
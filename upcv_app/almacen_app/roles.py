@@ -0,0 +1,76 @@
+# roles.py
+# Resolución de grupos (roles) de un usuario con a lo sumo una consulta por request.
+# Los nombres se guardan en el propio objeto user (vive lo que dura el request) y,
+# si ALMACEN_ROLES_EN_SESION está activo, en la sesión junto con una versión global
+# que signals.py renueva cada vez que cambian los grupos de cualquier usuario
+# (ver versiones.py: un token perdido nunca vuelve a coincidir con el de una sesión vieja).
+from django.conf import settings
+
+from . import versiones
+
+CLAVE_VERSION = 'almacen:roles:version'
+CLAVE_SESION = '_almacen_roles'
+ATRIBUTO_USUARIO = '_almacen_roles'
+
+ADMINISTRADOR = 'Administrador'
+DEPARTAMENTO = 'Departamento'
+ALMACEN = 'Almacen'
+
+# Página de inicio según el grupo, en orden de prioridad
+INICIO_POR_GRUPO = (
+    (ADMINISTRADOR, 'almacen:dahsboard'),
+    (DEPARTAMENTO, 'almacen:crear_requerimiento'),
+    (ALMACEN, 'almacen:dahsboard'),
+)
+
+
+def version():
+    return versiones.obtener(CLAVE_VERSION)
+
+
+def invalidar():
+    versiones.renovar(CLAVE_VERSION)
+
+
+def grupos(user, request=None):
+    """Nombres de los grupos de ``user`` como frozenset (vacío si es anónimo)."""
+    if not user.is_authenticated:
+        return frozenset()
+    guardados = getattr(user, ATRIBUTO_USUARIO, None)
+    if guardados is not None:
+        return guardados
+
+    sesion = getattr(request, 'session', None) if getattr(settings, 'ALMACEN_ROLES_EN_SESION', False) else None
+    actual = version() if sesion is not None else None
+    entrada = sesion.get(CLAVE_SESION) if sesion is not None else None
+    if entrada and entrada.get('usuario') == user.pk and entrada.get('version') == actual:
+        guardados = frozenset(entrada['grupos'])
+    else:
+        guardados = frozenset(user.groups.values_list('name', flat=True))
+        if sesion is not None:
+            sesion[CLAVE_SESION] = {'usuario': user.pk, 'version': actual, 'grupos': sorted(guardados)}
+
+    setattr(user, ATRIBUTO_USUARIO, guardados)
+    return guardados
+
+
+def tiene_grupo(request, *nombres):
+    """True si el usuario del request es superusuario o pertenece a alguno de ``nombres``."""
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    return user.is_superuser or not grupos(user, request).isdisjoint(nombres)
+
+
+def puede_ver_costos(user):
+    # Depende solo de flags del usuario: no consulta grupos.
+    return user.is_staff or user.is_superuser
+
+
+def inicio_para(user, request=None):
+    """Nombre de la URL de inicio del usuario según sus grupos, o None si no tiene ninguno conocido."""
+    nombres = grupos(user, request)
+    for grupo, url in INICIO_POR_GRUPO:
+        if grupo in nombres:
+            return url
+    return None
@@ -1,7 +1,31 @@
 # signals.py
 
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.db import IntegrityError
 
+from . import roles
+from .context_processors import invalidar_frase_del_dia
+from .models import FraseMotivacional, Institucion
 
+
+@receiver([post_save, post_delete], sender=FraseMotivacional)
+def frase_modificada(sender, **kwargs):
+    invalidar_frase_del_dia()
+
+
+@receiver([post_save, post_delete], sender=Institucion)
+def institucion_modificada(sender, **kwargs):
+    Institucion.invalidar_cache()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def grupos_usuario_modificados(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        roles.invalidar()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def grupo_modificado(sender, **kwargs):
+    roles.invalidar()
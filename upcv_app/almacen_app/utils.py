@@ -5,6 +5,8 @@ from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import redirect
 from django.urls import reverse
 
+from . import roles
+
 def reservar_lineas(cantidad, form1h_instance):
     contador_global, _ = ContadorDetalleFactura.objects.get_or_create(id=1)
     lineas_reservadas = []
@@ -35,9 +37,7 @@ def grupo_requerido(*nombres_grupos):
     def decorador(view_func):
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
-            if request.user.is_authenticated and (
-                request.user.groups.filter(name__in=nombres_grupos).exists() or request.user.is_superuser
-            ):
+            if roles.tiene_grupo(request, *nombres_grupos):
                 return view_func(request, *args, **kwargs)
             # Redirigir a la vista de acceso denegado
             return redirect(reverse('almacen:acceso_denegado'))
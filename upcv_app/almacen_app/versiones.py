@@ -0,0 +1,25 @@
+# versiones.py
+# Tokens de versión compartidos entre procesos (roles, institución, catálogo).
+# Viven en la caché 'versiones', separada de la general para que los fragmentos y conteos
+# no los recorten. Son aleatorios y no contadores: si aun así se pierde uno, el nuevo nunca
+# coincide con uno viejo y el efecto es solo una invalidación.
+import uuid
+
+from django.core.cache import caches
+
+ALIAS = 'versiones'
+
+
+def obtener(clave):
+    """Token vigente de ``clave``; lo crea si no existe (o se perdió)."""
+    cache = caches[ALIAS]
+    actual = cache.get(clave)
+    if actual is None:
+        cache.add(clave, uuid.uuid4().hex, None)
+        actual = cache.get(clave)
+    return actual
+
+
+def renovar(clave):
+    """Reemplaza el token de ``clave``: todo lo guardado con el anterior deja de coincidir."""
+    caches[ALIAS].set(clave, uuid.uuid4().hex, None)
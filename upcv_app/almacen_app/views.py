@@ -26,9 +26,12 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from collections import defaultdict
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
+import copy
 import json
 from django.contrib.auth.models import Group
+from . import roles
 from .utils import grupo_requerido
+from cotizaciones_app.resumenes import datos_dashboard
 from django.views.decorators.http import require_GET
 from django.db.models.functions import Coalesce
 from django.db import transaction
@@ -61,7 +64,8 @@ import re
 @login_required
 @grupo_requerido('Administrador')
 def editar_institucion(request):
-    institucion = Institucion.objects.first()  # Solo debería haber una
+    # Copia del singleton cacheado: el formulario modifica la instancia al validar
+    institucion = copy.copy(Institucion.obtener())
 
     if request.method == 'POST':
         form = InstitucionForm(request.POST, request.FILES, instance=institucion)
@@ -190,9 +194,13 @@ import json
 @login_required
 @grupo_requerido('Administrador', 'Almacen')
 def dahsboard(request):
-  
-
-    return render(request, 'almacen/dashboard.html')
+    # Solo lee la tabla de resúmenes diarios: no depende del tamaño del historial
+    datos = datos_dashboard()
+    ver_costos = roles.puede_ver_costos(request.user)
+    if not ver_costos:
+        for serie in ('dias', 'semanas', 'meses'):
+            datos['graficas'][serie].pop('ganancia')
+    return render(request, 'almacen/dashboard.html', {**datos, 'ver_costos': ver_costos})
 
 
 
@@ -203,7 +211,7 @@ def signout(request):
 
 
 def signin(request):  
-    institucion = Institucion.objects.first()
+    institucion = Institucion.obtener()
     if request.method == 'GET':
         # Deberías instanciar el AuthenticationForm correctamente
         return render(request, 'almacen/login.html', {
@@ -222,14 +230,9 @@ def signin(request):
             auth_login(request, user)
             
             # Ahora verificamos los grupos
-            for g in user.groups.all():
-                print(g.name)
-                if g.name == 'Administrador':
-                    return redirect('almacen:dahsboard')
-                elif g.name == 'Departamento':
-                    return redirect('almacen:crear_requerimiento')
-                elif g.name == 'Almacen':
-                    return redirect('almacen:dahsboard')
+            inicio = roles.inicio_para(user, request)
+            if inicio:
+                return redirect(inicio)
             # Si no se encuentra el grupo adecuado, se redirige a una página por defecto
             return redirect('dahsboard')
         else:
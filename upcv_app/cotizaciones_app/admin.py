@@ -1,6 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.template.response import TemplateResponse
 
-from .models import Cliente, ProductoServicio, Cotizacion, CotizacionItem, CotizacionCorrelativo
+from .forms import AjustePreciosForm
+from .models import Cliente, ProductoServicio, Cotizacion, CotizacionItem, CotizacionCorrelativo, totales_diferidos
+from .precios import aplicar_ajuste, describir_ajuste, previsualizar
 
 
 @admin.register(Cliente)
@@ -14,6 +18,36 @@ class ProductoServicioAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'tipo', 'precio_costo', 'precio_venta', 'activo')
     list_filter = ('tipo', 'activo')
     search_fields = ('nombre', 'descripcion')
+    actions = ['ajustar_precios']
+
+    @admin.action(description='Ajustar precios de los seleccionados')
+    def ajustar_precios(self, request, queryset):
+        # Página intermedia: vuelve a enviar la acción con los mismos seleccionados.
+        form = AjustePreciosForm(request.POST if 'accion' in request.POST else None, filtros=False)
+        vista_previa = None
+        if form.is_bound and form.is_valid():
+            argumentos = (form.campos, form.cleaned_data['modo'], form.cleaned_data['valor'], form.cleaned_data['propagar'])
+            if request.POST['accion'] == 'aplicar' and request.POST.get('firma') == form.firma():
+                resumen = aplicar_ajuste(queryset, *argumentos)
+                self.message_user(request, f'Precios ajustados: {describir_ajuste(resumen)}.', messages.SUCCESS)
+                return None
+            vista_previa = previsualizar(queryset, *argumentos)
+        return TemplateResponse(
+            request,
+            'admin/cotizaciones_app/productoservicio/ajustar_precios.html',
+            {
+                **self.admin_site.each_context(request),
+                'title': 'Ajustar precios',
+                'opts': self.model._meta,
+                'form': form,
+                'vista_previa': vista_previa,
+                'firma': form.firma() if vista_previa is not None else '',
+                'total': queryset.count(),
+                'seleccionados': request.POST.getlist(ACTION_CHECKBOX_NAME),
+                'select_across': request.POST.get('select_across', '0'),
+                'action_checkbox_name': ACTION_CHECKBOX_NAME,
+            },
+        )
 
 
 class CotizacionItemInline(admin.TabularInline):
@@ -28,7 +62,11 @@ class CotizacionAdmin(admin.ModelAdmin):
     search_fields = ('correlativo', 'cliente__nombre')
     inlines = [CotizacionItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        with totales_diferidos():
+            super().save_related(request, form, formsets, change)
+
 
 @admin.register(CotizacionCorrelativo)
 class CotizacionCorrelativoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'last_number')
+    list_display = ('id', 'serie', 'last_number')
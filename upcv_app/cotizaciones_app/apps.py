@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _sincronizar_busqueda(using, **kwargs):
+    from .busqueda import sincronizar_fts
+
+    sincronizar_fts(using)
 
 
 class CotizacionesAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cotizaciones_app'
+
+    def ready(self):
+        import cotizaciones_app.signals  # noqa: F401
+
+        post_migrate.connect(_sincronizar_busqueda, sender=self)
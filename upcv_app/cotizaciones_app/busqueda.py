@@ -0,0 +1,156 @@
+import unicodedata
+
+from django.db import OperationalError, connections
+from django.db.models import FloatField, Func, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+from django.db.models.lookups import Contains
+
+# Campos buscables por modelo (clave: ``_meta.label_lower``).
+CAMPOS_BUSQUEDA = {
+    'cotizaciones_app.cliente': ('nombre', 'telefono', 'email', 'nit'),
+    'cotizaciones_app.productoservicio': ('nombre', 'descripcion'),
+}
+
+# Función SQL inmutable (lower + unaccent) creada por la migración 0005 en PostgreSQL;
+# los índices GIN trigram están definidos sobre esta misma expresión.
+FUNCION_NORMALIZAR = 'cotizaciones_normalizar'
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas y sin tildes, igual que ``cotizaciones_normalizar`` en la base de datos."""
+    descompuesto = unicodedata.normalize('NFKD', texto.strip().lower())
+    return ''.join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+
+
+class Normalizar(Func):
+    function = FUNCION_NORMALIZAR
+    output_field = TextField()
+
+
+def tabla_fts(modelo) -> str:
+    return f'{modelo._meta.db_table}_fts'
+
+
+def _campos(modelo):
+    return CAMPOS_BUSQUEDA[modelo._meta.label_lower]
+
+
+def _buscar_postgresql(queryset, termino, campos):
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    filtro = Q()
+    similitudes = []
+    for campo in campos:
+        columna = Normalizar(campo)
+        # LIKE '%t%' y ``%>`` usan el índice GIN trigram; el segundo tolera errores de tipeo.
+        filtro |= Q(Contains(columna, termino)) | Q(TrigramWordSimilar(columna, Value(termino)))
+        similitudes.append(TrigramWordSimilarity(Value(termino), columna))
+    relevancia = similitudes[0] if len(similitudes) == 1 else Greatest(*similitudes)
+    return queryset.filter(filtro).annotate(relevancia=relevancia)
+
+
+_fts_disponibles = set()
+
+
+def _fts_disponible(using, tabla) -> bool:
+    if (using, tabla) in _fts_disponibles:
+        return True
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [tabla])
+        existe = cursor.fetchone() is not None
+    if existe:
+        _fts_disponibles.add((using, tabla))
+    return existe
+
+
+def _consulta_fts(termino) -> str:
+    # Cada palabra como prefijo entre comillas: ``"juan"* "per"*`` (todas deben aparecer).
+    return ' '.join('"{}"*'.format(palabra.replace('"', '""')) for palabra in termino.split())
+
+
+def _buscar_sqlite(queryset, termino):
+    modelo = queryset.model
+    operaciones = connections[queryset.db].ops
+    tabla = operaciones.quote_name(tabla_fts(modelo))
+    pk = '{}.{}'.format(operaciones.quote_name(modelo._meta.db_table), operaciones.quote_name(modelo._meta.pk.column))
+    consulta = _consulta_fts(termino)
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {tabla} WHERE {tabla} MATCH %s', [consulta]),
+    ).annotate(
+        relevancia=RawSQL(
+            f'SELECT -bm25({tabla}) FROM {tabla} WHERE {tabla} MATCH %s AND rowid = {pk}',
+            [consulta],
+            output_field=FloatField(),
+        ),
+    )
+
+
+def buscar(queryset, termino):
+    """Filtra ``queryset`` por ``termino`` en los campos de ``CAMPOS_BUSQUEDA`` de su modelo.
+
+    Ignora mayúsculas y tildes y ordena por relevancia; con un término vacío
+    devuelve el queryset sin cambios. Usa pg_trgm en PostgreSQL, FTS5 en SQLite
+    y ``icontains`` en cualquier otro caso.
+    """
+    original = (termino or '').strip()
+    termino = normalizar_texto(original)
+    if not termino:
+        return queryset
+    campos = _campos(queryset.model)
+    orden = queryset.query.order_by
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+        resultado = _buscar_postgresql(queryset, termino, campos)
+    elif vendor == 'sqlite' and _consulta_fts(termino) and _fts_disponible(queryset.db, tabla_fts(queryset.model)):
+        resultado = _buscar_sqlite(queryset, termino)
+    else:
+        filtro = Q()
+        for campo in campos:
+            filtro |= Q(**{f'{campo}__icontains': original})
+        return queryset.filter(filtro)
+    return resultado.order_by('-relevancia', *orden)
+
+
+def sincronizar_fts(using='default'):
+    """Crea (si faltan) las tablas FTS5 de SQLite con sus triggers y las reconstruye.
+
+    Se ejecuta después de cada ``migrate`` porque SQLite recrea las tablas al
+    alterarlas y con ello se pierden los triggers.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    from django.apps import apps
+
+    quote = connection.ops.quote_name
+    for etiqueta, campos in CAMPOS_BUSQUEDA.items():
+        modelo = apps.get_model(etiqueta)
+        tabla = modelo._meta.db_table
+        fts = tabla_fts(modelo)
+        columnas = [modelo._meta.get_field(campo).column for campo in campos]
+        lista = ', '.join(quote(columna) for columna in columnas)
+        nuevos = ', '.join(f'new.{quote(columna)}' for columna in columnas)
+        viejos = ', '.join(f'old.{quote(columna)}' for columna in columnas)
+        pk = quote(modelo._meta.pk.column)
+        sentencias = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {quote(fts)} USING fts5({lista}, content={quote(tabla)}, "
+            f"content_rowid={pk}, tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS {quote(fts + '_ai')} AFTER INSERT ON {quote(tabla)} BEGIN "
+            f"INSERT INTO {quote(fts)}(rowid, {lista}) VALUES (new.{pk}, {nuevos}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {quote(fts + '_ad')} AFTER DELETE ON {quote(tabla)} BEGIN "
+            f"INSERT INTO {quote(fts)}({quote(fts)}, rowid, {lista}) VALUES ('delete', old.{pk}, {viejos}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {quote(fts + '_au')} AFTER UPDATE ON {quote(tabla)} BEGIN "
+            f"INSERT INTO {quote(fts)}({quote(fts)}, rowid, {lista}) VALUES ('delete', old.{pk}, {viejos}); "
+            f"INSERT INTO {quote(fts)}(rowid, {lista}) VALUES (new.{pk}, {nuevos}); END",
+            f"INSERT INTO {quote(fts)}({quote(fts)}) VALUES ('rebuild')",
+        ]
+        try:
+            with connection.cursor() as cursor:
+                for sentencia in sentencias:
+                    cursor.execute(sentencia)
+        except OperationalError:
+            # SQLite compilado sin FTS5: buscar() usará icontains.
+            continue
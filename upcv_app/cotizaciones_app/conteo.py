@@ -0,0 +1,101 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+class Conteo:
+    """Cantidad de resultados; ``aproximado`` indica que no es un COUNT(*) exacto y vigente."""
+
+    def __init__(self, valor, aproximado=False):
+        self.valor = valor
+        self.aproximado = aproximado
+
+    def __int__(self):
+        return self.valor
+
+    def __str__(self):
+        return f'aprox. {self.valor}' if self.aproximado else str(self.valor)
+
+
+def _clave_cache(queryset):
+    sql, params = queryset.query.sql_with_params()
+    huella = hashlib.sha256(repr((queryset.db, sql, params)).encode()).hexdigest()
+    return f'cotizaciones:conteo:{huella}'
+
+
+def _estimar_postgresql(queryset):
+    sql, params = queryset.query.sql_with_params()
+    try:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def contar(queryset):
+    """Cuenta los resultados sin recorrer toda la tabla cuando son muchos.
+
+    Hasta ``COTIZACIONES_CONTEO_EXACTO_HASTA`` filas el conteo es exacto y acotado
+    (deja de leer en ese límite). Por encima se usa la estimación del planificador
+    en PostgreSQL o un COUNT(*) completo en otros motores, y el resultado queda
+    en caché ``COTIZACIONES_CONTEO_TTL`` segundos por consulta normalizada.
+    """
+    limite = getattr(settings, 'COTIZACIONES_CONTEO_EXACTO_HASTA', 1000)
+    queryset = queryset.order_by()
+    clave = _clave_cache(queryset)
+    guardado = cache.get(clave)
+    if guardado is not None:
+        return Conteo(guardado, aproximado=True)
+
+    acotado = queryset[:limite + 1].count()
+    if acotado <= limite:
+        return Conteo(acotado)
+
+    valor = None
+    if connections[queryset.db].vendor == 'postgresql':
+        estimado = _estimar_postgresql(queryset)
+        if estimado is not None:
+            valor = max(estimado, acotado)
+    if valor is None:
+        valor = queryset.count()
+    cache.set(clave, valor, getattr(settings, 'COTIZACIONES_CONTEO_TTL', 60))
+    return Conteo(valor, aproximado=True)
+
+
+class PaginadorConteo(Paginator):
+    """Paginator que usa ``contar()``; con un conteo aproximado no recorta la última página."""
+
+    @cached_property
+    def conteo(self):
+        return contar(self.object_list)
+
+    @cached_property
+    def count(self):
+        return self.conteo.valor
+
+    def validate_number(self, number):
+        if not self.conteo.aproximado:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if not self.conteo.aproximado:
+            return super().page(number)
+        number = self.validate_number(number)
+        inicio = (number - 1) * self.per_page
+        return self._get_page(self.object_list[inicio:inicio + self.per_page], number, self)
@@ -0,0 +1,178 @@
+import re
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+
+def formatear_correlativo(serie: str, numero: int) -> str:
+    digitos = getattr(settings, 'COTIZACIONES_CORRELATIVO_DIGITOS', 5)
+    if serie:
+        return f"{serie}-{numero:0{digitos}d}"
+    return f"{numero:0{digitos}d}"
+
+
+class AsignadorCorrelativo:
+    """Entrega el siguiente número de una serie de correlativos."""
+
+    def siguiente(self, serie: str, using: str) -> int:
+        raise NotImplementedError
+
+
+class AsignadorSecuencia(AsignadorCorrelativo):
+    """Usa una SEQUENCE de PostgreSQL por serie.
+
+    ``nextval()`` no toma bloqueos de fila, así que las transacciones concurrentes
+    no se esperan entre sí. Los números de transacciones revertidas se pierden
+    (quedan huecos), nunca se repiten.
+    """
+
+    def __init__(self):
+        self._creadas = set()
+
+    @staticmethod
+    def nombre_secuencia(serie: str) -> str:
+        sufijo = re.sub(r'[^a-z0-9]+', '_', serie.lower()).strip('_')
+        if sufijo:
+            return f'cotizaciones_correlativo_{sufijo}_seq'
+        return 'cotizaciones_correlativo_seq'
+
+    def _crear_secuencia(self, nombre: str, serie: str, using: str) -> None:
+        from .models import CotizacionCorrelativo
+
+        contador = CotizacionCorrelativo.objects.using(using).filter(serie=serie).first()
+        inicio = (contador.last_number if contador else 0) + 1
+        connection = connections[using]
+        try:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE SEQUENCE IF NOT EXISTS {connection.ops.quote_name(nombre)} START WITH %s',
+                    [inicio],
+                )
+        except DatabaseError:
+            # Otra transacción creó la misma secuencia al mismo tiempo.
+            pass
+        transaction.on_commit(lambda: self._creadas.add((using, nombre)), using=using)
+
+    def siguiente(self, serie: str, using: str) -> int:
+        nombre = self.nombre_secuencia(serie)
+        if (using, nombre) not in self._creadas:
+            self._crear_secuencia(nombre, serie, using)
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [nombre])
+            return cursor.fetchone()[0]
+
+
+class _Bloque:
+    def __init__(self, inicio: int, fin: int):
+        self.siguiente = inicio
+        self.fin = fin
+
+    @property
+    def disponible(self) -> bool:
+        return self.siguiente <= self.fin
+
+    def tomar(self) -> int:
+        numero = self.siguiente
+        self.siguiente += 1
+        return numero
+
+
+class AsignadorBloques(AsignadorCorrelativo):
+    """Reserva rangos de números en ``CotizacionCorrelativo`` y los reparte desde memoria.
+
+    Solo se toca la fila del contador una vez cada ``tamano_bloque`` cotizaciones.
+    Un rango reservado dentro de una transacción solo lo usa esa transacción
+    hasta que confirma; si se revierte, el rango se descarta junto con ella.
+    Los números que queden sin usar al terminar el proceso se pierden como huecos.
+    """
+
+    def __init__(self, tamano_bloque: int = 20):
+        self.tamano_bloque = tamano_bloque
+        self._lock = threading.Lock()
+        self._bloques = {}
+        self._local = threading.local()
+
+    def _pendientes(self) -> dict:
+        if not hasattr(self._local, 'pendientes'):
+            self._local.pendientes = {}
+        return self._local.pendientes
+
+    def _bloque_pendiente(self, clave, using):
+        pendiente = self._pendientes().get(clave)
+        if pendiente is None:
+            return None
+        bloque, confirmar = pendiente
+        vigente = any(func is confirmar for _, func, _ in connections[using].run_on_commit)
+        if not vigente:
+            # La transacción que reservó el rango se revirtió.
+            del self._pendientes()[clave]
+            return None
+        return bloque
+
+    def _publicar(self, clave, bloque) -> None:
+        self._pendientes().pop(clave, None)
+        if bloque.disponible:
+            with self._lock:
+                self._bloques.setdefault(clave, []).append(bloque)
+
+    def _reservar(self, clave, serie: str, using: str) -> int:
+        from .models import CotizacionCorrelativo
+
+        contadores = CotizacionCorrelativo.objects.using(using).filter(serie=serie)
+        with transaction.atomic(using=using):
+            # Escribir primero evita que SQLite tenga que promover un bloqueo de lectura.
+            if not contadores.update(last_number=F('last_number') + self.tamano_bloque):
+                contadores.get_or_create(serie=serie)
+                contadores.update(last_number=F('last_number') + self.tamano_bloque)
+            fin = contadores.values_list('last_number', flat=True).get()
+        bloque = _Bloque(fin - self.tamano_bloque + 1, fin)
+        # El primer número se toma antes de publicar el rango para que otro hilo no lo gane.
+        numero = bloque.tomar()
+
+        if connections[using].in_atomic_block:
+            def confirmar():
+                self._publicar(clave, bloque)
+
+            self._pendientes()[clave] = (bloque, confirmar)
+            transaction.on_commit(confirmar, using=using)
+        else:
+            # En autocommit la reserva ya quedó confirmada al salir del atomic.
+            self._publicar(clave, bloque)
+        return numero
+
+    def siguiente(self, serie: str, using: str) -> int:
+        clave = (using, serie)
+        with self._lock:
+            bloques = self._bloques.get(clave, [])
+            while bloques:
+                if bloques[0].disponible:
+                    return bloques[0].tomar()
+                bloques.pop(0)
+        bloque = self._bloque_pendiente(clave, using)
+        if bloque is None or not bloque.disponible:
+            return self._reservar(clave, serie, using)
+        return bloque.tomar()
+
+
+_asignadores = {}
+_asignadores_lock = threading.Lock()
+
+
+def obtener_asignador(using: str) -> AsignadorCorrelativo:
+    """Devuelve el asignador configurado, o el adecuado para el motor de la base de datos."""
+    ruta = getattr(settings, 'COTIZACIONES_CORRELATIVO_ASIGNADOR', None)
+    clave = ruta or connections[using].vendor
+    with _asignadores_lock:
+        if clave not in _asignadores:
+            if ruta:
+                _asignadores[clave] = import_string(ruta)()
+            elif clave == 'postgresql':
+                _asignadores[clave] = AsignadorSecuencia()
+            else:
+                _asignadores[clave] = AsignadorBloques(
+                    tamano_bloque=getattr(settings, 'COTIZACIONES_CORRELATIVO_BLOQUE', 20),
+                )
+        return _asignadores[clave]
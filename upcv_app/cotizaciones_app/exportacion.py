@@ -0,0 +1,103 @@
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+
+from .models import Cotizacion, CotizacionItem
+
+# Filas leídas por viaje a la base de datos; la memoria usada no depende del total exportado.
+FILAS_POR_LOTE = 2000
+
+# (título, campo en values_list, solo con costos)
+COLUMNAS_COTIZACION = [
+    ('Correlativo', 'correlativo', False),
+    ('Fecha', 'fecha_emision', False),
+    ('Cliente', 'cliente__nombre', False),
+    ('NIT', 'cliente__nit', False),
+    ('Estado', 'estado', False),
+    ('Título', 'titulo', False),
+    ('Total venta', 'subtotal_venta', False),
+    ('Total costo', 'subtotal_costo', True),
+    ('Ganancia', 'ganancia_total', True),
+]
+
+COLUMNAS_ITEM = [
+    ('Correlativo', 'cotizacion__correlativo', False),
+    ('Fecha', 'cotizacion__fecha_emision', False),
+    ('Cliente', 'cotizacion__cliente__nombre', False),
+    ('Estado', 'cotizacion__estado', False),
+    ('Producto / Servicio', 'producto_servicio__nombre', False),
+    ('Descripción', 'descripcion_editable', False),
+    ('Cantidad', 'cantidad', False),
+    ('Precio unitario', 'precio_venta_unitario', False),
+    ('Total venta', 'total_linea_venta', False),
+    ('Costo unitario', 'precio_costo_unitario', True),
+    ('Total costo', 'total_linea_costo', True),
+    ('Ganancia', 'ganancia_linea', True),
+]
+
+ESTADOS = dict(Cotizacion.ESTADO_CHOICES)
+
+
+def _filas(queryset, columnas, ver_costos):
+    columnas = [columna for columna in columnas if ver_costos or not columna[2]]
+    campos = [campo for _, campo, _ in columnas]
+    estado = next((indice for indice, campo in enumerate(campos) if campo.endswith('estado')), None)
+    yield [titulo for titulo, _, _ in columnas]
+    for fila in queryset.values_list(*campos).iterator(chunk_size=FILAS_POR_LOTE):
+        if estado is not None:
+            fila = list(fila)
+            fila[estado] = ESTADOS.get(fila[estado], fila[estado])
+        yield fila
+
+
+def filas_cotizaciones(queryset, ver_costos):
+    """Encabezado y una fila por cotización, en el orden del queryset."""
+    return _filas(queryset, COLUMNAS_COTIZACION, ver_costos)
+
+
+def filas_items(queryset, ver_costos):
+    """Encabezado y una fila por ítem de las cotizaciones de ``queryset``."""
+    items = CotizacionItem.objects.filter(cotizacion__in=queryset.order_by().values('pk')).order_by(
+        '-cotizacion__fecha_emision', '-cotizacion_id', 'created_at', 'id',
+    )
+    return _filas(items, COLUMNAS_ITEM, ver_costos)
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve cada línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(filas, nombre):
+    escritor = csv.writer(_Eco())
+
+    def contenido():
+        # BOM para que Excel reconozca UTF-8 (tildes y ñ)
+        yield '\ufeff'
+        for fila in filas:
+            yield escritor.writerow(fila)
+
+    response = StreamingHttpResponse(contenido(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return response
+
+
+def respuesta_xlsx(filas, nombre):
+    # write_only escribe las filas a disco a medida que llegan en vez de mantener la hoja en memoria
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Cotizaciones')
+    for fila in filas:
+        hoja.append(list(fila))
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f'{nombre}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
@@ -1,8 +1,12 @@
 from django import forms
+from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.forms.models import ModelChoiceIterator
 
 from .models import Cliente, ProductoServicio, Cotizacion, CotizacionItem
+from .precios import CAMPOS_PRECIO, MODO_CHOICES, MODO_PORCENTAJE
 
 
 class ClienteForm(forms.ModelForm):
@@ -25,9 +29,6 @@ class ClienteForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if not self.instance.pk:
-            self.fields['fecha_emision'].initial = timezone.now().date()
-            self.fields['fecha_emision'].required = False
         for field in self.fields.values():
             if isinstance(field.widget, forms.CheckboxInput):
                 field.widget.attrs['class'] = 'form-check-input'
@@ -55,9 +56,6 @@ class ProductoServicioForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if not self.instance.pk:
-            self.fields['fecha_emision'].initial = timezone.now().date()
-            self.fields['fecha_emision'].required = False
         for field in self.fields.values():
             if isinstance(field.widget, forms.CheckboxInput):
                 field.widget.attrs['class'] = 'form-check-input'
@@ -79,6 +77,76 @@ class ProductoServicioForm(forms.ModelForm):
         return precio_venta
 
 
+class AjustePreciosForm(forms.Form):
+    CAMPOS_CHOICES = [
+        ('precio_venta', 'Precio de venta'),
+        ('precio_costo', 'Precio de costo'),
+        ('ambos', 'Venta y costo'),
+    ]
+    ACTIVO_CHOICES = [
+        ('', 'Todos'),
+        ('1', 'Solo activos'),
+        ('0', 'Solo inactivos'),
+    ]
+
+    tipo = forms.ChoiceField(choices=[('', 'Todos')] + ProductoServicio.TIPO_CHOICES, required=False)
+    activo = forms.ChoiceField(choices=ACTIVO_CHOICES, required=False)
+    q = forms.CharField(label='Buscar', required=False)
+    campo = forms.ChoiceField(label='Precio a ajustar', choices=CAMPOS_CHOICES)
+    modo = forms.ChoiceField(label='Tipo de ajuste', choices=MODO_CHOICES)
+    valor = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text='Use valores negativos para bajar precios.',
+    )
+    propagar = forms.BooleanField(
+        label='Actualizar también las líneas de cotizaciones en borrador',
+        required=False,
+    )
+
+    def __init__(self, *args, filtros=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not filtros:
+            # Desde el admin los productos ya vienen seleccionados.
+            for nombre in ('tipo', 'activo', 'q'):
+                del self.fields[nombre]
+        for field in self.fields.values():
+            if isinstance(field.widget, forms.CheckboxInput):
+                field.widget.attrs['class'] = 'form-check-input'
+            elif isinstance(field.widget, (forms.Select, forms.SelectMultiple)):
+                field.widget.attrs['class'] = 'form-select'
+            else:
+                field.widget.attrs['class'] = 'form-control'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        valor = cleaned_data.get('valor')
+        if valor is not None:
+            if valor == 0:
+                self.add_error('valor', 'El ajuste no puede ser cero.')
+            elif cleaned_data.get('modo') == MODO_PORCENTAJE and valor < -100:
+                self.add_error('valor', 'Un porcentaje menor a -100 dejaría precios negativos.')
+        return cleaned_data
+
+    @property
+    def campos(self):
+        campo = self.cleaned_data['campo']
+        return list(CAMPOS_PRECIO) if campo == 'ambos' else [campo]
+
+    def firma(self):
+        """Identifica los valores del ajuste: solo se aplica lo mismo que se previsualizó."""
+        return repr(sorted((nombre, str(valor)) for nombre, valor in self.cleaned_data.items()))
+
+    @property
+    def filtros(self):
+        activo = self.cleaned_data.get('activo')
+        return {
+            'tipo': self.cleaned_data.get('tipo'),
+            'activo': None if activo in (None, '') else activo == '1',
+            'q': self.cleaned_data.get('q'),
+        }
+
+
 class CotizacionForm(forms.ModelForm):
     class Meta:
         model = Cotizacion
@@ -112,6 +180,95 @@ class CotizacionForm(forms.ModelForm):
                 field.widget.attrs['class'] = f'{existing_class} form-control'.strip()
 
 
+class DuplicarCotizacionForm(forms.Form):
+    cliente = forms.ModelChoiceField(queryset=Cliente.objects.order_by('nombre'))
+    actualizar_precios = forms.BooleanField(
+        label='Usar los precios actuales del catálogo',
+        required=False,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['cliente'].widget.attrs['class'] = 'form-select'
+        self.fields['actualizar_precios'].widget.attrs['class'] = 'form-check-input'
+
+
+class SelectRemotoWidget(forms.Select):
+    """Select que solo renderiza las opciones elegidas; el resto se busca en ``data-url``."""
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-url'] = str(self.url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        if hasattr(choices, 'seleccionadas'):
+            self.choices = list(choices.seleccionadas(value))
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = choices
+
+
+class ProductoServicioChoiceIterator(ModelChoiceIterator):
+    def seleccionadas(self, valores):
+        """Opciones solo para ``valores``, tomando primero los productos ya resueltos."""
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        faltantes = []
+        for valor in valores:
+            if valor in self.field.empty_values:
+                continue
+            producto = self.field.resueltos.get(str(valor))
+            if producto is None:
+                faltantes.append(valor)
+            else:
+                yield self.choice(producto)
+        faltantes = [valor for valor in faltantes if str(valor).isdigit()]
+        if faltantes:
+            for producto in self.queryset.filter(pk__in=faltantes):
+                yield self.choice(producto)
+
+
+class ProductoServicioChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField que usa los productos ya resueltos por el formset antes de consultar."""
+
+    iterator = ProductoServicioChoiceIterator
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.resueltos = {}
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        producto = self.resueltos.get(str(value))
+        if producto is not None:
+            return producto
+        return super().to_python(value)
+
+
+class ItemExistenteChoiceField(forms.ModelChoiceField):
+    """Campo ``id`` del formset de ítems que resuelve con los ítems ya cargados por el formset."""
+
+    def __init__(self, *args, resueltos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.resueltos = resueltos or {}
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        item = self.resueltos.get(str(value))
+        if item is not None:
+            return item
+        return super().to_python(value)
+
+
 class CotizacionItemForm(forms.ModelForm):
     class Meta:
         model = CotizacionItem
@@ -119,6 +276,12 @@ class CotizacionItemForm(forms.ModelForm):
             'producto_servicio',
             'cantidad',
         ]
+        field_classes = {
+            'producto_servicio': ProductoServicioChoiceField,
+        }
+        widgets = {
+            'producto_servicio': SelectRemotoWidget(url=reverse_lazy('cotizaciones:producto_buscar')),
+        }
 
     def __init__(self, *args, **kwargs):
         kwargs.pop('show_costs', True)
@@ -138,6 +301,12 @@ class CotizacionItemForm(forms.ModelForm):
             raise forms.ValidationError('La cantidad debe ser mayor a 0.')
         return cantidad
 
+    def _get_validation_exclusions(self):
+        exclusiones = super()._get_validation_exclusions()
+        # La existencia del producto ya la comprobó ProductoServicioChoiceField.
+        exclusiones.add('producto_servicio')
+        return exclusiones
+
     def save(self, commit=True):
         instance = super().save(commit=False)
         if instance.producto_servicio_id:
@@ -151,6 +320,44 @@ class CotizacionItemForm(forms.ModelForm):
 
 
 class CotizacionItemInlineFormSet(BaseInlineFormSet):
+    def __init__(self, *args, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = CotizacionItem.objects.select_related('producto_servicio')
+        super().__init__(*args, queryset=queryset, **kwargs)
+
+    @cached_property
+    def productos_resueltos(self):
+        """Carga en una sola consulta todos los productos enviados en el formset."""
+        if not self.is_bound:
+            return {str(item.producto_servicio_id): item.producto_servicio for item in self.get_queryset()}
+        ids = set()
+        for index in range(self.total_form_count()):
+            valor = self.data.get(f'{self.add_prefix(index)}-producto_servicio')
+            if valor and str(valor).isdigit():
+                ids.add(int(valor))
+        if not ids:
+            return {}
+        queryset = self.form.base_fields['producto_servicio'].queryset
+        return {str(pk): producto for pk, producto in queryset.in_bulk(ids).items()}
+
+    @cached_property
+    def items_resueltos(self):
+        # get_queryset() ya se evaluó una vez para el formset; evita un SELECT por formulario.
+        return {str(item.pk): item for item in self.get_queryset()}
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['producto_servicio'].resueltos = self.productos_resueltos
+        return form
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        campo = form.fields[self._pk_field.name]
+        form.fields[self._pk_field.name] = ItemExistenteChoiceField(
+            campo.queryset, initial=campo.initial, required=False, widget=campo.widget,
+            resueltos=self.items_resueltos,
+        )
+
     def clean(self):
         super().clean()
         items_validos = 0
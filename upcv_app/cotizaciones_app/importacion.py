@@ -0,0 +1,254 @@
+import csv
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from openpyxl import load_workbook
+
+from .models import Cliente, ProductoServicio
+
+FILAS_POR_LOTE = 5000
+
+VERDADEROS = {'1', 'si', 'sí', 'true', 'verdadero', 'x', 'activo'}
+FALSOS = {'0', 'no', 'false', 'falso', 'inactivo'}
+
+
+def leer_filas(ruta, hoja=None):
+    """Itera (número de fila, dict) de un CSV o Excel sin cargar el archivo completo.
+
+    Los encabezados se normalizan a minúsculas sin espacios en los extremos.
+    """
+    ruta = Path(ruta)
+    if ruta.suffix.lower() in ('.xlsx', '.xlsm'):
+        libro = load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            filas = (libro[hoja] if hoja else libro.active).iter_rows(values_only=True)
+            encabezados = [str(valor or '').strip().lower() for valor in next(filas, ())]
+            for numero, valores in enumerate(filas, start=2):
+                if any(valor not in (None, '') for valor in valores):
+                    yield numero, dict(zip(encabezados, valores))
+        finally:
+            libro.close()
+        return
+
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(archivo, dialecto)
+        encabezados = [valor.strip().lower() for valor in next(lector, [])]
+        for numero, valores in enumerate(lector, start=2):
+            if any(valor.strip() for valor in valores):
+                yield numero, dict(zip(encabezados, valores))
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _decimal(valor):
+    texto = _texto(valor).replace('Q', '').replace(' ', '')
+    if ',' in texto and '.' not in texto:
+        texto = texto.replace(',', '.')
+    texto = texto.replace(',', '')
+    try:
+        return Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValidationError(f'"{_texto(valor)}" no es un número válido.')
+
+
+def _booleano(valor, defecto=True):
+    texto = _texto(valor).lower()
+    if not texto:
+        return defecto
+    if texto in VERDADEROS:
+        return True
+    if texto in FALSOS:
+        return False
+    raise ValidationError(f'"{_texto(valor)}" no es un valor sí/no válido.')
+
+
+def _clave(*partes):
+    return tuple(' '.join(parte.split()).casefold() for parte in partes)
+
+
+@dataclass
+class ResultadoImportacion:
+    filas: int = 0
+    creados: int = 0
+    actualizados: int = 0
+    errores: list = field(default_factory=list)
+
+
+class Importador:
+    """Importa por lotes: valida en memoria, resuelve la clave natural contra un diccionario
+    cargado una sola vez y escribe cada lote con un ``bulk_create(update_conflicts=True)``."""
+
+    modelo = None
+    campos = ()
+
+    def __init__(self, dry_run=False, lote=FILAS_POR_LOTE):
+        self.dry_run = dry_run
+        self.lote = lote
+        self.existentes = {}
+        self.columnas = set()
+
+    def clave(self, objeto):
+        raise NotImplementedError
+
+    def construir(self, datos):
+        raise NotImplementedError
+
+    def cargar_existentes(self):
+        # Ante duplicados ya existentes se actualiza el de menor id.
+        for objeto in self.modelo.objects.order_by('-pk').only(*self.campos_clave):
+            self.existentes[self.clave(objeto)] = objeto.pk
+
+    def importar(self, filas, progreso=None):
+        resultado = ResultadoImportacion()
+        self.cargar_existentes()
+        pendientes = {}
+        for numero, datos in filas:
+            resultado.filas += 1
+            self.columnas.update(datos)
+            try:
+                objeto = self.construir(datos)
+                objeto.full_clean(validate_unique=False, validate_constraints=False)
+            except ValidationError as error:
+                resultado.errores.append((numero, self._mensaje(error)))
+                continue
+            # Si la clave se repite en el archivo gana la última fila.
+            pendientes[self.clave(objeto)] = objeto
+            if len(pendientes) >= self.lote:
+                self._guardar(pendientes, resultado)
+                pendientes = {}
+                if progreso:
+                    progreso(resultado)
+        if pendientes:
+            self._guardar(pendientes, resultado)
+            if progreso:
+                progreso(resultado)
+        return resultado
+
+    def _guardar(self, pendientes, resultado):
+        objetos = list(pendientes.values())
+        for clave, objeto in pendientes.items():
+            objeto.pk = self.existentes.get(clave)
+        actualizados = sum(1 for objeto in objetos if objeto.pk)
+        resultado.creados += len(objetos) - actualizados
+        resultado.actualizados += actualizados
+        if self.dry_run:
+            # Id ficticio: las repeticiones en lotes posteriores cuentan como actualizaciones.
+            self.existentes.update((clave, objeto.pk or -1) for clave, objeto in pendientes.items())
+            return
+        # Las filas con id conocido chocan con su clave primaria y se actualizan en la misma
+        # sentencia; no hace falta una restricción única sobre la clave natural.
+        self.modelo.objects.bulk_create(
+            objetos,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['pk'],
+            update_fields=self.campos_actualizables(),
+        )
+        self.existentes.update((clave, objeto.pk) for clave, objeto in pendientes.items())
+        self.guardado()
+
+    def guardado(self):
+        """Se llama tras escribir cada lote (bulk_create no envía post_save)."""
+
+    def campos_actualizables(self):
+        # Solo se sobrescriben las columnas que trae el archivo.
+        return [campo for campo in self.campos if campo in self.columnas]
+
+    @staticmethod
+    def _mensaje(error):
+        if hasattr(error, 'message_dict'):
+            return '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in error.message_dict.items())
+        return ' '.join(error.messages)
+
+
+class ImportadorProductos(Importador):
+    """Columnas: nombre, tipo, descripcion, unidad, precio_costo, precio_venta, activo. Clave: nombre + tipo."""
+
+    modelo = ProductoServicio
+    campos = ('descripcion', 'unidad', 'precio_costo', 'precio_venta', 'activo')
+    campos_clave = ('nombre', 'tipo')
+    tipos = {
+        **{valor.casefold(): valor for valor, _ in ProductoServicio.TIPO_CHOICES},
+        **{etiqueta.casefold(): valor for valor, etiqueta in ProductoServicio.TIPO_CHOICES},
+    }
+
+    def clave(self, objeto):
+        return _clave(objeto.nombre, objeto.tipo)
+
+    def construir(self, datos):
+        errores = {}
+        tipo = self.tipos.get(_texto(datos.get('tipo')).casefold())
+        if tipo is None:
+            errores['tipo'] = [f'"{_texto(datos.get("tipo"))}" no es PRODUCTO ni SERVICIO.']
+        valores = {}
+        for campo in ('precio_costo', 'precio_venta'):
+            try:
+                valores[campo] = _decimal(datos.get(campo))
+            except ValidationError as error:
+                errores[campo] = error.messages
+        try:
+            activo = _booleano(datos.get('activo'))
+        except ValidationError as error:
+            errores['activo'] = error.messages
+        if errores:
+            raise ValidationError(errores)
+        return ProductoServicio(
+            nombre=' '.join(_texto(datos.get('nombre')).split()),
+            tipo=tipo,
+            descripcion=_texto(datos.get('descripcion')),
+            unidad=_texto(datos.get('unidad')),
+            activo=activo,
+            **valores,
+        )
+
+    def campos_actualizables(self):
+        # Sin esto, una fila actualizada por conflicto conservaría su actualizado_en anterior.
+        return [*super().campos_actualizables(), 'actualizado_en']
+
+    def guardado(self):
+        ProductoServicio.invalidar_catalogo()
+
+
+class ImportadorClientes(Importador):
+    """Columnas: nombre, nit, contacto, telefono, email, direccion, municipio, departamento, notas. Clave: NIT."""
+
+    modelo = Cliente
+    campos = ('nombre', 'contacto', 'telefono', 'email', 'direccion', 'municipio', 'departamento', 'notas')
+    campos_clave = ('nit',)
+    # NIT genéricos que no identifican a un cliente
+    NIT_GENERICOS = {'', 'cf', 'c/f', 'c.f.', 'consumidor final'}
+
+    def clave(self, objeto):
+        return _clave(objeto.nit.replace('-', ''))
+
+    def cargar_existentes(self):
+        super().cargar_existentes()
+        for generico in self.NIT_GENERICOS:
+            self.existentes.pop(_clave(generico.replace('-', '')), None)
+
+    def construir(self, datos):
+        nit = _texto(datos.get('nit'))
+        if nit.casefold() in self.NIT_GENERICOS:
+            raise ValidationError({'nit': ['Se requiere un NIT que identifique al cliente.']})
+        return Cliente(nit=nit.upper(), **{campo: _texto(datos.get(campo)) for campo in self.campos})
+
+
+IMPORTADORES = {
+    'productos': ImportadorProductos,
+    'clientes': ImportadorClientes,
+}
+
@@ -0,0 +1,179 @@
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Prefetch
+from django.template.defaultfilters import floatformat
+from django.utils import formats, translation
+from django.utils.functional import SimpleLazyObject
+
+from .models import Cotizacion, CotizacionInstantanea, CotizacionItem
+
+# Cambia cuando cambian las claves o el formato; las instantáneas anteriores se regeneran al leerlas.
+FORMATO = 2
+
+COTIZACIONES_POR_LOTE = 200
+
+_pendientes = threading.local()
+
+
+def _dinero(valor):
+    return floatformat(valor, 2)
+
+
+def construir(cotizacion, items, anterior=None):
+    """Datos de render de una cotización con todos los valores ya formateados.
+
+    Las plantillas de detalle, impresión, PDF y JPG leen solo estas claves, así que
+    una cotización en borrador (construida al vuelo) y una emitida (leída de
+    ``CotizacionInstantanea``) se renderizan igual.
+
+    Con ``anterior`` (la instantánea vigente) los datos del cliente y de los productos
+    se copian de ella: editar el cliente o el catálogo no altera una cotización emitida.
+    Solo se leen del modelo si la cotización cambió de cliente o la línea de producto.
+    """
+    with translation.override(settings.LANGUAGE_CODE):
+        return {
+            'formato': FORMATO,
+            'pk': cotizacion.pk,
+            'version': f'{cotizacion.actualizado_en.timestamp():.6f}',
+            'correlativo': cotizacion.correlativo,
+            'fecha_emision': formats.localize(cotizacion.fecha_emision),
+            'estado': cotizacion.estado,
+            'estado_display': cotizacion.get_estado_display(),
+            'titulo': cotizacion.titulo,
+            'validez_dias': cotizacion.validez_dias,
+            'observaciones': cotizacion.observaciones,
+            'garantia_texto': cotizacion.garantia_texto,
+            'subtotal_venta': _dinero(cotizacion.subtotal_venta),
+            'subtotal_costo': _dinero(cotizacion.subtotal_costo),
+            'ganancia_total': _dinero(cotizacion.ganancia_total),
+            'cliente': _datos_cliente(cotizacion, anterior),
+            'items': construir_items(items, anterior),
+        }
+
+
+def _datos_cliente(cotizacion, anterior):
+    previo = (anterior or {}).get('cliente')
+    # Las instantáneas sin 'pk' son de antes de guardarlo y se asumen del mismo cliente.
+    if previo and previo.get('pk', cotizacion.cliente_id) == cotizacion.cliente_id:
+        return {**previo, 'pk': cotizacion.cliente_id}
+    cliente = cotizacion.cliente
+    return {
+        'pk': cliente.pk,
+        'nombre': cliente.nombre,
+        'direccion': cliente.direccion,
+        'telefono': cliente.telefono,
+        'email': cliente.email,
+        'nit': cliente.nit,
+    }
+
+
+def _datos_producto(item, previo):
+    if previo is not None:
+        guardado = previo.get('producto')
+        if guardado is None:
+            # Instantánea de antes de guardar el producto por separado.
+            guardado = {'pk': item.producto_servicio_id, 'nombre': previo['nombre'], 'descripcion': previo['descripcion']}
+        if guardado['pk'] == item.producto_servicio_id:
+            return guardado
+    producto = item.producto_servicio
+    return {'pk': producto.pk, 'nombre': producto.nombre, 'descripcion': producto.descripcion}
+
+
+def construir_items(items, anterior=None):
+    previos = {item['pk']: item for item in (anterior or {}).get('items', ())}
+    filas = []
+    with translation.override(settings.LANGUAGE_CODE):
+        for item in items:
+            producto = _datos_producto(item, previos.get(item.pk))
+            filas.append({
+                'pk': item.pk,
+                'producto': producto,
+                'nombre': producto['nombre'],
+                'descripcion': item.descripcion_editable or producto['descripcion'],
+                'cantidad': formats.localize(item.cantidad),
+                'precio_venta_unitario': _dinero(item.precio_venta_unitario),
+                'precio_costo_unitario': _dinero(item.precio_costo_unitario),
+                'total_linea_venta': _dinero(item.total_linea_venta),
+                'total_linea_costo': _dinero(item.total_linea_costo),
+                'ganancia_linea': _dinero(item.ganancia_linea),
+            })
+    return filas
+
+
+def _guardar(datos_por_pk, using):
+    CotizacionInstantanea.objects.using(using).bulk_create(
+        [CotizacionInstantanea(cotizacion_id=pk, datos=datos) for pk, datos in datos_por_pk.items()],
+        update_conflicts=True,
+        unique_fields=['cotizacion'],
+        update_fields=['datos', 'generada_en'],
+    )
+
+
+def obtener(pk, using=DEFAULT_DB_ALIAS, diferir_items=False):
+    """Datos de render de la cotización ``pk``.
+
+    Una emitida se lee con una sola consulta por clave primaria; si aún no tiene
+    instantánea (cotizaciones anteriores a esta tabla) se crea en ese momento.
+    Las demás se construyen desde el modelo; con ``diferir_items`` sus ítems solo
+    se consultan si la plantilla los recorre. Lanza ``Cotizacion.DoesNotExist``.
+    """
+    anterior = CotizacionInstantanea.objects.using(using).filter(pk=pk).values_list('datos', flat=True).first()
+    if anterior is not None and anterior.get('formato') == FORMATO:
+        return anterior
+    cotizacion = Cotizacion.objects.using(using).select_related('cliente').get(pk=pk)
+    items = cotizacion.items.select_related('producto_servicio')
+    if diferir_items and cotizacion.estado != Cotizacion.ESTADO_EMITIDA:
+        datos = construir(cotizacion, ())
+        datos['items'] = SimpleLazyObject(lambda: construir_items(items))
+        return datos
+    datos = construir(cotizacion, items, anterior)
+    if cotizacion.estado == Cotizacion.ESTADO_EMITIDA:
+        _guardar({pk: datos}, using)
+    return datos
+
+
+def regenerar(pks, using=DEFAULT_DB_ALIAS):
+    """Vuelve a generar las instantáneas de las cotizaciones emitidas entre ``pks`` y borra las del resto.
+
+    Solo se refrescan los campos de la cotización y de sus líneas; cliente y productos
+    se conservan de la instantánea anterior (ver ``construir``).
+    """
+    pks = list(pks)
+    items = CotizacionItem.objects.select_related('producto_servicio')
+    for inicio in range(0, len(pks), COTIZACIONES_POR_LOTE):
+        lote = pks[inicio:inicio + COTIZACIONES_POR_LOTE]
+        emitidas = (
+            Cotizacion.objects.using(using)
+            .filter(pk__in=lote, estado=Cotizacion.ESTADO_EMITIDA)
+            .select_related('cliente')
+            .prefetch_related(Prefetch('items', queryset=items))
+        )
+        anteriores = dict(CotizacionInstantanea.objects.using(using).filter(pk__in=lote).values_list('pk', 'datos'))
+        datos = {
+            cotizacion.pk: construir(cotizacion, cotizacion.items.all(), anteriores.get(cotizacion.pk))
+            for cotizacion in emitidas
+        }
+        with transaction.atomic(using=using):
+            if datos:
+                _guardar(datos, using)
+            CotizacionInstantanea.objects.using(using).filter(pk__in=lote).exclude(pk__in=list(datos)).delete()
+
+
+def _aplicar_pendientes(using):
+    pks = getattr(_pendientes, using, None)
+    if not pks:
+        return
+    setattr(_pendientes, using, None)
+    regenerar(pks, using)
+
+
+def marcar(pks, using=DEFAULT_DB_ALIAS):
+    """Programa la regeneración de las instantáneas de ``pks`` para cuando confirme la transacción."""
+    pendientes = getattr(_pendientes, using, None)
+    if pendientes is None:
+        pendientes = set()
+        setattr(_pendientes, using, pendientes)
+    pendientes.update(pks)
+    transaction.on_commit(lambda: _aplicar_pendientes(using), using=using)
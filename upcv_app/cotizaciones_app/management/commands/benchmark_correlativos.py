@@ -0,0 +1,76 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from cotizaciones_app.models import Cliente, Cotizacion
+
+
+class Command(BaseCommand):
+    help = 'Crea cotizaciones desde varios hilos y reporta rendimiento, duplicados y huecos de correlativos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Cantidad de hilos concurrentes')
+        parser.add_argument('--por-hilo', type=int, default=25, help='Cotizaciones que crea cada hilo')
+        parser.add_argument('--serie', default='BENCH', help='Serie usada para no mezclar con correlativos reales')
+        parser.add_argument('--conservar', action='store_true', help='No eliminar las cotizaciones creadas')
+
+    def handle(self, *args, **kwargs):
+        hilos = kwargs['hilos']
+        por_hilo = kwargs['por_hilo']
+        serie = kwargs['serie']
+
+        cliente = Cliente.objects.create(nombre='Benchmark correlativos')
+        creadas = []
+        errores = []
+        lock = threading.Lock()
+        barrera = threading.Barrier(hilos)
+
+        def trabajador():
+            try:
+                barrera.wait()
+                for _ in range(por_hilo):
+                    try:
+                        with transaction.atomic():
+                            cotizacion = Cotizacion.objects.create(
+                                cliente=cliente,
+                                serie=serie,
+                                titulo='Benchmark de correlativos',
+                            )
+                        with lock:
+                            creadas.append((cotizacion.pk, cotizacion.correlativo))
+                    except Exception as e:
+                        with lock:
+                            errores.append(str(e))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=trabajador) for _ in range(hilos)]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracion = time.perf_counter() - inicio
+
+        correlativos = [correlativo for _, correlativo in creadas]
+        numeros = sorted(int(correlativo.rsplit('-', 1)[-1]) for correlativo in correlativos)
+        duplicados = len(correlativos) - len(set(correlativos))
+        huecos = (numeros[-1] - numeros[0] + 1 - len(set(numeros))) if numeros else 0
+
+        self.stdout.write(f'Hilos: {hilos} · cotizaciones por hilo: {por_hilo}')
+        self.stdout.write(f'Creadas: {len(creadas)} en {duracion:.2f} s ({len(creadas) / duracion:.1f} cotizaciones/s)')
+        if numeros:
+            self.stdout.write(f'Rango asignado: {numeros[0]} - {numeros[-1]}')
+        self.stdout.write(f'Huecos en el rango: {huecos}')
+        if duplicados:
+            self.stdout.write(self.style.ERROR(f'Correlativos duplicados: {duplicados}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin correlativos duplicados.'))
+        if errores:
+            self.stdout.write(self.style.WARNING(f'Errores: {len(errores)} (primero: {errores[0]})'))
+
+        if not kwargs['conservar']:
+            Cotizacion.objects.filter(pk__in=[pk for pk, _ in creadas]).delete()
+            cliente.delete()
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cotizaciones_app.importacion import FILAS_POR_LOTE, IMPORTADORES, leer_filas
+
+
+class Command(BaseCommand):
+    help = 'Importa productos/servicios o clientes desde un archivo CSV o Excel (.xlsx)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalogo', choices=sorted(IMPORTADORES), help='Catálogo a importar')
+        parser.add_argument('archivo', help='Ruta del archivo CSV o Excel')
+        parser.add_argument('--hoja', help='Hoja de Excel a leer (por defecto la activa)')
+        parser.add_argument('--lote', type=int, default=FILAS_POR_LOTE, help='Filas por lote de escritura')
+        parser.add_argument('--dry-run', action='store_true', help='Valida y cuenta sin guardar cambios')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero.')
+        importador = IMPORTADORES[kwargs['catalogo']](dry_run=kwargs['dry_run'], lote=kwargs['lote'])
+        inicio = time.monotonic()
+
+        def progreso(resultado):
+            self.stdout.write(
+                f'{resultado.filas} filas leídas: {resultado.creados} nuevos, '
+                f'{resultado.actualizados} actualizados, {len(resultado.errores)} con errores '
+                f'({time.monotonic() - inicio:.1f} s)'
+            )
+
+        try:
+            resultado = importador.importar(leer_filas(kwargs['archivo'], kwargs['hoja']), progreso)
+        except (OSError, KeyError) as error:
+            raise CommandError(f'No se pudo leer el archivo: {error}')
+
+        for numero, mensaje in resultado.errores:
+            self.stderr.write(f'Fila {numero}: {mensaje}')
+
+        prefijo = 'Simulación (no se guardó nada)' if kwargs['dry_run'] else 'Importación terminada'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefijo}: {resultado.filas} filas, {resultado.creados} nuevos, '
+            f'{resultado.actualizados} actualizados, {len(resultado.errores)} con errores '
+            f'en {time.monotonic() - inicio:.2f} s.'
+        ))
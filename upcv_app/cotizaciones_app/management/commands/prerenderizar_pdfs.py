@@ -0,0 +1,40 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from cotizaciones_app.models import Cotizacion
+from cotizaciones_app.pdf import crear_pool, prerenderizar_cotizacion
+
+
+class Command(BaseCommand):
+    help = 'Genera en caché los PDF de cotizaciones emitidas que aún no los tengan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='Cotizaciones a generar (por defecto todas las emitidas)')
+        parser.add_argument('--procesos', type=int, default=2, help='Procesos en paralelo (0 = en este proceso)')
+
+    def handle(self, *args, **kwargs):
+        cotizaciones = Cotizacion.objects.order_by('pk')
+        if kwargs['ids']:
+            cotizaciones = cotizaciones.filter(pk__in=kwargs['ids'])
+        else:
+            cotizaciones = cotizaciones.filter(estado=Cotizacion.ESTADO_EMITIDA)
+        pks = list(cotizaciones.values_list('pk', flat=True))
+
+        errores = 0
+        if kwargs['procesos']:
+            with crear_pool(kwargs['procesos']) as pool:
+                futuros = {pool.submit(prerenderizar_cotizacion, pk): pk for pk in pks}
+                for futuro in as_completed(futuros):
+                    if futuro.exception() is not None:
+                        errores += 1
+                        self.stderr.write(f'Cotización {futuros[futuro]}: {futuro.exception()}')
+        else:
+            for pk in pks:
+                try:
+                    prerenderizar_cotizacion(pk)
+                except Exception as e:
+                    errores += 1
+                    self.stderr.write(f'Cotización {pk}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'PDF generados para {len(pks) - errores} de {len(pks)} cotizaciones.'))
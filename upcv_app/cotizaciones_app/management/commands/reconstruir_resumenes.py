@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from cotizaciones_app.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes diarios de ventas y de productos a partir de todas las cotizaciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Alias de la base de datos')
+
+    def handle(self, *args, **kwargs):
+        total = reconstruir(kwargs['database'])
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes reconstruidos: {total} filas.'))
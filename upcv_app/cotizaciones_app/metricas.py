@@ -0,0 +1,231 @@
+"""Métricas por vista (solicitudes, latencia, consultas, plantillas y PDF) en formato Prometheus.
+
+La agregación vive en memoria de cada proceso: registrar una solicitud cuesta unas
+cuantas sumas bajo un lock y ``connection.execute_wrapper`` agrega una llamada por
+consulta. Con varios procesos cada uno expone sus propios contadores; el scrape a
+``cotizaciones:metricas`` devuelve los del proceso que atiende la solicitud.
+
+Las consultas y plantillas de respuestas en streaming (exportaciones) que ocurren
+después de devolver la respuesta no se cuentan.
+"""
+import bisect
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates
+
+# Límites superiores (segundos) del histograma de latencia
+LATENCIA_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+VISTA_SIN_RESOLVER = '(sin resolver)'
+VISTA_SEGUNDO_PLANO = '(segundo plano)'
+
+_actual = threading.local()
+
+
+def activas():
+    return getattr(settings, 'COTIZACIONES_METRICAS', True)
+
+
+class Medicion:
+    """Acumula lo que cuesta una solicitud; es también el ``execute_wrapper`` de la conexión."""
+
+    __slots__ = ('consultas', 'db', 'plantillas', 'pdf', 'pdfs')
+
+    def __init__(self):
+        self.consultas = 0
+        self.db = 0.0
+        self.plantillas = 0.0
+        self.pdf = 0.0
+        self.pdfs = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - inicio
+            self.consultas += 1
+
+
+class _Serie:
+    __slots__ = ('solicitudes', 'buckets', 'segundos', 'consultas', 'db', 'plantillas', 'pdf', 'pdfs')
+
+    def __init__(self):
+        self.solicitudes = 0
+        self.buckets = [0] * (len(LATENCIA_BUCKETS) + 1)
+        self.segundos = 0.0
+        self.consultas = 0
+        self.db = 0.0
+        self.plantillas = 0.0
+        self.pdf = 0.0
+        self.pdfs = 0
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def registrar(self, vista, duracion, medicion):
+        with self._lock:
+            serie = self._series.get(vista)
+            if serie is None:
+                serie = self._series[vista] = _Serie()
+            if duracion is not None:
+                serie.solicitudes += 1
+                serie.buckets[bisect.bisect_left(LATENCIA_BUCKETS, duracion)] += 1
+                serie.segundos += duracion
+            serie.consultas += medicion.consultas
+            serie.db += medicion.db
+            serie.plantillas += medicion.plantillas
+            serie.pdf += medicion.pdf
+            serie.pdfs += medicion.pdfs
+
+    def reiniciar(self):
+        with self._lock:
+            self._series = {}
+
+    def exportar(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        with self._lock:
+            series = sorted(
+                (vista, serie.solicitudes, list(serie.buckets), serie.segundos, serie.consultas,
+                 serie.db, serie.plantillas, serie.pdf, serie.pdfs)
+                for vista, serie in self._series.items()
+            )
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda, valores):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            lineas.extend(valores)
+
+        def por_vista(nombre, indice):
+            return [f'{nombre}{{vista="{_etiqueta(fila[0])}"}} {_numero(fila[indice])}' for fila in series]
+
+        histograma = []
+        for vista, solicitudes, buckets, segundos, *_ in series:
+            etiqueta = _etiqueta(vista)
+            acumulado = 0
+            for limite, cantidad in zip(LATENCIA_BUCKETS + ('+Inf',), buckets):
+                acumulado += cantidad
+                histograma.append(
+                    f'cotizaciones_solicitud_segundos_bucket{{vista="{etiqueta}",le="{limite}"}} {acumulado}'
+                )
+            histograma.append(f'cotizaciones_solicitud_segundos_sum{{vista="{etiqueta}"}} {_numero(segundos)}')
+            histograma.append(f'cotizaciones_solicitud_segundos_count{{vista="{etiqueta}"}} {solicitudes}')
+
+        metrica('cotizaciones_solicitudes_total', 'counter', 'Solicitudes atendidas por vista.',
+                por_vista('cotizaciones_solicitudes_total', 1))
+        metrica('cotizaciones_solicitud_segundos', 'histogram', 'Latencia de la solicitud en segundos.', histograma)
+        metrica('cotizaciones_db_consultas_total', 'counter', 'Consultas SQL ejecutadas.',
+                por_vista('cotizaciones_db_consultas_total', 4))
+        metrica('cotizaciones_db_segundos_total', 'counter', 'Tiempo en consultas SQL.',
+                por_vista('cotizaciones_db_segundos_total', 5))
+        metrica('cotizaciones_plantillas_segundos_total', 'counter', 'Tiempo renderizando plantillas.',
+                por_vista('cotizaciones_plantillas_segundos_total', 6))
+        metrica('cotizaciones_pdf_segundos_total', 'counter', 'Tiempo en pisa.CreatePDF.',
+                por_vista('cotizaciones_pdf_segundos_total', 7))
+        metrica('cotizaciones_pdf_total', 'counter', 'PDF generados.', por_vista('cotizaciones_pdf_total', 8))
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiqueta(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _numero(valor):
+    return repr(round(valor, 6)) if isinstance(valor, float) else str(valor)
+
+
+registro = Registro()
+
+
+class MetricasMiddleware:
+    """Mide cada solicitud y la suma a ``registro`` bajo el nombre de la URL resuelta."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not activas():
+            return self.get_response(request)
+        inicio = perf_counter()
+        with midiendo() as medicion:
+            try:
+                with connection.execute_wrapper(medicion):
+                    return self.get_response(request)
+            finally:
+                match = getattr(request, 'resolver_match', None)
+                registro.registrar(match.view_name if match else VISTA_SIN_RESOLVER, perf_counter() - inicio, medicion)
+
+
+@contextmanager
+def midiendo():
+    """Hace de una ``Medicion`` nueva la del hilo actual mientras dure el bloque."""
+    anterior = getattr(_actual, 'medicion', None)
+    medicion = _actual.medicion = Medicion()
+    try:
+        yield medicion
+    finally:
+        _actual.medicion = anterior
+
+
+@contextmanager
+def medir_pdf():
+    """Suma una llamada a ``pisa.CreatePDF`` a la medición en curso, si la hay."""
+    inicio = perf_counter()
+    try:
+        yield
+    finally:
+        medicion = getattr(_actual, 'medicion', None)
+        if medicion is not None:
+            medicion.pdf += perf_counter() - inicio
+            medicion.pdfs += 1
+
+
+def registrar_segundo_plano(pdf, pdfs):
+    """Registra el tiempo de PDF medido en el pool de prerender (otro proceso)."""
+    if activas() and pdfs:
+        medicion = Medicion()
+        medicion.pdf, medicion.pdfs = pdf, pdfs
+        registro.registrar(VISTA_SEGUNDO_PLANO, None, medicion)
+
+
+class _PlantillaMedida:
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        medicion = getattr(_actual, 'medicion', None)
+        # Un render_to_string dentro de otra plantilla ya cuenta en el tiempo de la exterior.
+        if medicion is None or getattr(_actual, 'en_plantilla', False):
+            return self.plantilla.render(context, request)
+        _actual.en_plantilla = True
+        inicio = perf_counter()
+        try:
+            return self.plantilla.render(context, request)
+        finally:
+            medicion.plantillas += perf_counter() - inicio
+            _actual.en_plantilla = False
+
+
+class PlantillasMedidas(DjangoTemplates):
+    """Backend ``DjangoTemplates`` que suma el tiempo de render a la solicitud en curso.
+
+    Solo envuelve las plantillas de nivel superior (``render``/``TemplateResponse``);
+    los ``{% include %}`` y context processors quedan dentro de ese tiempo.
+    """
+
+    def from_string(self, template_code):
+        return _PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _PlantillaMedida(super().get_template(template_name))
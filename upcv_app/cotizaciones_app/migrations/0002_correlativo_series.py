@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:52
+
+from django.db import migrations, models
+
+
+SECUENCIA = 'cotizaciones_correlativo_seq'
+
+
+def crear_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    CotizacionCorrelativo = apps.get_model('cotizaciones_app', 'CotizacionCorrelativo')
+    contador = CotizacionCorrelativo.objects.using(schema_editor.connection.alias).filter(serie='').first()
+    ultimo = contador.last_number if contador else 0
+    schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {SECUENCIA} START WITH {ultimo + 1}')
+
+
+def eliminar_secuencia(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP SEQUENCE IF EXISTS {SECUENCIA}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotizacion',
+            name='serie',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='cotizacioncorrelativo',
+            name='serie',
+            field=models.CharField(blank=True, default='', max_length=10, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='cotizacion',
+            name='correlativo',
+            field=models.CharField(blank=True, max_length=20, unique=True),
+        ),
+        migrations.RunPython(crear_secuencia, eliminar_secuencia),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0002_correlativo_series'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productoservicio',
+            index=models.Index(fields=['activo', 'nombre'], name='producto_activo_nombre_idx'),
+        ),
+    ]
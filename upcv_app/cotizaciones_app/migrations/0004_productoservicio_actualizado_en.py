@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0003_producto_activo_nombre_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productoservicio',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:40
+
+from django.db import migrations
+
+# Columnas con índice GIN trigram sobre cotizaciones_normalizar(columna).
+INDICES = [
+    ('cotizaciones_app_cliente', 'nombre'),
+    ('cotizaciones_app_cliente', 'telefono'),
+    ('cotizaciones_app_cliente', 'email'),
+    ('cotizaciones_app_cliente', 'nit'),
+    ('cotizaciones_app_productoservicio', 'nombre'),
+    ('cotizaciones_app_productoservicio', 'descripcion'),
+]
+
+
+def crear_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        # En SQLite las tablas FTS5 las mantiene busqueda.sincronizar_fts tras cada migrate.
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    # unaccent() no es IMMUTABLE y no puede indexarse; esta envoltura fija el diccionario.
+    schema_editor.execute(
+        "CREATE OR REPLACE FUNCTION cotizaciones_normalizar(text) RETURNS text AS $$ "
+        "SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) "
+        "$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+    )
+    for tabla, columna in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {tabla}_{columna}_trgm '
+            f'ON {tabla} USING gin (cotizaciones_normalizar({columna}) gin_trgm_ops)'
+        )
+
+
+def eliminar_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for tabla, columna in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {tabla}_{columna}_trgm')
+    schema_editor.execute('DROP FUNCTION IF EXISTS cotizaciones_normalizar(text)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0004_productoservicio_actualizado_en'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_busqueda, eliminar_busqueda),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0005_busqueda_trigram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['fecha_emision', 'id'], name='cotizacion_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['estado', 'fecha_emision', 'id'], name='cotizacion_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacion',
+            index=models.Index(fields=['cliente', 'fecha_emision', 'id'], name='cotizacion_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cotizacionitem',
+            index=models.Index(fields=['cotizacion', 'created_at', 'id'], name='item_cotizacion_creado_idx'),
+        ),
+    ]
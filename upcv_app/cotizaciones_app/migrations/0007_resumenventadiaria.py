@@ -0,0 +1,59 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:14
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def llenar_resumenes(apps, schema_editor):
+    Cotizacion = apps.get_model('cotizaciones_app', 'Cotizacion')
+    ResumenVentaDiaria = apps.get_model('cotizaciones_app', 'ResumenVentaDiaria')
+    using = schema_editor.connection.alias
+    agregados = (
+        Cotizacion.objects.using(using).order_by().values('fecha_emision', 'cliente_id', 'estado')
+        .annotate(cantidad=Count('pk'), venta=Sum('subtotal_venta'), costo=Sum('subtotal_costo'), ganancia=Sum('ganancia_total'))
+    )
+    ResumenVentaDiaria.objects.using(using).bulk_create(
+        (
+            ResumenVentaDiaria(
+                fecha=datos['fecha_emision'],
+                cliente_id=datos['cliente_id'],
+                estado=datos['estado'],
+                cantidad=datos['cantidad'],
+                subtotal_venta=datos['venta'] or Decimal('0.00'),
+                subtotal_costo=datos['costo'] or Decimal('0.00'),
+                ganancia_total=datos['ganancia'] or Decimal('0.00'),
+            )
+            for datos in agregados.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0006_indices_listado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('BORRADOR', 'Borrador'), ('EMITIDA', 'Emitida'), ('ANULADA', 'Anulada')], max_length=20)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('subtotal_venta', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('subtotal_costo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ganancia_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_venta', to='cotizaciones_app.cliente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'fecha'], name='resumen_estado_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'cliente', 'estado'), name='resumen_fecha_cliente_estado_uniq')],
+            },
+        ),
+        migrations.RunPython(llenar_resumenes, migrations.RunPython.noop),
+    ]
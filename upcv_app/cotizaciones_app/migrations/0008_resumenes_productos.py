@@ -0,0 +1,115 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:25
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def llenar_resumenes(apps, schema_editor):
+    CotizacionItem = apps.get_model('cotizaciones_app', 'CotizacionItem')
+    ResumenProductoDiario = apps.get_model('cotizaciones_app', 'ResumenProductoDiario')
+    ResumenProductoMensual = apps.get_model('cotizaciones_app', 'ResumenProductoMensual')
+    using = schema_editor.connection.alias
+    diarios = (
+        CotizacionItem.objects.using(using).order_by()
+        .values('cotizacion__fecha_emision', 'cotizacion__estado', 'producto_servicio_id')
+        .annotate(
+            suma_lineas=Count('pk'),
+            suma_cantidad=Sum('cantidad'),
+            suma_venta=Sum('total_linea_venta'),
+            suma_costo=Sum('total_linea_costo'),
+            suma_ganancia=Sum('ganancia_linea'),
+        )
+    )
+    ResumenProductoDiario.objects.using(using).bulk_create(
+        (
+            ResumenProductoDiario(
+                fecha=datos['cotizacion__fecha_emision'],
+                producto_id=datos['producto_servicio_id'],
+                estado=datos['cotizacion__estado'],
+                lineas=datos['suma_lineas'],
+                cantidad=datos['suma_cantidad'] or Decimal('0.00'),
+                total_venta=datos['suma_venta'] or Decimal('0.00'),
+                total_costo=datos['suma_costo'] or Decimal('0.00'),
+                ganancia=datos['suma_ganancia'] or Decimal('0.00'),
+            )
+            for datos in diarios.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+    mensuales = (
+        ResumenProductoDiario.objects.using(using).annotate(inicio=TruncMonth('fecha')).order_by()
+        .values('inicio', 'producto_id', 'estado')
+        .annotate(
+            suma_lineas=Sum('lineas'),
+            suma_cantidad=Sum('cantidad'),
+            suma_venta=Sum('total_venta'),
+            suma_costo=Sum('total_costo'),
+            suma_ganancia=Sum('ganancia'),
+        )
+    )
+    ResumenProductoMensual.objects.using(using).bulk_create(
+        (
+            ResumenProductoMensual(
+                mes=datos['inicio'],
+                producto_id=datos['producto_id'],
+                estado=datos['estado'],
+                lineas=datos['suma_lineas'],
+                cantidad=datos['suma_cantidad'] or Decimal('0.00'),
+                total_venta=datos['suma_venta'] or Decimal('0.00'),
+                total_costo=datos['suma_costo'] or Decimal('0.00'),
+                ganancia=datos['suma_ganancia'] or Decimal('0.00'),
+            )
+            for datos in mensuales.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0007_resumenventadiaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('BORRADOR', 'Borrador'), ('EMITIDA', 'Emitida'), ('ANULADA', 'Anulada')], max_length=20)),
+                ('lineas', models.PositiveIntegerField(default=0)),
+                ('cantidad', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_venta', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_costo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ganancia', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='cotizaciones_app.productoservicio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'fecha', 'producto'], name='resumen_prod_estado_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto', 'estado'), name='resumen_fecha_producto_estado_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('estado', models.CharField(choices=[('BORRADOR', 'Borrador'), ('EMITIDA', 'Emitida'), ('ANULADA', 'Anulada')], max_length=20)),
+                ('lineas', models.PositiveIntegerField(default=0)),
+                ('cantidad', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_venta', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_costo', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ganancia', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_mensuales', to='cotizaciones_app.productoservicio')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'mes', 'producto'], name='resumen_prod_estado_mes_idx')],
+                'constraints': [models.UniqueConstraint(fields=('mes', 'producto', 'estado'), name='resumen_mes_producto_estado_uniq')],
+            },
+        ),
+        migrations.RunPython(llenar_resumenes, migrations.RunPython.noop),
+    ]
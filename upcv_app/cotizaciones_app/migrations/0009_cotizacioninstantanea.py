@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0008_resumenes_productos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CotizacionInstantanea',
+            fields=[
+                ('cotizacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='instantanea', serialize=False, to='cotizaciones_app.cotizacion')),
+                ('datos', models.JSONField()),
+                ('generada_en', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cotizaciones_app', '0009_cotizacioninstantanea'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cotizacion',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,9 +1,52 @@
+import threading
+from contextlib import contextmanager
 from decimal import Decimal
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
+from django.db import models, router, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.utils import timezone
 
+from almacen_app import versiones
+
+from .correlativos import formatear_correlativo, obtener_asignador
+
+
+_totales_estado = threading.local()
+
+CLAVE_VERSION_CATALOGO = 'cotizaciones:catalogo:version'
+
+# Se envía tras actualizar totales con UPDATE directo (sin post_save); argumentos: pks, using.
+totales_actualizados = Signal()
+
+
+@contextmanager
+def totales_diferidos():
+    """Difiere el recálculo de totales de las cotizaciones tocadas dentro del bloque.
+
+    Los ``save()``/``delete()`` de ``CotizacionItem`` solo registran la cotización
+    afectada y al salir se recalculan todas con una única sentencia UPDATE.
+    Los bloques anidados se unen al bloque exterior.
+    """
+    pendientes = getattr(_totales_estado, 'pendientes', None)
+    if pendientes is not None:
+        yield pendientes
+        return
+    pendientes = _totales_estado.pendientes = set()
+    try:
+        yield pendientes
+    finally:
+        _totales_estado.pendientes = None
+    if pendientes:
+        Cotizacion.recalcular_totales(pendientes)
+
+
+def _totales_pendientes():
+    return getattr(_totales_estado, 'pendientes', None)
+
 
 class Cliente(models.Model):
     nombre = models.CharField(max_length=200)
@@ -35,10 +78,31 @@ class ProductoServicio(models.Model):
     precio_costo = models.DecimalField(max_digits=12, decimal_places=2)
     precio_venta = models.DecimalField(max_digits=12, decimal_places=2)
     activo = models.BooleanField(default=True)
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['activo', 'nombre'], name='producto_activo_nombre_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.nombre
 
+    @classmethod
+    def version_catalogo(cls) -> str:
+        """Token que cambia cuando se crea, modifica o elimina cualquier producto."""
+        return versiones.obtener(CLAVE_VERSION_CATALOGO)
+
+    @classmethod
+    def invalidar_catalogo(cls, using=None) -> None:
+        """Renueva la versión del catálogo; llamar tras cualquier escritura a productos.
+
+        Se renueva ya y otra vez al confirmar: lo que se cachee entre ambas con datos aún
+        sin confirmar queda bajo un token que deja de valer.
+        """
+        versiones.renovar(CLAVE_VERSION_CATALOGO)
+        transaction.on_commit(lambda: versiones.renovar(CLAVE_VERSION_CATALOGO), using=using)
+
     def clean(self) -> None:
         if self.precio_costo < 0:
             raise ValidationError({'precio_costo': 'El precio de costo no puede ser negativo.'})
@@ -47,9 +111,12 @@ class ProductoServicio(models.Model):
 
 
 class CotizacionCorrelativo(models.Model):
+    serie = models.CharField(max_length=10, blank=True, default='', unique=True)
     last_number = models.PositiveIntegerField(default=0)
 
     def __str__(self) -> str:
+        if self.serie:
+            return f"Correlativo actual ({self.serie}): {self.last_number}"
         return f"Correlativo actual: {self.last_number}"
 
 
@@ -63,7 +130,8 @@ class Cotizacion(models.Model):
         (ESTADO_ANULADA, 'Anulada'),
     ]
 
-    correlativo = models.CharField(max_length=5, unique=True, blank=True)
+    serie = models.CharField(max_length=10, blank=True)
+    correlativo = models.CharField(max_length=20, unique=True, blank=True)
     fecha_emision = models.DateField(default=timezone.now)
     cliente = models.ForeignKey(Cliente, on_delete=models.PROTECT, related_name='cotizaciones')
     titulo = models.CharField(max_length=255, blank=True)
@@ -78,9 +146,16 @@ class Cotizacion(models.Model):
     subtotal_costo = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     ganancia_total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     created_at = models.DateTimeField(auto_now_add=True)
+    # Cambia con cualquier modificación del encabezado o de sus ítems; versiona la caché de fragmentos.
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-fecha_emision', '-id']
+        indexes = [
+            models.Index(fields=['fecha_emision', 'id'], name='cotizacion_fecha_id_idx'),
+            models.Index(fields=['estado', 'fecha_emision', 'id'], name='cotizacion_estado_fecha_idx'),
+            models.Index(fields=['cliente', 'fecha_emision', 'id'], name='cotizacion_cliente_fecha_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.correlativo} - {self.cliente}"
@@ -99,17 +174,136 @@ class Cotizacion(models.Model):
         if errors:
             raise ValidationError(errors)
 
+    def _serie_correlativo(self) -> str:
+        if self.serie:
+            return self.serie
+        if getattr(settings, 'COTIZACIONES_CORRELATIVO_SERIE_ANUAL', False):
+            return str(self.fecha_emision.year)
+        return ''
+
     def _generar_correlativo(self) -> str:
-        with transaction.atomic():
-            correlativo, _ = CotizacionCorrelativo.objects.select_for_update().get_or_create(id=1)
-            correlativo.last_number += 1
-            correlativo.save(update_fields=['last_number'])
-            return f"{correlativo.last_number:05d}"
+        serie = self._serie_correlativo()
+        using = router.db_for_write(Cotizacion, instance=self)
+        numero = obtener_asignador(using).siguiente(serie, using)
+        return formatear_correlativo(serie, numero)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._estado_guardado = instance.__dict__.get('estado')
+        instance._resumen_guardado = instance.clave_resumen()
+        return instance
+
+    def clave_resumen(self):
+        """(fecha, cliente_id, estado) del resumen diario al que suma esta cotización."""
+        fecha = self.__dict__.get('fecha_emision')
+        if fecha is not None:
+            fecha = self._meta.get_field('fecha_emision').to_python(fecha)
+        return fecha, self.__dict__.get('cliente_id'), self.__dict__.get('estado')
+
+    @property
+    def pasa_a_emitida(self) -> bool:
+        """Indica si el guardado en curso cambia el estado a emitida."""
+        return self.estado == self.ESTADO_EMITIDA and getattr(self, '_estado_guardado', None) != self.ESTADO_EMITIDA
 
     def save(self, *args, **kwargs):
         if not self.correlativo:
             self.correlativo = self._generar_correlativo()
         super().save(*args, **kwargs)
+        self._estado_guardado = self.estado
+        self._resumen_guardado = self.clave_resumen()
+
+    @classmethod
+    def recalcular_totales(cls, pks) -> int:
+        """Recalcula en una sola sentencia los totales de las cotizaciones indicadas."""
+        def suma(campo):
+            subtotal = (
+                CotizacionItem.objects.filter(cotizacion=OuterRef('pk'))
+                .order_by()
+                .values('cotizacion')
+                .annotate(total=Sum(campo))
+                .values('total')
+            )
+            return Coalesce(
+                Subquery(subtotal, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+
+        filas = cls.objects.filter(pk__in=pks).update(
+            actualizado_en=timezone.now(),
+            subtotal_venta=suma('total_linea_venta'),
+            subtotal_costo=suma('total_linea_costo'),
+            ganancia_total=suma('ganancia_linea'),
+        )
+        totales_actualizados.send(sender=cls, pks=set(pks), using=router.db_for_write(cls))
+        return filas
+
+    @classmethod
+    def ajustar_totales(cls, pk, venta, costo, ganancia) -> None:
+        """Aplica un delta a los totales de una cotización sin volver a sumar sus ítems.
+
+        Con delta cero solo marca la cotización como modificada (cambió la descripción de un ítem).
+        """
+        if not (venta or costo or ganancia):
+            cls.objects.filter(pk=pk).update(actualizado_en=timezone.now())
+            return
+        cls.objects.filter(pk=pk).update(
+            actualizado_en=timezone.now(),
+            subtotal_venta=F('subtotal_venta') + venta,
+            subtotal_costo=F('subtotal_costo') + costo,
+            ganancia_total=F('ganancia_total') + ganancia,
+        )
+        totales_actualizados.send(sender=cls, pks={pk}, using=router.db_for_write(cls))
+
+    def duplicar(self, cliente, actualizar_precios=False) -> 'Cotizacion':
+        """Copia la cotización como borrador nuevo para ``cliente``.
+
+        Los ítems se insertan con un solo ``bulk_create`` y los totales se calculan
+        en memoria antes de guardar el encabezado, así que el costo no depende de
+        cuántas líneas tenga. Con ``actualizar_precios`` toma los precios vigentes
+        del catálogo en lugar de los de la cotización original.
+        """
+        items = self.items.all()
+        if actualizar_precios:
+            items = items.select_related('producto_servicio')
+        copias = []
+        for item in items:
+            copia_item = CotizacionItem(
+                producto_servicio_id=item.producto_servicio_id,
+                descripcion_editable=item.descripcion_editable,
+                cantidad=item.cantidad,
+                precio_venta_unitario=item.precio_venta_unitario,
+                precio_costo_unitario=item.precio_costo_unitario,
+            )
+            if actualizar_precios:
+                copia_item.precio_venta_unitario = item.producto_servicio.precio_venta
+                copia_item.precio_costo_unitario = item.producto_servicio.precio_costo
+            copia_item.calcular_totales()
+            copias.append(copia_item)
+
+        cero = Decimal('0.00')
+        copia = Cotizacion(
+            serie=self.serie,
+            cliente=cliente,
+            titulo=self.titulo,
+            validez_dias=self.validez_dias,
+            observaciones=self.observaciones,
+            garantia_texto=self.garantia_texto,
+            estado=self.ESTADO_BORRADOR,
+            subtotal_venta=sum((item.total_linea_venta for item in copias), cero),
+            subtotal_costo=sum((item.total_linea_costo for item in copias), cero),
+            ganancia_total=sum((item.ganancia_linea for item in copias), cero),
+        )
+        using = router.db_for_write(Cotizacion, instance=self)
+        with transaction.atomic(using=using):
+            copia.save(using=using)
+            for item in copias:
+                item.cotizacion = copia
+            # bulk_create no envía post_save por ítem; el resumen de la cotización nueva
+            # se refresca al confirmar (post_save del encabezado) e incluye estas líneas.
+            CotizacionItem.objects.using(using).bulk_create(copias, batch_size=500)
+        return copia
 
     def actualizar_totales(self) -> None:
         totales = self.items.aggregate(
@@ -120,7 +314,91 @@ class Cotizacion(models.Model):
         self.subtotal_venta = totales['total_venta'] or Decimal('0.00')
         self.subtotal_costo = totales['total_costo'] or Decimal('0.00')
         self.ganancia_total = totales['total_ganancia'] or Decimal('0.00')
-        self.save(update_fields=['subtotal_venta', 'subtotal_costo', 'ganancia_total'])
+        self.save(update_fields=['subtotal_venta', 'subtotal_costo', 'ganancia_total', 'actualizado_en'])
+
+
+class CotizacionInstantanea(models.Model):
+    """Contenido ya formateado de una cotización emitida; lo mantiene ``instantaneas.py``."""
+
+    cotizacion = models.OneToOneField(
+        Cotizacion, on_delete=models.CASCADE, primary_key=True, related_name='instantanea',
+    )
+    datos = models.JSONField()
+    generada_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Instantánea {self.cotizacion_id}"
+
+
+class ResumenVentaDiaria(models.Model):
+    """Totales de cotizaciones por día, cliente y estado; lo mantiene ``resumenes.py``."""
+
+    fecha = models.DateField()
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='resumenes_venta')
+    estado = models.CharField(max_length=20, choices=Cotizacion.ESTADO_CHOICES)
+    cantidad = models.PositiveIntegerField(default=0)
+    subtotal_venta = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    subtotal_costo = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ganancia_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'cliente', 'estado'], name='resumen_fecha_cliente_estado_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'fecha'], name='resumen_estado_fecha_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.fecha} - {self.cliente_id} - {self.estado}"
+
+
+class ResumenProductoDiario(models.Model):
+    """Totales de ítems por día, producto y estado de la cotización; lo mantiene ``resumenes.py``."""
+
+    fecha = models.DateField()
+    producto = models.ForeignKey(ProductoServicio, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    estado = models.CharField(max_length=20, choices=Cotizacion.ESTADO_CHOICES)
+    lineas = models.PositiveIntegerField(default=0)
+    cantidad = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_venta = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_costo = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ganancia = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto', 'estado'], name='resumen_fecha_producto_estado_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'fecha', 'producto'], name='resumen_prod_estado_fecha_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.fecha} - {self.producto_id} - {self.estado}"
+
+
+class ResumenProductoMensual(models.Model):
+    """Suma mensual de ``ResumenProductoDiario``; ``mes`` es el primer día del mes."""
+
+    mes = models.DateField()
+    producto = models.ForeignKey(ProductoServicio, on_delete=models.CASCADE, related_name='resumenes_mensuales')
+    estado = models.CharField(max_length=20, choices=Cotizacion.ESTADO_CHOICES)
+    lineas = models.PositiveIntegerField(default=0)
+    cantidad = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_venta = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_costo = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    ganancia = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mes', 'producto', 'estado'], name='resumen_mes_producto_estado_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'mes', 'producto'], name='resumen_prod_estado_mes_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.mes:%Y-%m} - {self.producto_id} - {self.estado}"
 
 
 class CotizacionItem(models.Model):
@@ -137,6 +415,9 @@ class CotizacionItem(models.Model):
 
     class Meta:
         ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['cotizacion', 'created_at', 'id'], name='item_cotizacion_creado_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.cotizacion.correlativo} - {self.producto_servicio.nombre}"
@@ -153,14 +434,54 @@ class CotizacionItem(models.Model):
         if errors:
             raise ValidationError(errors)
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._totales_guardados = instance._totales_linea()
+        return instance
+
+    def _totales_linea(self):
+        valores = (
+            self.__dict__.get('total_linea_venta'),
+            self.__dict__.get('total_linea_costo'),
+            self.__dict__.get('ganancia_linea'),
+        )
+        if any(valor is None for valor in valores):
+            return None
+        return valores
+
+    def calcular_totales(self) -> None:
         self.total_linea_venta = (self.cantidad or Decimal('0.00')) * (self.precio_venta_unitario or Decimal('0.00'))
         self.total_linea_costo = (self.cantidad or Decimal('0.00')) * (self.precio_costo_unitario or Decimal('0.00'))
         self.ganancia_linea = self.total_linea_venta - self.total_linea_costo
+
+    def _propagar_totales(self, anteriores, actuales) -> None:
+        pendientes = _totales_pendientes()
+        if pendientes is not None:
+            pendientes.add(self.cotizacion_id)
+            return
+        if anteriores is None or actuales is None:
+            self.cotizacion.actualizar_totales()
+            return
+        delta = [actual - anterior for actual, anterior in zip(actuales, anteriores)]
+        Cotizacion.ajustar_totales(self.cotizacion_id, *delta)
+        if CotizacionItem.cotizacion.is_cached(self):
+            cotizacion = self.cotizacion
+            cotizacion.subtotal_venta += delta[0]
+            cotizacion.subtotal_costo += delta[1]
+            cotizacion.ganancia_total += delta[2]
+
+    def save(self, *args, **kwargs):
+        cero = Decimal('0.00')
+        anteriores = (cero, cero, cero) if self._state.adding else getattr(self, '_totales_guardados', None)
+        self.calcular_totales()
         super().save(*args, **kwargs)
-        self.cotizacion.actualizar_totales()
+        self._totales_guardados = self._totales_linea()
+        self._propagar_totales(anteriores, self._totales_guardados)
 
     def delete(self, *args, **kwargs):
-        cotizacion = self.cotizacion
-        super().delete(*args, **kwargs)
-        cotizacion.actualizar_totales()
+        cero = Decimal('0.00')
+        anteriores = getattr(self, '_totales_guardados', None)
+        resultado = super().delete(*args, **kwargs)
+        self._propagar_totales(anteriores, (cero, cero, cero))
+        return resultado
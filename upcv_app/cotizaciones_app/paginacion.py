@@ -0,0 +1,96 @@
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+SALT_CURSOR = 'cotizaciones.paginacion'
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+def codificar_cursor(direccion, objeto, campos):
+    valores = [str(getattr(objeto, campo)) for campo in campos]
+    return signing.dumps([direccion, *valores], salt=SALT_CURSOR, compress=True)
+
+
+def decodificar_cursor(cursor, queryset, campos):
+    """Devuelve (dirección, valores) o None si el cursor falta, está alterado o no es válido."""
+    if not cursor:
+        return None
+    try:
+        direccion, *crudos = signing.loads(cursor, salt=SALT_CURSOR)
+        opciones = queryset.model._meta
+        valores = [opciones.get_field(campo).to_python(crudo) for campo, crudo in zip(campos, crudos, strict=True)]
+    except (signing.BadSignature, ValidationError, ValueError, TypeError):
+        return None
+    if direccion not in (SIGUIENTE, ANTERIOR):
+        return None
+    return direccion, valores
+
+
+class PaginaKeyset:
+    def __init__(self, object_list, cursor_siguiente, cursor_anterior):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _despues_de(campos, valores, descendente):
+    """Filas estrictamente posteriores a ``valores`` en el orden (descendente o no) de ``campos``."""
+    operador = 'lt' if descendente else 'gt'
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(campos, valores):
+        condicion |= Q(**iguales, **{f'{campo}__{operador}': valor})
+        iguales[campo] = valor
+    return condicion
+
+
+def paginar_keyset(queryset, cursor, por_pagina, campos=('fecha_emision', 'id')):
+    """Pagina por búsqueda (seek) en orden descendente de ``campos``.
+
+    Cada página filtra por la última fila vista en lugar de usar OFFSET, así
+    que la página N cuesta lo mismo que la primera si hay un índice que termine
+    en ``campos``. Los cursores son firmados y opacos para el cliente.
+    """
+    decodificado = decodificar_cursor(cursor, queryset, campos)
+    descendente = [f'-{campo}' for campo in campos]
+    ascendente = list(campos)
+
+    if decodificado is None:
+        filas = list(queryset.order_by(*descendente)[:por_pagina + 1])
+        hay_mas = len(filas) > por_pagina
+        filas = filas[:por_pagina]
+        hay_siguiente, hay_anterior = hay_mas, False
+    else:
+        direccion, valores = decodificado
+        if direccion == SIGUIENTE:
+            filas = list(queryset.filter(_despues_de(campos, valores, True)).order_by(*descendente)[:por_pagina + 1])
+            hay_mas = len(filas) > por_pagina
+            filas = filas[:por_pagina]
+            hay_siguiente, hay_anterior = hay_mas, True
+        else:
+            filas = list(queryset.filter(_despues_de(campos, valores, False)).order_by(*ascendente)[:por_pagina + 1])
+            hay_mas = len(filas) > por_pagina
+            filas = filas[:por_pagina][::-1]
+            hay_siguiente, hay_anterior = True, hay_mas
+
+    return PaginaKeyset(
+        filas,
+        codificar_cursor(SIGUIENTE, filas[-1], campos) if filas and hay_siguiente else None,
+        codificar_cursor(ANTERIOR, filas[0], campos) if filas and hay_anterior else None,
+    )
@@ -0,0 +1,395 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import pypdfium2
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import get_template, render_to_string
+from xhtml2pdf import pisa
+
+from .metricas import medir_pdf, midiendo, registrar_segundo_plano
+
+logger = logging.getLogger(__name__)
+
+
+PDF_CLIENTE = 'cliente'
+PDF_INTERNO = 'interno'
+
+PLANTILLAS_PDF = {
+    PDF_CLIENTE: 'cotizaciones_app/cotizacion_cliente_pdf.html',
+    PDF_INTERNO: 'cotizaciones_app/cotizacion_print.html',
+}
+PLANTILLA_BASE = 'cotizaciones_app/cotizacion_export_base.html'
+
+
+def contexto_pdf(tipo, cotizacion, items, institucion):
+    contexto = {
+        'cotizacion': cotizacion,
+        'items': items,
+        'institucion': institucion,
+    }
+    if tipo == PDF_INTERNO:
+        contexto.update({'show_costs': True, 'is_internal': True})
+    else:
+        contexto.update({
+            'account_number': '123-456789-0',
+            'bank_name': None,
+            'show_costs': False,
+            'is_internal': False,
+        })
+    return contexto
+
+
+def _resolver_asset(uri):
+    if uri.startswith(settings.MEDIA_URL):
+        path = os.path.join(settings.MEDIA_ROOT, uri.replace(settings.MEDIA_URL, ""))
+    elif uri.startswith(settings.STATIC_URL):
+        path = finders.find(uri.replace(settings.STATIC_URL, ""))
+        if path is None:
+            path = os.path.join(settings.STATIC_ROOT, uri.replace(settings.STATIC_URL, ""))
+    else:
+        return None
+
+    if not path or not os.path.isfile(path):
+        return None
+
+    return path
+
+
+# URI -> ruta en disco ya resuelta; solo se guardan aciertos para que un archivo
+# que aparezca después (p. ej. un logo recién subido) se encuentre en el siguiente render.
+_assets_resueltos = {}
+
+
+def link_callback(uri, rel):
+    path = _assets_resueltos.get(uri)
+    if path is None:
+        path = _resolver_asset(uri)
+        if path is None:
+            return uri
+        _assets_resueltos[uri] = path
+    return path
+
+
+@lru_cache(maxsize=None)
+def _huella_plantilla(tipo):
+    huella = hashlib.sha256()
+    for nombre in (PLANTILLAS_PDF[tipo], PLANTILLA_BASE):
+        origen = get_template(nombre).origin.name
+        with open(origen, 'rb') as archivo:
+            huella.update(archivo.read())
+    return huella.hexdigest()
+
+
+def version_pdf(tipo, cotizacion, items, institucion):
+    """Hash del contenido que determina el PDF: datos de render, marca y plantilla.
+
+    ``cotizacion`` e ``items`` son los datos ya formateados de ``instantaneas.obtener``.
+    """
+    huella = hashlib.sha256()
+
+    def agregar(*valores):
+        huella.update(repr(valores).encode())
+
+    agregar(tipo, _huella_plantilla(tipo))
+    # 'version' cambia con cualquier guardado aunque el contenido sea el mismo.
+    contenido = {clave: valor for clave, valor in cotizacion.items() if clave != 'version'}
+    huella.update(json.dumps([contenido, list(items)], sort_keys=True).encode())
+    if institucion is not None:
+        agregar(
+            institucion.nombre, institucion.direccion, institucion.telefono, institucion.pagina_web,
+            institucion.logo.name, institucion.logo2.name, institucion.logo_pdf.name, institucion.logo2_pdf.name,
+        )
+    return huella.hexdigest()[:32]
+
+
+def generar_pdf(tipo, cotizacion, items, institucion):
+    html_string = render_to_string(PLANTILLAS_PDF[tipo], contexto_pdf(tipo, cotizacion, items, institucion))
+    destino = BytesIO()
+    with medir_pdf():
+        pisa.CreatePDF(html_string, dest=destino, link_callback=link_callback)
+    return destino.getvalue()
+
+
+# Por directorio de caché: (bytes estimados, time.monotonic() del último recorrido completo).
+# Cada proceso suma lo que escribe él; lo que escriben los demás se ve en el recorrido periódico.
+_uso_cache = {}
+_uso_cache_lock = threading.Lock()
+
+# Archivos de la carpeta que no son contenido: marcas de prerender y escrituras a medio terminar.
+SUFIJOS_AUXILIARES = ('.pendiente', '.tmp')
+
+
+class CachePDF:
+    """Caché en disco de PDF generados, una carpeta por cotización y desalojo LRU por tamaño.
+
+    El nombre de cada archivo es la versión del contenido, así que un PDF desactualizado
+    nunca se sirve aunque la invalidación llegue tarde.
+
+    Guardar no recorre el directorio: suma el tamaño a un total estimado y solo recorta
+    cuando ese total pasa el máximo o cuando pasaron ``intervalo_recorte`` segundos
+    desde el último recorrido.
+    """
+
+    def __init__(self, directorio, max_bytes, intervalo_recorte=300):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        self.intervalo_recorte = intervalo_recorte
+
+    def _carpeta(self, pk):
+        return self.directorio / str(pk)
+
+    def ruta(self, pk, tipo, version, extension='pdf'):
+        return self._carpeta(pk) / f'{tipo}-{version}.{extension}'
+
+    def abrir(self, pk, tipo, version, extension='pdf'):
+        ruta = self.ruta(pk, tipo, version, extension)
+        try:
+            archivo = open(ruta, 'rb')
+        except FileNotFoundError:
+            return None
+        # La fecha de modificación hace de marca de último uso para el desalojo.
+        os.utime(ruta)
+        return archivo
+
+    def guardar(self, pk, tipo, version, contenido, extension='pdf'):
+        carpeta = self._carpeta(pk)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        for anterior in carpeta.glob(f'{tipo}-*.{extension}'):
+            anterior.unlink(missing_ok=True)
+        ruta = self.ruta(pk, tipo, version, extension)
+        descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+        self._sumar(len(contenido))
+        return ruta
+
+    def _sumar(self, tamano):
+        clave = str(self.directorio)
+        with _uso_cache_lock:
+            estimado, recorrido = _uso_cache.get(clave, (None, 0.0))
+            if (
+                estimado is not None
+                and estimado + tamano <= self.max_bytes
+                and time.monotonic() - recorrido < self.intervalo_recorte
+            ):
+                # Las versiones reemplazadas no se restan: el estimado solo peca por exceso.
+                _uso_cache[clave] = (estimado + tamano, recorrido)
+                return
+        self.recortar()
+
+    def existe(self, pk, tipo, version, extension='pdf'):
+        return self.ruta(pk, tipo, version, extension).exists()
+
+    def _marcador(self, pk, tipo):
+        return self._carpeta(pk) / f'{tipo}.pendiente'
+
+    def marcar_pendiente(self, pk, tipo):
+        carpeta = self._carpeta(pk)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        self._marcador(pk, tipo).touch()
+
+    def desmarcar_pendiente(self, pk, tipo):
+        self._marcador(pk, tipo).unlink(missing_ok=True)
+
+    def esta_pendiente(self, pk, tipo, vigencia=600):
+        try:
+            marcado = self._marcador(pk, tipo).stat().st_mtime
+        except FileNotFoundError:
+            return False
+        return time.time() - marcado < vigencia
+
+    def invalidar(self, pk):
+        shutil.rmtree(self._carpeta(pk), ignore_errors=True)
+
+    def recortar(self):
+        """Recorre el directorio y borra los archivos menos usados hasta quedar bajo el máximo."""
+        archivos = []
+        total = 0
+        for ruta in self.directorio.glob('*/*'):
+            if ruta.suffix in SUFIJOS_AUXILIARES:
+                continue
+            try:
+                estado = ruta.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+            total += estado.st_size
+        if total > self.max_bytes:
+            for _, tamano, ruta in sorted(archivos):
+                ruta.unlink(missing_ok=True)
+                total -= tamano
+                if total <= self.max_bytes:
+                    break
+        with _uso_cache_lock:
+            _uso_cache[str(self.directorio)] = (total, time.monotonic())
+
+
+def obtener_cache_pdf():
+    return CachePDF(
+        getattr(settings, 'COTIZACIONES_PDF_CACHE_DIR', Path(settings.BASE_DIR) / 'cache' / 'cotizaciones'),
+        getattr(settings, 'COTIZACIONES_PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+        getattr(settings, 'COTIZACIONES_PDF_CACHE_RECORTE_SEGUNDOS', 300),
+    )
+
+
+def _abrir_pdf_version(cache, version, tipo, cotizacion, items, institucion):
+    archivo = cache.abrir(cotizacion['pk'], tipo, version)
+    if archivo is None:
+        contenido = generar_pdf(tipo, cotizacion, items, institucion)
+        cache.guardar(cotizacion['pk'], tipo, version, contenido)
+        archivo = cache.abrir(cotizacion['pk'], tipo, version) or BytesIO(contenido)
+    return archivo
+
+
+def abrir_pdf(tipo, cotizacion, items, institucion):
+    """Devuelve el PDF abierto desde la caché, generándolo solo si su versión no existe."""
+    cache = obtener_cache_pdf()
+    items = list(items)
+    version = version_pdf(tipo, cotizacion, items, institucion)
+    return _abrir_pdf_version(cache, version, tipo, cotizacion, items, institucion)
+
+
+def rasterizar_pdf(contenido):
+    """Convierte cada página del PDF en un JPG y los devuelve empaquetados en un ZIP sin comprimir."""
+    escala = getattr(settings, 'COTIZACIONES_JPG_DPI', 200) / 72
+    documento = pypdfium2.PdfDocument(contenido)
+    destino = BytesIO()
+    try:
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_STORED) as paquete:
+            for numero, pagina in enumerate(documento, start=1):
+                imagen = pagina.render(scale=escala).to_pil().convert('RGB')
+                salida = BytesIO()
+                imagen.save(salida, 'JPEG', quality=90, optimize=True)
+                paquete.writestr(f'pagina_{numero}.jpg', salida.getvalue())
+                pagina.close()
+    finally:
+        documento.close()
+    return destino.getvalue()
+
+
+def abrir_jpg(tipo, cotizacion, items, institucion):
+    """Devuelve abierto el ZIP con un JPG por página, rasterizado desde el mismo PDF en caché."""
+    cache = obtener_cache_pdf()
+    items = list(items)
+    version = version_pdf(tipo, cotizacion, items, institucion)
+    archivo = cache.abrir(cotizacion['pk'], tipo, version, 'zip')
+    if archivo is None:
+        with _abrir_pdf_version(cache, version, tipo, cotizacion, items, institucion) as pdf:
+            contenido = rasterizar_pdf(pdf.read())
+        cache.guardar(cotizacion['pk'], tipo, version, contenido, 'zip')
+        archivo = cache.abrir(cotizacion['pk'], tipo, version, 'zip') or BytesIO(contenido)
+    return archivo
+
+
+def _cargar_cotizacion(pk):
+    from almacen_app.models import Institucion
+
+    from .instantaneas import obtener
+
+    cotizacion = obtener(pk)
+    return cotizacion, cotizacion['items'], Institucion.obtener()
+
+
+def estado_pdf(tipos, cotizacion, items, institucion):
+    """Indica por tipo si el PDF vigente está 'listo', 'preparando' o 'pendiente'."""
+    cache = obtener_cache_pdf()
+    items = list(items)
+    estados = {}
+    for tipo in tipos:
+        if cache.existe(cotizacion['pk'], tipo, version_pdf(tipo, cotizacion, items, institucion)):
+            estados[tipo] = 'listo'
+        elif cache.esta_pendiente(cotizacion['pk'], tipo):
+            estados[tipo] = 'preparando'
+        else:
+            estados[tipo] = 'pendiente'
+    return estados
+
+
+def prerenderizar_cotizacion(pk, tipos=(PDF_CLIENTE, PDF_INTERNO)):
+    """Genera y guarda en caché los PDF de una cotización que aún no estén generados.
+
+    Devuelve (segundos, cantidad) de PDF generados para las métricas del proceso principal.
+    """
+    cache = obtener_cache_pdf()
+    try:
+        with midiendo() as medicion:
+            cotizacion, items, institucion = _cargar_cotizacion(pk)
+            for tipo in tipos:
+                version = version_pdf(tipo, cotizacion, items, institucion)
+                if not cache.existe(pk, tipo, version):
+                    cache.guardar(pk, tipo, version, generar_pdf(tipo, cotizacion, items, institucion))
+    finally:
+        for tipo in tipos:
+            cache.desmarcar_pendiente(pk, tipo)
+    return medicion.pdf, medicion.pdfs
+
+
+def _inicializar_proceso():
+    import django
+
+    django.setup()
+
+
+def crear_pool(workers):
+    # spawn: cada proceso arranca Django desde cero y no hereda conexiones abiertas.
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_inicializar_proceso,
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = crear_pool(getattr(settings, 'COTIZACIONES_PDF_WORKERS', 2))
+        return _pool
+
+
+def _registrar_resultado(pk, tipos):
+    def callback(future):
+        global _pool
+        error = future.exception()
+        if error is None:
+            registrar_segundo_plano(*future.result())
+            return
+        logger.error('No se pudo prerenderizar la cotización %s: %s', pk, error)
+        cache = obtener_cache_pdf()
+        for tipo in tipos:
+            cache.desmarcar_pendiente(pk, tipo)
+        with _pool_lock:
+            # Un proceso caído deja el pool inutilizable; se recrea en el próximo envío.
+            if _pool is not None and getattr(_pool, '_broken', False):
+                _pool = None
+    return callback
+
+
+def encolar_prerender(pk, tipos=(PDF_CLIENTE, PDF_INTERNO)):
+    """Envía la generación de los PDF al pool de procesos sin bloquear la petición."""
+    if not getattr(settings, 'COTIZACIONES_PDF_WORKERS', 2):
+        return None
+    cache = obtener_cache_pdf()
+    for tipo in tipos:
+        cache.marcar_pendiente(pk, tipo)
+    future = _obtener_pool().submit(prerenderizar_cotizacion, pk, tipos)
+    future.add_done_callback(_registrar_resultado(pk, tipos))
+    return future
@@ -0,0 +1,129 @@
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from .busqueda import buscar
+from .models import Cotizacion, CotizacionItem, ProductoServicio
+
+MODO_PORCENTAJE = 'PORCENTAJE'
+MODO_MONTO = 'MONTO'
+MODO_CHOICES = [
+    (MODO_PORCENTAJE, 'Porcentaje (%)'),
+    (MODO_MONTO, 'Monto fijo (Q)'),
+]
+
+# Campo del producto -> campo del ítem de cotización que copia su valor
+CAMPOS_PRECIO = {
+    'precio_venta': 'precio_venta_unitario',
+    'precio_costo': 'precio_costo_unitario',
+}
+
+MUESTRA_PREVISUALIZACION = 20
+# Cotizaciones por UPDATE al recalcular totales (límite de parámetros de SQLite)
+COTIZACIONES_POR_LOTE = 1000
+
+_DECIMAL = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def filtrar_productos(queryset, tipo=None, activo=None, q=None):
+    """Filtros del ajuste masivo: tipo, activo (True/False/None) y la búsqueda del catálogo."""
+    if tipo:
+        queryset = queryset.filter(tipo=tipo)
+    if activo is not None:
+        queryset = queryset.filter(activo=activo)
+    return buscar(queryset, q)
+
+
+def expresion_precio(campo, modo, valor):
+    """Nuevo valor de ``campo`` como expresión SQL, redondeado a centavos y nunca negativo."""
+    if modo == MODO_PORCENTAJE:
+        # El factor se calcula aquí: en SQLite los decimales enteros se guardan como INTEGER
+        # y ``precio * 10 / 100`` se trunca.
+        factor = Decimal('1') + Decimal(valor) / Decimal('100')
+        nuevo = F(campo) * Value(factor, output_field=models.DecimalField(max_digits=12, decimal_places=6))
+    else:
+        nuevo = F(campo) + Value(Decimal(valor), output_field=_DECIMAL)
+    return Greatest(Round(nuevo, 2, output_field=_DECIMAL), Value(Decimal('0.00'), output_field=_DECIMAL))
+
+
+def _productos(queryset):
+    # La búsqueda anota relevancia y ordena; para UPDATE basta con los ids.
+    return ProductoServicio.objects.filter(pk__in=queryset.order_by().values('pk'))
+
+
+def _items_borrador(productos):
+    return CotizacionItem.objects.filter(
+        cotizacion__estado=Cotizacion.ESTADO_BORRADOR,
+        producto_servicio__in=productos.values('pk'),
+    )
+
+
+def previsualizar(queryset, campos, modo, valor, propagar):
+    """Conteos y una muestra de precios nuevos sin modificar nada."""
+    productos = _productos(queryset)
+    resumen = {'productos': productos.count(), 'lineas': 0, 'cotizaciones': 0}
+    if propagar:
+        items = _items_borrador(productos)
+        resumen['lineas'] = items.count()
+        resumen['cotizaciones'] = items.order_by().values('cotizacion').distinct().count()
+    anotaciones = {f'nuevo_{campo}': expresion_precio(campo, modo, valor) for campo in campos}
+    resumen['muestra'] = list(
+        productos.order_by('nombre').annotate(**anotaciones)[:MUESTRA_PREVISUALIZACION]
+    )
+    for producto in resumen['muestra']:
+        for campo in CAMPOS_PRECIO:
+            if campo not in campos:
+                setattr(producto, f'nuevo_{campo}', None)
+    return resumen
+
+
+def describir_ajuste(resumen):
+    return (
+        f"{resumen['productos']} productos/servicios, {resumen['lineas']} líneas en "
+        f"{resumen['cotizaciones']} cotizaciones en borrador"
+    )
+
+
+def aplicar_ajuste(queryset, campos, modo, valor, propagar):
+    """Ajusta ``campos`` de los productos de ``queryset`` con un solo UPDATE.
+
+    Con ``propagar`` copia los precios nuevos a las líneas de cotizaciones en borrador
+    y recalcula sus totales, también por conjuntos. Devuelve los conteos aplicados.
+    """
+    productos = _productos(queryset)
+    with transaction.atomic():
+        actualizados = productos.update(
+            actualizado_en=timezone.now(),
+            **{campo: expresion_precio(campo, modo, valor) for campo in campos},
+        )
+        if actualizados:
+            ProductoServicio.invalidar_catalogo()
+        resumen = {'productos': actualizados, 'lineas': 0, 'cotizaciones': 0}
+        if not propagar or not actualizados:
+            return resumen
+
+        items = _items_borrador(productos)
+        pks = list(items.order_by().values_list('cotizacion_id', flat=True).distinct())
+        precio = {
+            CAMPOS_PRECIO[campo]: Subquery(
+                ProductoServicio.objects.filter(pk=OuterRef('producto_servicio_id')).values(campo)[:1]
+            )
+            for campo in campos
+        }
+        resumen['lineas'] = items.update(**precio)
+        # Segundo UPDATE: los totales de línea leen los precios unitarios ya actualizados.
+        venta = Round(F('cantidad') * F('precio_venta_unitario'), 2, output_field=_DECIMAL)
+        costo = Round(F('cantidad') * F('precio_costo_unitario'), 2, output_field=_DECIMAL)
+        items.update(
+            total_linea_venta=venta,
+            total_linea_costo=costo,
+            ganancia_linea=venta - costo,
+        )
+        resumen['cotizaciones'] = sum(
+            Cotizacion.recalcular_totales(pks[inicio:inicio + COTIZACIONES_POR_LOTE])
+            for inicio in range(0, len(pks), COTIZACIONES_POR_LOTE)
+        )
+    return resumen
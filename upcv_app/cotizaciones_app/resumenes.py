@@ -0,0 +1,391 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    Cotizacion,
+    CotizacionItem,
+    ProductoServicio,
+    ResumenProductoDiario,
+    ResumenProductoMensual,
+    ResumenVentaDiaria,
+)
+
+CAMPOS_TOTALES = ('subtotal_venta', 'subtotal_costo', 'ganancia_total')
+# Campo del resumen de productos -> campo de CotizacionItem que suma
+CAMPOS_PRODUCTO = {
+    'cantidad': 'cantidad',
+    'total_venta': 'total_linea_venta',
+    'total_costo': 'total_linea_costo',
+    'ganancia': 'ganancia_linea',
+}
+# Claves por sentencia al refrescar (cada una es un término OR en el WHERE)
+CLAVES_POR_LOTE = 200
+LOTE_RECONSTRUCCION = 1000
+
+_pendientes = threading.local()
+
+
+def _agregados(queryset, *grupo):
+    return queryset.order_by().values(*grupo).annotate(
+        cantidad=Count('pk'),
+        **{campo: Sum(campo) for campo in CAMPOS_TOTALES},
+    )
+
+
+def _filtro_claves(claves, campo_fecha):
+    filtro = Q()
+    for fecha, cliente_id, estado in claves:
+        filtro |= Q(**{campo_fecha: fecha, 'cliente_id': cliente_id, 'estado': estado})
+    return filtro
+
+
+def _fila(datos):
+    return ResumenVentaDiaria(
+        fecha=datos['fecha_emision'],
+        cliente_id=datos['cliente_id'],
+        estado=datos['estado'],
+        cantidad=datos['cantidad'],
+        **{campo: datos[campo] or Decimal('0.00') for campo in CAMPOS_TOTALES},
+    )
+
+
+def refrescar(claves, using=DEFAULT_DB_ALIAS):
+    """Recalcula desde ``Cotizacion`` los resúmenes de las claves (fecha, cliente_id, estado).
+
+    Solo lee las cotizaciones de esas claves (índice cliente/fecha), así que el
+    costo no depende del tamaño del historial. Las claves sin cotizaciones se borran.
+    """
+    claves = [clave for clave in set(claves) if None not in clave]
+    for inicio in range(0, len(claves), CLAVES_POR_LOTE):
+        lote = claves[inicio:inicio + CLAVES_POR_LOTE]
+        cotizaciones = Cotizacion.objects.using(using).filter(_filtro_claves(lote, 'fecha_emision'))
+        filas = [_fila(datos) for datos in _agregados(cotizaciones, 'fecha_emision', 'cliente_id', 'estado')]
+        vigentes = {(fila.fecha, fila.cliente_id, fila.estado) for fila in filas}
+        vacias = [clave for clave in lote if clave not in vigentes]
+        with transaction.atomic(using=using):
+            if filas:
+                ResumenVentaDiaria.objects.using(using).bulk_create(
+                    filas,
+                    update_conflicts=True,
+                    unique_fields=['fecha', 'cliente', 'estado'],
+                    update_fields=['cantidad', *CAMPOS_TOTALES],
+                )
+            if vacias:
+                ResumenVentaDiaria.objects.using(using).filter(_filtro_claves(vacias, 'fecha')).delete()
+    refrescar_productos({(fecha, estado) for fecha, _, estado in claves}, using)
+
+
+def _agregados_productos(items):
+    return items.order_by().values('cotizacion__fecha_emision', 'cotizacion__estado', 'producto_servicio_id').annotate(
+        lineas=Count('pk'),
+        **{f'suma_{campo}': Sum(origen) for campo, origen in CAMPOS_PRODUCTO.items()},
+    )
+
+
+def _fila_producto(datos):
+    return ResumenProductoDiario(
+        fecha=datos['cotizacion__fecha_emision'],
+        producto_id=datos['producto_servicio_id'],
+        estado=datos['cotizacion__estado'],
+        lineas=datos['lineas'],
+        **{campo: datos[f'suma_{campo}'] or Decimal('0.00') for campo in CAMPOS_PRODUCTO},
+    )
+
+
+def refrescar_productos(dias, using=DEFAULT_DB_ALIAS):
+    """Recalcula el resumen de productos de los días (fecha, estado) indicados.
+
+    Cada día se vuelve a sumar completo desde ``CotizacionItem``: el costo
+    depende de los ítems de ese día, no del historial.
+    """
+    dias = [dia for dia in set(dias) if None not in dia]
+    for inicio in range(0, len(dias), CLAVES_POR_LOTE):
+        lote = dias[inicio:inicio + CLAVES_POR_LOTE]
+        filtro = Q()
+        for fecha, estado in lote:
+            filtro |= Q(cotizacion__fecha_emision=fecha, cotizacion__estado=estado)
+        filas = [_fila_producto(datos) for datos in _agregados_productos(CotizacionItem.objects.using(using).filter(filtro))]
+        vigentes = {}
+        for fila in filas:
+            vigentes.setdefault((fila.fecha, fila.estado), []).append(fila.producto_id)
+        sobrantes = Q()
+        for fecha, estado in lote:
+            sobrantes |= Q(fecha=fecha, estado=estado) & ~Q(producto_id__in=vigentes.get((fecha, estado), []))
+        with transaction.atomic(using=using):
+            if filas:
+                ResumenProductoDiario.objects.using(using).bulk_create(
+                    filas,
+                    update_conflicts=True,
+                    unique_fields=['fecha', 'producto', 'estado'],
+                    update_fields=['lineas', *CAMPOS_PRODUCTO],
+                )
+            ResumenProductoDiario.objects.using(using).filter(sobrantes).delete()
+    refrescar_meses({(_inicio_mes(fecha), estado) for fecha, estado in dias}, using)
+
+
+def _agregados_mensuales(diarios):
+    return diarios.annotate(mes=TruncMonth('fecha')).order_by().values('mes', 'producto_id', 'estado').annotate(
+        suma_lineas=Sum('lineas'),
+        **{f'suma_{campo}': Sum(campo) for campo in CAMPOS_PRODUCTO},
+    )
+
+
+def _fila_mensual(datos):
+    return ResumenProductoMensual(
+        mes=datos['mes'],
+        producto_id=datos['producto_id'],
+        estado=datos['estado'],
+        lineas=datos['suma_lineas'],
+        **{campo: datos[f'suma_{campo}'] or Decimal('0.00') for campo in CAMPOS_PRODUCTO},
+    )
+
+
+def refrescar_meses(meses, using=DEFAULT_DB_ALIAS):
+    """Vuelve a sumar ``ResumenProductoMensual`` de los (mes, estado) indicados desde el resumen diario."""
+    meses = list(meses)
+    for inicio in range(0, len(meses), CLAVES_POR_LOTE):
+        lote = meses[inicio:inicio + CLAVES_POR_LOTE]
+        filtro = Q()
+        for mes, estado in lote:
+            filtro |= Q(fecha__gte=mes, fecha__lt=_inicio_mes(mes, -1), estado=estado)
+        filas = [_fila_mensual(datos) for datos in _agregados_mensuales(ResumenProductoDiario.objects.using(using).filter(filtro))]
+        vigentes = {}
+        for fila in filas:
+            vigentes.setdefault((fila.mes, fila.estado), []).append(fila.producto_id)
+        sobrantes = Q()
+        for mes, estado in lote:
+            sobrantes |= Q(mes=mes, estado=estado) & ~Q(producto_id__in=vigentes.get((mes, estado), []))
+        with transaction.atomic(using=using):
+            if filas:
+                ResumenProductoMensual.objects.using(using).bulk_create(
+                    filas,
+                    update_conflicts=True,
+                    unique_fields=['mes', 'producto', 'estado'],
+                    update_fields=['lineas', *CAMPOS_PRODUCTO],
+                )
+            ResumenProductoMensual.objects.using(using).filter(sobrantes).delete()
+
+
+def _aplicar_pendientes(using):
+    pendientes = getattr(_pendientes, using, None)
+    if not pendientes:
+        return
+    setattr(_pendientes, using, None)
+    claves, pks = pendientes
+    pks = list(pks)
+    for inicio in range(0, len(pks), LOTE_RECONSTRUCCION):
+        claves |= set(
+            Cotizacion.objects.using(using)
+            .filter(pk__in=pks[inicio:inicio + LOTE_RECONSTRUCCION])
+            .values_list('fecha_emision', 'cliente_id', 'estado')
+        )
+    refrescar(claves, using)
+
+
+def marcar(claves=(), pks=(), using=DEFAULT_DB_ALIAS):
+    """Programa el refresco de los resúmenes afectados para cuando confirme la transacción.
+
+    Varias marcas dentro de la misma transacción se aplican juntas en el primer
+    callback; los siguientes no encuentran nada pendiente.
+    """
+    pendientes = getattr(_pendientes, using, None)
+    if pendientes is None:
+        pendientes = (set(), set())
+        setattr(_pendientes, using, pendientes)
+    pendientes[0].update(claves)
+    pendientes[1].update(pks)
+    transaction.on_commit(lambda: _aplicar_pendientes(using), using=using)
+
+
+def _reconstruir_tabla(modelo, agregados, fila, using):
+    total = 0
+    modelo.objects.using(using).all().delete()
+    lote = []
+    for datos in agregados.iterator(chunk_size=LOTE_RECONSTRUCCION):
+        lote.append(fila(datos))
+        if len(lote) >= LOTE_RECONSTRUCCION:
+            modelo.objects.using(using).bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        modelo.objects.using(using).bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+def reconstruir(using=DEFAULT_DB_ALIAS):
+    """Vacía y vuelve a llenar las tablas de resúmenes a partir de todas las cotizaciones.
+
+    Devuelve la cantidad de filas del resumen de ventas.
+    """
+    with transaction.atomic(using=using):
+        total = _reconstruir_tabla(
+            ResumenVentaDiaria,
+            _agregados(Cotizacion.objects.using(using), 'fecha_emision', 'cliente_id', 'estado'),
+            _fila,
+            using,
+        )
+        _reconstruir_tabla(
+            ResumenProductoDiario,
+            _agregados_productos(CotizacionItem.objects.using(using)),
+            _fila_producto,
+            using,
+        )
+        _reconstruir_tabla(
+            ResumenProductoMensual,
+            _agregados_mensuales(ResumenProductoDiario.objects.using(using)),
+            _fila_mensual,
+            using,
+        )
+    return total
+
+
+def _serie(queryset, agrupador):
+    filas = (
+        queryset.annotate(periodo=agrupador).order_by('periodo').values('periodo')
+        .annotate(cantidad=Sum('cantidad'), venta=Sum('subtotal_venta'), ganancia=Sum('ganancia_total'))
+    )
+    return {fila['periodo']: fila for fila in filas}
+
+
+def _valores(filas, periodos):
+    return {
+        'periodos': [periodo.isoformat() for periodo in periodos],
+        'cantidad': [int(filas.get(periodo, {}).get('cantidad') or 0) for periodo in periodos],
+        'venta': [float(filas.get(periodo, {}).get('venta') or 0) for periodo in periodos],
+        'ganancia': [float(filas.get(periodo, {}).get('ganancia') or 0) for periodo in periodos],
+    }
+
+
+def _inicio_mes(fecha, meses_atras=0):
+    mes = fecha.year * 12 + fecha.month - 1 - meses_atras
+    return fecha.replace(year=mes // 12, month=mes % 12 + 1, day=1)
+
+
+def datos_dashboard(hoy=None, dias=30, semanas=12, meses=12):
+    """Series y totales del dashboard leídos solo de ``ResumenVentaDiaria``.
+
+    Las series de ventas excluyen las cotizaciones anuladas; el desglose por
+    estado las incluye. Se consultan como máximo los últimos ``meses`` meses.
+    """
+    hoy = hoy or timezone.localdate()
+    desde_mes = _inicio_mes(hoy, meses - 1)
+    resumenes = ResumenVentaDiaria.objects.filter(fecha__gte=desde_mes, fecha__lte=hoy)
+    ventas = resumenes.exclude(estado=Cotizacion.ESTADO_ANULADA)
+
+    desde_dia = hoy - timedelta(days=dias - 1)
+    por_dia = {
+        fila['fecha']: fila
+        for fila in ventas.filter(fecha__gte=desde_dia).order_by('fecha').values('fecha').annotate(
+            cantidad=Sum('cantidad'), venta=Sum('subtotal_venta'), ganancia=Sum('ganancia_total'),
+        )
+    }
+    lunes = hoy - timedelta(days=hoy.weekday())
+    periodos_semana = [lunes - timedelta(weeks=numero) for numero in range(semanas - 1, -1, -1)]
+    periodos_mes = [_inicio_mes(hoy, numero) for numero in range(meses - 1, -1, -1)]
+
+    por_estado = {
+        fila['estado']: fila
+        for fila in resumenes.order_by().values('estado').annotate(
+            cantidad=Sum('cantidad'), venta=Sum('subtotal_venta'),
+        )
+    }
+    mes_actual = ventas.filter(fecha__gte=periodos_mes[-1]).aggregate(
+        cantidad=Sum('cantidad'), venta=Sum('subtotal_venta'), ganancia=Sum('ganancia_total'),
+    )
+    top_clientes = list(
+        ventas.order_by().values('cliente_id', 'cliente__nombre')
+        .annotate(cantidad=Sum('cantidad'), venta=Sum('subtotal_venta'), ganancia=Sum('ganancia_total'))
+        .order_by('-venta')[:10]
+    )
+
+    return {
+        'mes_actual': {
+            'cantidad': mes_actual['cantidad'] or 0,
+            'venta': mes_actual['venta'] or Decimal('0.00'),
+            'ganancia': mes_actual['ganancia'] or Decimal('0.00'),
+        },
+        'top_clientes': top_clientes,
+        'graficas': {
+            'dias': _valores(por_dia, [desde_dia + timedelta(days=numero) for numero in range(dias)]),
+            'semanas': _valores(_serie(ventas.filter(fecha__gte=periodos_semana[0]), TruncWeek('fecha')), periodos_semana),
+            'meses': _valores(_serie(ventas, TruncMonth('fecha')), periodos_mes),
+            'estados': {
+                'etiquetas': [etiqueta for _, etiqueta in Cotizacion.ESTADO_CHOICES],
+                'cantidad': [int(por_estado.get(estado, {}).get('cantidad') or 0) for estado, _ in Cotizacion.ESTADO_CHOICES],
+                'venta': [float(por_estado.get(estado, {}).get('venta') or 0) for estado, _ in Cotizacion.ESTADO_CHOICES],
+            },
+        },
+    }
+
+
+ORDENES_PRODUCTOS = {
+    'venta': 'total_venta',
+    'ganancia': 'ganancia',
+    'cantidad': 'cantidad',
+    'margen': 'margen',
+}
+
+
+def _sumar_por_producto(queryset, totales):
+    filas = queryset.order_by().values('producto_id').annotate(
+        suma_lineas=Sum('lineas'),
+        **{f'suma_{campo}': Sum(campo) for campo in CAMPOS_PRODUCTO},
+    )
+    for datos in filas:
+        acumulado = totales.setdefault(datos['producto_id'], dict.fromkeys(['lineas', *CAMPOS_PRODUCTO], 0))
+        acumulado['lineas'] += datos['suma_lineas'] or 0
+        for campo in CAMPOS_PRODUCTO:
+            acumulado[campo] += datos[f'suma_{campo}'] or Decimal('0.00')
+
+
+def analitica_productos(desde=None, hasta=None, estados=None, orden='venta', limite=20):
+    """Top de productos por venta, ganancia, cantidad o margen (%) en el rango de fechas.
+
+    Los meses completos del rango salen de ``ResumenProductoMensual`` y los días
+    sueltos de los extremos de ``ResumenProductoDiario``; los totales por
+    producto se combinan aquí y solo se cargan los datos de los ``limite`` primeros.
+    """
+    diarios = ResumenProductoDiario.objects.all()
+    mensuales = ResumenProductoMensual.objects.all()
+    if estados:
+        diarios = diarios.filter(estado__in=estados)
+        mensuales = mensuales.filter(estado__in=estados)
+
+    # Meses completos: [primer_mes, fin_meses)
+    primer_mes = _inicio_mes(desde, -1) if desde and desde.day != 1 else desde
+    siguiente = hasta + timedelta(days=1) if hasta else None
+    fin_meses = _inicio_mes(siguiente) if siguiente else None
+    totales = {}
+    if primer_mes and fin_meses and primer_mes >= fin_meses:
+        _sumar_por_producto(diarios.filter(fecha__gte=desde, fecha__lte=hasta), totales)
+    else:
+        if primer_mes:
+            mensuales = mensuales.filter(mes__gte=primer_mes)
+        if fin_meses:
+            mensuales = mensuales.filter(mes__lt=fin_meses)
+        _sumar_por_producto(mensuales, totales)
+        if desde and desde != primer_mes:
+            _sumar_por_producto(diarios.filter(fecha__gte=desde, fecha__lt=primer_mes), totales)
+        if hasta and siguiente != fin_meses:
+            _sumar_por_producto(diarios.filter(fecha__gte=fin_meses, fecha__lte=hasta), totales)
+
+    for acumulado in totales.values():
+        venta = acumulado['total_venta']
+        acumulado['margen'] = acumulado['ganancia'] * 100 / venta if venta else None
+    campo = ORDENES_PRODUCTOS.get(orden, 'total_venta')
+    # Descendente por el campo; los productos sin valor (margen sin ventas) al final.
+    ranking = sorted(totales.items(), key=lambda par: (par[1][campo] is None, -(par[1][campo] or 0)))[:limite]
+    productos = ProductoServicio.objects.only('nombre', 'tipo').in_bulk([pk for pk, _ in ranking])
+    filas = [
+        {'producto_id': pk, 'producto__nombre': productos[pk].nombre, 'producto__tipo': productos[pk].tipo, **acumulado}
+        for pk, acumulado in ranking
+    ]
+    filas.sort(key=lambda fila: (fila[campo] is None, -(fila[campo] or 0), fila['producto__nombre']))
+    return filas
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import instantaneas, resumenes
+from .models import Cotizacion, CotizacionItem, ProductoServicio, totales_actualizados
+from .pdf import encolar_prerender, obtener_cache_pdf
+
+
+@receiver([post_save, post_delete], sender=Cotizacion)
+def invalidar_pdf_cotizacion(sender, instance, **kwargs):
+    obtener_cache_pdf().invalidar(instance.pk)
+
+
+def _puede_tener_instantanea(cotizacion):
+    # Emitida ahora o antes de este guardado (al dejar de estarlo se borra su instantánea).
+    return Cotizacion.ESTADO_EMITIDA in (cotizacion.estado, getattr(cotizacion, '_estado_guardado', None))
+
+
+# Conectado antes del prerender: al confirmar, la instantánea se escribe primero.
+@receiver(post_save, sender=Cotizacion)
+def regenerar_instantanea_cotizacion(sender, instance, using, **kwargs):
+    if _puede_tener_instantanea(instance):
+        instantaneas.marcar({instance.pk}, using=using)
+
+
+@receiver([post_save, post_delete], sender=CotizacionItem)
+def regenerar_instantanea_item(sender, instance, using, **kwargs):
+    if not CotizacionItem.cotizacion.is_cached(instance) or _puede_tener_instantanea(instance.cotizacion):
+        instantaneas.marcar({instance.cotizacion_id}, using=using)
+
+
+@receiver(post_save, sender=Cotizacion)
+def prerenderizar_pdf_emitida(sender, instance, **kwargs):
+    if instance.pasa_a_emitida:
+        # Al confirmar, los ítems guardados en la misma transacción ya son visibles.
+        pk = instance.pk
+        transaction.on_commit(lambda: encolar_prerender(pk), using=kwargs.get('using'))
+
+
+@receiver([post_save, post_delete], sender=CotizacionItem)
+def invalidar_pdf_item(sender, instance, **kwargs):
+    obtener_cache_pdf().invalidar(instance.cotizacion_id)
+
+
+@receiver([post_save, post_delete], sender=Cotizacion)
+def actualizar_resumen_cotizacion(sender, instance, using, **kwargs):
+    # La clave anterior pierde la cotización si cambió de fecha, cliente o estado.
+    claves = {instance.clave_resumen()}
+    anterior = getattr(instance, '_resumen_guardado', None)
+    if anterior is not None:
+        claves.add(anterior)
+    resumenes.marcar(claves=claves, using=using)
+
+
+@receiver(totales_actualizados, sender=Cotizacion)
+def actualizar_resumen_totales(sender, pks, using, **kwargs):
+    resumenes.marcar(pks=pks, using=using)
+
+
+@receiver([post_save, post_delete], sender=CotizacionItem)
+def actualizar_resumen_item(sender, instance, using, **kwargs):
+    # Cubre cambios de producto que no alteran los totales de la cotización.
+    resumenes.marcar(pks={instance.cotizacion_id}, using=using)
+
+
+@receiver([post_save, post_delete], sender=ProductoServicio)
+def invalidar_version_catalogo(sender, using, **kwargs):
+    # Las escrituras por conjuntos (ajuste de precios, importación) la renuevan ellas mismas.
+    ProductoServicio.invalidar_catalogo(using=using)
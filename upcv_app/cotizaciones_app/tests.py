@@ -1,11 +1,47 @@
+import difflib
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
 from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.urls import reverse
+from django.contrib.auth.models import Group
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
 from django.utils import timezone
+from openpyxl import load_workbook
+from PIL import Image
 
-from .models import Cliente, Cotizacion, CotizacionItem, ProductoServicio
+from almacen_app import context_processors, roles, versiones
+from almacen_app.form import InstitucionForm
+from almacen_app.models import FraseMotivacional, Institucion
+
+from . import correlativos, metricas, pdf
+from .busqueda import buscar
+from .conteo import contar
+from .correlativos import AsignadorBloques
+from .models import (
+    Cliente,
+    Cotizacion,
+    CotizacionCorrelativo,
+    CotizacionInstantanea,
+    CotizacionItem,
+    ProductoServicio,
+    ResumenProductoDiario,
+    ResumenVentaDiaria,
+    totales_diferidos,
+)
+from .resumenes import analitica_productos, reconstruir
 
 
 class CotizacionUpdateTests(TestCase):
@@ -113,6 +149,106 @@ class CotizacionUpdateTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertFalse(CotizacionItem.objects.filter(id=self.item.id).exists())
 
+    def _post_actualizando_items(self, cantidad_items, cantidad):
+        CotizacionItem.objects.bulk_create([
+            CotizacionItem(
+                cotizacion=self.cotizacion,
+                producto_servicio=self.producto_b,
+                cantidad=Decimal('1.00'),
+                precio_venta_unitario=self.producto_b.precio_venta,
+                precio_costo_unitario=self.producto_b.precio_costo,
+            )
+            for _ in range(cantidad_items - self.cotizacion.items.count())
+        ])
+        items = list(self.cotizacion.items.order_by('id'))
+        data = {
+            **self._base_form_data(),
+            'items-TOTAL_FORMS': str(len(items)),
+            'items-INITIAL_FORMS': str(len(items)),
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+        }
+        for index, item in enumerate(items):
+            data[f'items-{index}-id'] = str(item.id)
+            data[f'items-{index}-producto_servicio'] = str(item.producto_servicio_id)
+            data[f'items-{index}-cantidad'] = cantidad
+        url = reverse('cotizaciones:cotizacion_update', args=[self.cotizacion.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_update_queries_no_crecen_con_items_existentes(self):
+        self._post_actualizando_items(2, '2.00')
+        pocas = self._post_actualizando_items(2, '3.00')
+        muchas = self._post_actualizando_items(60, '4.00')
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(self.cotizacion.items.count(), 60)
+        self.assertFalse(self.cotizacion.items.exclude(cantidad=Decimal('4.00')).exists())
+
+
+    def test_editor_solo_renderiza_producto_seleccionado(self):
+        response = self.client.get(reverse('cotizaciones:cotizacion_update', args=[self.cotizacion.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'<option value="{self.producto_a.pk}" selected>Producto A</option>')
+        self.assertNotContains(response, 'Producto B')
+        self.assertContains(response, reverse('cotizaciones:producto_buscar'))
+
+    def test_buscar_productos_activos_paginado(self):
+        self.producto_b.activo = False
+        self.producto_b.save()
+        for numero in range(25):
+            ProductoServicio.objects.create(
+                tipo=ProductoServicio.TIPO_PRODUCTO,
+                nombre=f'Cable {numero:02d} producto',
+                precio_costo=Decimal('1.00'),
+                precio_venta=Decimal('2.00'),
+            )
+        url = reverse('cotizaciones:producto_buscar')
+
+        data = self.client.get(url, {'q': 'producto'}).json()
+        nombres = [resultado['text'] for resultado in data['results']]
+        self.assertEqual(nombres[0], 'Producto A')
+        self.assertNotIn('Producto B', nombres)
+        self.assertEqual(len(nombres), 20)
+        self.assertTrue(data['more'])
+
+        data = self.client.get(url, {'q': 'producto', 'page': 2}).json()
+        self.assertEqual(len(data['results']), 6)
+        self.assertFalse(data['more'])
+
+    def test_precios_en_lote_con_etag(self):
+        url = reverse('cotizaciones:producto_precios')
+        ids = f'{self.producto_a.pk},{self.producto_b.pk}'
+        with self.assertNumQueries(3):
+            # sesión, usuario y precios; la versión del catálogo sale de la caché
+            response = self.client.get(url, {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['precios'], {
+            str(self.producto_a.pk): {'precio_venta': '20.00'},
+            str(self.producto_b.pk): {'precio_venta': '30.00'},
+        })
+        self.assertIn('private', response['Cache-Control'])
+
+        etag = response['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'ids': ids}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.producto_a.precio_venta = Decimal('25.00')
+        self.producto_a.save()
+        response = self.client.get(url, {'ids': ids}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['precios'][str(self.producto_a.pk)]['precio_venta'], '25.00')
+
+    def test_precios_en_lote_incluyen_costo_para_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('cotizaciones:producto_precios'), {'ids': str(self.producto_a.pk)})
+        self.assertEqual(
+            response.json()['precios'][str(self.producto_a.pk)],
+            {'precio_venta': '20.00', 'precio_costo': '10.00'},
+        )
 
 class CotizacionCreateTests(TestCase):
     def setUp(self):
@@ -152,3 +288,1338 @@ class CotizacionCreateTests(TestCase):
         self.assertEqual(CotizacionItem.objects.count(), 1)
         item = CotizacionItem.objects.first()
         self.assertEqual(item.precio_venta_unitario, self.producto.precio_venta)
+
+    def _post_con_items(self, cantidad_items):
+        data = {
+            'cliente': str(self.cliente.id),
+            'titulo': 'Masiva',
+            'validez_dias': '15',
+            'observaciones': '',
+            'garantia_texto': 'GARANTIA',
+            'estado': Cotizacion.ESTADO_BORRADOR,
+            'items-TOTAL_FORMS': str(cantidad_items),
+            'items-INITIAL_FORMS': '0',
+            'items-MIN_NUM_FORMS': '0',
+            'items-MAX_NUM_FORMS': '1000',
+        }
+        for index in range(cantidad_items):
+            data[f'items-{index}-id'] = ''
+            data[f'items-{index}-producto_servicio'] = str(self.producto.id)
+            data[f'items-{index}-cantidad'] = '2.00'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('cotizaciones:cotizacion_create'), data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_create_queries_no_crecen_con_items(self):
+        self._post_con_items(1)
+        pocas = self._post_con_items(2)
+        muchas = self._post_con_items(60)
+        self.assertEqual(pocas, muchas)
+        cotizacion = Cotizacion.objects.order_by('-id').first()
+        self.assertEqual(cotizacion.subtotal_venta, Decimal('1440.00'))
+        self.assertEqual(cotizacion.items.count(), 60)
+        self.assertEqual(cotizacion.ganancia_total, Decimal('840.00'))
+
+
+class CotizacionTotalesTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente Totales')
+        self.producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO,
+            nombre='Producto T',
+            precio_costo=Decimal('4.00'),
+            precio_venta=Decimal('10.00'),
+        )
+        self.cotizacion = Cotizacion.objects.create(cliente=self.cliente)
+
+    def _crear_item(self, cantidad='1.00'):
+        return CotizacionItem.objects.create(
+            cotizacion=self.cotizacion,
+            producto_servicio=self.producto,
+            cantidad=Decimal(cantidad),
+            precio_venta_unitario=self.producto.precio_venta,
+            precio_costo_unitario=self.producto.precio_costo,
+        )
+
+    def _assert_totales(self, venta, costo, ganancia):
+        self.cotizacion.refresh_from_db()
+        self.assertEqual(self.cotizacion.subtotal_venta, Decimal(venta))
+        self.assertEqual(self.cotizacion.subtotal_costo, Decimal(costo))
+        self.assertEqual(self.cotizacion.ganancia_total, Decimal(ganancia))
+
+    def test_delta_en_alta_edicion_y_baja(self):
+        item = self._crear_item('2.00')
+        otro = self._crear_item('1.00')
+        self._assert_totales('30.00', '12.00', '18.00')
+
+        item = CotizacionItem.objects.get(pk=item.pk)
+        item.cantidad = Decimal('3.00')
+        item.save()
+        self._assert_totales('40.00', '16.00', '24.00')
+
+        CotizacionItem.objects.get(pk=otro.pk).delete()
+        self._assert_totales('30.00', '12.00', '18.00')
+
+    def test_delta_usa_una_sola_actualizacion(self):
+        item = self._crear_item()
+        item = CotizacionItem.objects.get(pk=item.pk)
+        item.cantidad = Decimal('5.00')
+        with self.assertNumQueries(2):
+            item.save()
+        self._assert_totales('50.00', '20.00', '30.00')
+
+    def test_diferidos_recalcula_una_vez(self):
+        def guardar(cantidad_items):
+            with totales_diferidos():
+                for _ in range(cantidad_items):
+                    self._crear_item()
+
+        with self.assertNumQueries(3 + 1):
+            guardar(3)
+        with self.assertNumQueries(10 + 1):
+            guardar(10)
+        self._assert_totales('130.00', '52.00', '78.00')
+
+
+class CorrelativoTests(TestCase):
+    def test_bloques_entrega_numeros_consecutivos(self):
+        asignador = AsignadorBloques(tamano_bloque=5)
+        numeros = [asignador.siguiente('T', 'default') for _ in range(7)]
+        self.assertEqual(numeros, list(range(1, 8)))
+
+    def test_bloque_revertido_no_se_reutiliza(self):
+        asignador = AsignadorBloques(tamano_bloque=5)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                asignador.siguiente('R', 'default')
+                raise RuntimeError
+        self.assertEqual(asignador.siguiente('R', 'default'), 1)
+        self.assertEqual(asignador.siguiente('R', 'default'), 2)
+
+    def test_serie_antepone_prefijo(self):
+        cliente = Cliente.objects.create(nombre='Cliente Serie')
+        primera = Cotizacion.objects.create(cliente=cliente, serie='A')
+        segunda = Cotizacion.objects.create(cliente=cliente, serie='A')
+        sin_serie = Cotizacion.objects.create(cliente=cliente)
+        self.assertEqual(primera.correlativo, 'A-00001')
+        self.assertEqual(segunda.correlativo, 'A-00002')
+        self.assertEqual(sin_serie.correlativo, '00001')
+
+
+class CorrelativoAutocommitTests(TransactionTestCase):
+    def test_bloque_reservado_en_autocommit_se_reutiliza(self):
+        self.assertFalse(connection.in_atomic_block)
+        asignador = AsignadorBloques(tamano_bloque=5)
+        numeros = [asignador.siguiente('N', 'default') for _ in range(7)]
+        self.assertEqual(numeros, list(range(1, 8)))
+        self.assertEqual(CotizacionCorrelativo.objects.get(serie='N').last_number, 10)
+
+    def test_creates_sin_transaccion_son_consecutivos(self):
+        cliente = Cliente.objects.create(nombre='Cliente Autocommit')
+        with mock.patch.dict(correlativos._asignadores, clear=True):
+            correlativos_creados = [
+                Cotizacion.objects.create(cliente=cliente, serie='S').correlativo for _ in range(4)
+            ]
+        self.assertEqual(correlativos_creados, ['S-00001', 'S-00002', 'S-00003', 'S-00004'])
+        self.assertEqual(CotizacionCorrelativo.objects.get(serie='S').last_number, 20)
+
+
+class CotizacionPDFCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        overrides = override_settings(COTIZACIONES_PDF_CACHE_DIR=self.cache_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(username='pdf', password='password', is_staff=True)
+        self.client.force_login(self.user)
+        cliente = Cliente.objects.create(nombre='Cliente PDF')
+        producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_SERVICIO,
+            nombre='Servicio PDF',
+            precio_costo=Decimal('1.00'),
+            precio_venta=Decimal('2.00'),
+        )
+        self.cotizacion = Cotizacion.objects.create(cliente=cliente)
+        self.item = CotizacionItem.objects.create(
+            cotizacion=self.cotizacion,
+            producto_servicio=producto,
+            precio_venta_unitario=producto.precio_venta,
+            precio_costo_unitario=producto.precio_costo,
+        )
+
+    def _descargar(self, nombre='cotizaciones:cotizacion_pdf'):
+        response = self.client.get(reverse(nombre, args=[self.cotizacion.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        return b''.join(response.streaming_content)
+
+    def test_descarga_repetida_no_vuelve_a_generar(self):
+        with mock.patch.object(pdf.pisa, 'CreatePDF', wraps=pdf.pisa.CreatePDF) as create_pdf:
+            primero = self._descargar()
+            segundo = self._descargar()
+        self.assertEqual(create_pdf.call_count, 1)
+        self.assertEqual(primero, segundo)
+        self.assertTrue(primero.startswith(b'%PDF'))
+
+    def test_cambio_de_item_invalida(self):
+        with mock.patch.object(pdf.pisa, 'CreatePDF', wraps=pdf.pisa.CreatePDF) as create_pdf:
+            self._descargar()
+            self.item.cantidad = Decimal('3.00')
+            self.item.save()
+            self._descargar()
+        self.assertEqual(create_pdf.call_count, 2)
+
+    def test_desalojo_por_tamano(self):
+        cache = pdf.CachePDF(self.cache_dir, max_bytes=10)
+        cache.guardar(1, pdf.PDF_CLIENTE, 'a', b'123456')
+        cache.guardar(2, pdf.PDF_CLIENTE, 'b', b'123456')
+        self.assertIsNone(cache.abrir(1, pdf.PDF_CLIENTE, 'a'))
+        archivo = cache.abrir(2, pdf.PDF_CLIENTE, 'b')
+        self.assertEqual(archivo.read(), b'123456')
+        archivo.close()
+
+    def test_recorta_solo_al_pasar_el_maximo_estimado(self):
+        cache = pdf.CachePDF(self.cache_dir, max_bytes=20)
+        with mock.patch.object(pdf.CachePDF, 'recortar', autospec=True, side_effect=pdf.CachePDF.recortar) as recortar:
+            for pk in range(3):
+                cache.guardar(pk, pdf.PDF_CLIENTE, 'a', b'123456')
+            # Solo el primer guardado del proceso mide el directorio.
+            self.assertEqual(recortar.call_count, 1)
+            cache.guardar(3, pdf.PDF_CLIENTE, 'a', b'123456')
+            self.assertEqual(recortar.call_count, 2)
+        self.assertIsNone(cache.abrir(0, pdf.PDF_CLIENTE, 'a'))
+
+    def test_marcas_pendientes_no_cuentan_ni_se_desalojan(self):
+        cache = pdf.CachePDF(self.cache_dir, max_bytes=10)
+        cache.marcar_pendiente(1, pdf.PDF_CLIENTE)
+        cache._marcador(1, pdf.PDF_CLIENTE).write_bytes(b'x' * 50)
+        cache.guardar(2, pdf.PDF_CLIENTE, 'b', b'123456')
+        cache.recortar()
+        self.assertTrue(cache.esta_pendiente(1, pdf.PDF_CLIENTE))
+        self.assertTrue(cache.existe(2, pdf.PDF_CLIENTE, 'b'))
+
+    def _estado(self):
+        response = self.client.get(reverse('cotizaciones:cotizacion_pdf_estado', args=[self.cotizacion.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_emitir_encola_prerender_al_confirmar(self):
+        with mock.patch('cotizaciones_app.signals.encolar_prerender') as encolar:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.cotizacion.estado = Cotizacion.ESTADO_EMITIDA
+                self.cotizacion.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.cotizacion.save()
+        encolar.assert_called_once_with(self.cotizacion.pk)
+
+    def test_prerender_deja_pdf_listo(self):
+        self.assertEqual(self._estado(), {'cliente': 'pendiente', 'interno': 'pendiente'})
+        pdf.obtener_cache_pdf().marcar_pendiente(self.cotizacion.pk, pdf.PDF_CLIENTE)
+        self.assertEqual(self._estado()['cliente'], 'preparando')
+
+        pdf.prerenderizar_cotizacion(self.cotizacion.pk)
+        self.assertEqual(self._estado(), {'cliente': 'listo', 'interno': 'listo'})
+        with mock.patch.object(pdf.pisa, 'CreatePDF') as create_pdf:
+            self._descargar()
+            self._descargar('cotizaciones:cotizacion_pdf_interno')
+        create_pdf.assert_not_called()
+
+    def test_jpg_se_rasteriza_en_servidor_y_se_cachea(self):
+        with mock.patch.object(pdf.pisa, 'CreatePDF', wraps=pdf.pisa.CreatePDF) as create_pdf, \
+                mock.patch.object(pdf, 'rasterizar_pdf', wraps=pdf.rasterizar_pdf) as rasterizar:
+            self._descargar()
+            response = self.client.get(reverse('cotizaciones:cotizacion_jpg', args=[self.cotizacion.pk]))
+            segunda = self.client.get(reverse('cotizaciones:cotizacion_jpg', args=[self.cotizacion.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(response.content.startswith(b'\xff\xd8'))
+        self.assertEqual(response.content, segunda.content)
+        self.assertEqual(create_pdf.call_count, 1)
+        self.assertEqual(rasterizar.call_count, 1)
+
+    def test_jpg_varias_paginas(self):
+        for _ in range(80):
+            CotizacionItem.objects.create(
+                cotizacion=self.cotizacion,
+                producto_servicio=self.item.producto_servicio,
+                precio_venta_unitario=Decimal('2.00'),
+                precio_costo_unitario=Decimal('1.00'),
+            )
+        url = reverse('cotizaciones:cotizacion_jpg_interno', args=[self.cotizacion.pk])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as paquete:
+            paginas = paquete.namelist()
+        self.assertGreater(len(paginas), 1)
+
+        response = self.client.get(url, {'pagina': 2})
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(self.client.get(url, {'pagina': len(paginas) + 1}).status_code, 404)
+
+    def test_link_callback_memoriza_rutas_resueltas(self):
+        pdf._assets_resueltos.clear()
+        self.addCleanup(pdf._assets_resueltos.clear)
+        uri = '/static/assets/images/logo/logo.png'
+        with mock.patch.object(pdf.finders, 'find', return_value=__file__) as find:
+            self.assertEqual(pdf.link_callback(uri, None), __file__)
+            self.assertEqual(pdf.link_callback(uri, None), __file__)
+        find.assert_called_once()
+
+    def test_form_institucion_genera_logo_reducido_para_pdf(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        imagen = BytesIO()
+        Image.new('RGB', (1600, 800), 'navy').save(imagen, 'PNG')
+        subida = SimpleUploadedFile('logo.png', imagen.getvalue(), content_type='image/png')
+
+        with override_settings(MEDIA_ROOT=media):
+            form = InstitucionForm(
+                {'nombre': 'Empresa', 'direccion': 'Ciudad', 'telefono': '5555'},
+                {'logo': subida},
+            )
+            self.assertTrue(form.is_valid(), form.errors)
+            institucion = form.save()
+            with Image.open(institucion.logo_pdf.path) as variante:
+                self.assertEqual(variante.size, (360, 180))
+                self.assertEqual(variante.format, 'JPEG')
+            self.assertLess(institucion.logo_pdf.size, len(imagen.getvalue()))
+            self.assertEqual(institucion.logo_pdf_url, institucion.logo_pdf.url)
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.client.force_login(user_model.objects.create_user(username='busqueda', password='password'))
+        self.jose = Cliente.objects.create(nombre='José Pérez', telefono='5555-1234', nit='123456-7')
+        Cliente.objects.create(nombre='María López', email='maria@example.com')
+        ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_SERVICIO,
+            nombre='Instalación de cámaras',
+            descripcion='Incluye configuración',
+            precio_costo=Decimal('1.00'),
+            precio_venta=Decimal('2.00'),
+        )
+
+    def test_busqueda_ignora_tildes_y_mayusculas(self):
+        resultados = buscar(Cliente.objects.order_by('nombre'), 'PEREZ jos')
+        self.assertEqual(list(resultados), [self.jose])
+        self.assertEqual(list(buscar(Cliente.objects.all(), 'maria@')), list(Cliente.objects.filter(nombre='María López')))
+        self.assertEqual(buscar(ProductoServicio.objects.all(), 'configuracion').count(), 1)
+
+    def test_indice_se_actualiza_al_editar(self):
+        self.jose.nombre = 'Juan Gómez'
+        self.jose.save()
+        self.assertFalse(buscar(Cliente.objects.all(), 'perez').exists())
+        self.assertTrue(buscar(Cliente.objects.all(), 'gomez').exists())
+        self.jose.delete()
+        self.assertFalse(buscar(Cliente.objects.all(), 'gomez').exists())
+
+    def test_autocompletado_de_productos_usa_busqueda(self):
+        ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Cámara domo', precio_costo=Decimal('1.00'), precio_venta=Decimal('2.00'),
+        )
+        url = reverse('cotizaciones:producto_buscar')
+        with mock.patch('cotizaciones_app.views.buscar', wraps=buscar) as espia:
+            data = self.client.get(url, {'q': 'camara'}).json()
+        espia.assert_called_once()
+        self.assertCountEqual([resultado['text'] for resultado in data['results']], ['Cámara domo', 'Instalación de cámaras'])
+
+    def test_listas_usan_busqueda(self):
+        response = self.client.get(reverse('cotizaciones:cliente_list'), {'q': 'lopez'})
+        self.assertEqual([cliente.nombre for cliente in response.context['clientes']], ['María López'])
+        response = self.client.get(reverse('cotizaciones:producto_list'), {'q': 'instalacion'})
+        self.assertEqual(len(response.context['productos']), 1)
+
+
+class CotizacionListPaginacionTests(TestCase):
+    def setUp(self):
+        user_model = get_user_model()
+        self.client.force_login(user_model.objects.create_user(username='lista', password='password'))
+        cliente = Cliente.objects.create(nombre='Cliente Lista')
+        hoy = timezone.now().date()
+        # Fechas repetidas para comprobar el desempate por id.
+        self.cotizaciones = [
+            Cotizacion.objects.create(cliente=cliente, fecha_emision=hoy - timedelta(days=numero // 3))
+            for numero in range(45)
+        ]
+
+    def _pagina(self, cursor=None, **filtros):
+        params = dict(filtros)
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(reverse('cotizaciones:cotizacion_list'), params).context['page_obj']
+
+    def test_recorre_todas_las_paginas_y_regresa(self):
+        esperadas = list(Cotizacion.objects.order_by('-fecha_emision', '-id').values_list('pk', flat=True))
+        paginas = [self._pagina()]
+        while paginas[-1].has_next():
+            paginas.append(self._pagina(paginas[-1].cursor_siguiente))
+        self.assertEqual([len(pagina) for pagina in paginas], [20, 20, 5])
+        self.assertEqual([cotizacion.pk for pagina in paginas for cotizacion in pagina], esperadas)
+        self.assertFalse(paginas[0].has_previous())
+
+        anterior = self._pagina(paginas[2].cursor_anterior)
+        self.assertEqual([c.pk for c in anterior], [c.pk for c in paginas[1]])
+        primera = self._pagina(anterior.cursor_anterior)
+        self.assertEqual([c.pk for c in primera], [c.pk for c in paginas[0]])
+        self.assertFalse(primera.has_previous())
+
+    def test_pagina_profunda_no_usa_offset(self):
+        pagina = self._pagina()
+        with CaptureQueriesContext(connection) as consultas:
+            self._pagina(pagina.cursor_siguiente)
+        sql = [consulta['sql'] for consulta in consultas if 'cotizaciones_app_cotizacion' in consulta['sql']]
+        self.assertTrue(sql)
+        self.assertFalse(any('OFFSET' in sentencia for sentencia in sql))
+
+    def test_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        pagina = self._pagina(cursor='no-es-un-cursor')
+        self.assertEqual(len(pagina), 20)
+        self.assertFalse(pagina.has_previous())
+
+
+@override_settings(COTIZACIONES_CONTEO_EXACTO_HASTA=5)
+class ConteoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        Cliente.objects.bulk_create([Cliente(nombre=f'Cliente {numero:02d}') for numero in range(12)])
+
+    def test_conteo_exacto_bajo_el_limite(self):
+        resultado = contar(Cliente.objects.filter(nombre__in=['Cliente 01', 'Cliente 02']))
+        self.assertEqual(int(resultado), 2)
+        self.assertFalse(resultado.aproximado)
+
+    def test_conteo_grande_se_cachea(self):
+        resultado = contar(Cliente.objects.all())
+        self.assertEqual(int(resultado), 12)
+        self.assertTrue(resultado.aproximado)
+        self.assertEqual(str(resultado), 'aprox. 12')
+
+        Cliente.objects.create(nombre='Nuevo')
+        with self.assertNumQueries(0):
+            self.assertEqual(int(contar(Cliente.objects.order_by('nombre'))), 12)
+
+    def test_lista_de_clientes_muestra_conteo_aproximado(self):
+        user_model = get_user_model()
+        self.client.force_login(user_model.objects.create_user(username='conteo', password='password'))
+        contar(Cliente.objects.all())
+        Cliente.objects.bulk_create([Cliente(nombre=f'Extra {numero:02d}') for numero in range(20)])
+
+        response = self.client.get(reverse('cotizaciones:cliente_list'), {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'aprox. 12 resultados')
+        self.assertEqual(len(response.context['clientes']), 12)
+
+
+class ContextoGlobalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        caches[versiones.ALIAS].clear()
+        self.addCleanup(caches[versiones.ALIAS].clear)
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(username='contexto', password='password')
+        self.user.groups.add(Group.objects.create(name='Administrador'))
+
+    def test_grupos_se_consultan_una_vez_por_request_y_se_invalidan(self):
+        request = mock.Mock(user=self.user, session={})
+        with self.assertNumQueries(1):
+            self.assertEqual(roles.grupos(self.user, request), {'Administrador'})
+            self.assertTrue(roles.tiene_grupo(request, 'Administrador', 'Almacen'))
+
+        # Nuevo request con la misma sesión: sale de la sesión sin consultar.
+        user = get_user_model().objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(roles.grupos(user, mock.Mock(user=user, session=request.session)), {'Administrador'})
+
+        self.user.groups.add(Group.objects.create(name='Almacen'))
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(roles.grupos(user, mock.Mock(user=user, session=request.session)), {'Administrador', 'Almacen'})
+
+    @override_settings(ALMACEN_ROLES_EN_SESION=True)
+    def test_version_descartada_por_la_cache_no_revive_grupos(self):
+        # Aunque no se recorte, la caché de versiones puede perderse (reinicio, otro backend).
+        caches[versiones.ALIAS].delete(roles.CLAVE_VERSION)
+        request = mock.Mock(user=self.user, session={})
+        self.assertEqual(roles.grupos(self.user, request), {'Administrador'})
+
+        self.user.groups.clear()
+        caches[versiones.ALIAS].delete(roles.CLAVE_VERSION)
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(roles.grupos(user, mock.Mock(user=user, session=request.session)), frozenset())
+
+    def test_vista_con_grupo_requerido_consulta_grupos_una_vez(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('almacen:editar_institucion'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Administrador')
+        consultas_grupos = [q for q in consultas.captured_queries if 'auth_user_groups' in q['sql']]
+        self.assertEqual(len(consultas_grupos), 1)
+
+    def test_contexto_no_consulta_si_no_se_usa(self):
+        request = mock.Mock(user=self.user)
+        with self.assertNumQueries(0):
+            context_processors.grupo_usuario(request)
+            context_processors.frase_del_dia(request)
+            context_processors.datos_institucion(request)
+
+    def test_frase_del_dia_se_cachea_hasta_que_cambia(self):
+        FraseMotivacional.objects.create(frase='Primera', personaje='Uno')
+        self.assertEqual(context_processors.obtener_frase_del_dia().frase, 'Primera')
+        with self.assertNumQueries(0):
+            context_processors.obtener_frase_del_dia()
+
+        FraseMotivacional.objects.all().delete()
+        self.assertIsNone(context_processors.obtener_frase_del_dia())
+
+    def test_institucion_singleton_con_version(self):
+        self.assertIsNone(Institucion.obtener())
+        institucion = Institucion.objects.create(nombre='UPCV', direccion='Zona 1', telefono='123')
+        with self.assertNumQueries(1):
+            self.assertEqual(Institucion.obtener(), institucion)
+        with self.assertNumQueries(0):
+            self.assertEqual(Institucion.obtener().logo_pdf_url, '')
+
+        institucion.nombre = 'UPCV Central'
+        institucion.save()
+        self.assertEqual(Institucion.obtener().nombre, 'UPCV Central')
+
+        # Otro worker guardó la institución: solo cambia la versión compartida.
+        Institucion.objects.filter(pk=institucion.pk).update(nombre='UPCV Norte')
+        caches[versiones.ALIAS].set(Institucion.CLAVE_VERSION, 'otro-proceso', None)
+        self.assertEqual(Institucion.obtener().nombre, 'UPCV Norte')
+
+
+@override_settings(COTIZACIONES_PDF_WORKERS=0)
+class ResumenVentasTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Cliente Resumen')
+        self.producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO,
+            nombre='Producto R',
+            precio_costo=Decimal('4.00'),
+            precio_venta=Decimal('10.00'),
+        )
+
+    def _crear_cotizacion(self, cantidad='1.00', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            cotizacion = Cotizacion.objects.create(cliente=self.cliente, **kwargs)
+            CotizacionItem.objects.create(
+                cotizacion=cotizacion,
+                producto_servicio=self.producto,
+                cantidad=Decimal(cantidad),
+                precio_venta_unitario=self.producto.precio_venta,
+                precio_costo_unitario=self.producto.precio_costo,
+            )
+        return cotizacion
+
+    def _resumenes(self):
+        return {
+            (fila.estado, fila.cantidad, fila.subtotal_venta, fila.ganancia_total)
+            for fila in ResumenVentaDiaria.objects.all()
+        }
+
+    def test_resumen_se_mantiene_al_guardar_y_cambiar_estado(self):
+        cotizacion = self._crear_cotizacion('2.00')
+        self._crear_cotizacion('1.00')
+        self.assertEqual(self._resumenes(), {('BORRADOR', 2, Decimal('30.00'), Decimal('18.00'))})
+
+        cotizacion = Cotizacion.objects.get(pk=cotizacion.pk)
+        cotizacion.estado = Cotizacion.ESTADO_EMITIDA
+        with self.captureOnCommitCallbacks(execute=True):
+            cotizacion.save()
+        self.assertEqual(self._resumenes(), {
+            ('BORRADOR', 1, Decimal('10.00'), Decimal('6.00')),
+            ('EMITIDA', 1, Decimal('20.00'), Decimal('12.00')),
+        })
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cotizacion.items.get().delete()
+            Cotizacion.objects.get(pk=cotizacion.pk).delete()
+        self.assertEqual(self._resumenes(), {('BORRADOR', 1, Decimal('10.00'), Decimal('6.00'))})
+
+    def test_reconstruir_coincide_con_incremental(self):
+        self._crear_cotizacion('3.00')
+        self._crear_cotizacion('1.00', estado=Cotizacion.ESTADO_ANULADA)
+        incremental = self._resumenes()
+        ResumenVentaDiaria.objects.all().delete()
+        self.assertEqual(reconstruir(), 2)
+        self.assertEqual(self._resumenes(), incremental)
+
+    def test_dashboard_solo_lee_resumenes(self):
+        self._crear_cotizacion('3.00', estado=Cotizacion.ESTADO_EMITIDA)
+        user = get_user_model().objects.create_user(username='dashboard', password='password', is_staff=True)
+        user.groups.add(Group.objects.create(name='Administrador'))
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('almacen:dahsboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Cliente Resumen')
+        self.assertEqual(response.context['mes_actual']['venta'], Decimal('30.00'))
+        self.assertEqual(sum(response.context['graficas']['meses']['venta']), 30.0)
+        self.assertFalse([q for q in consultas.captured_queries if '"cotizaciones_app_cotizacion"' in q['sql']])
+
+
+@override_settings(COTIZACIONES_PDF_WORKERS=0)
+class ProductoAnaliticaTests(TestCase):
+    def setUp(self):
+        cliente = Cliente.objects.create(nombre='Cliente Analítica')
+        self.barato = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Cable', precio_costo=Decimal('1.00'), precio_venta=Decimal('4.00'),
+        )
+        self.caro = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Cámara', precio_costo=Decimal('80.00'), precio_venta=Decimal('100.00'),
+        )
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.cotizacion = Cotizacion.objects.create(cliente=cliente, estado=Cotizacion.ESTADO_EMITIDA)
+            self.item = self._item(self.barato, '10.00')
+            self._item(self.caro, '1.00')
+            borrador = Cotizacion.objects.create(cliente=cliente)
+            CotizacionItem.objects.create(
+                cotizacion=borrador, producto_servicio=self.caro, cantidad=Decimal('5.00'),
+                precio_venta_unitario=Decimal('100.00'), precio_costo_unitario=Decimal('80.00'),
+            )
+
+    def _item(self, producto, cantidad):
+        return CotizacionItem.objects.create(
+            cotizacion=self.cotizacion,
+            producto_servicio=producto,
+            cantidad=Decimal(cantidad),
+            precio_venta_unitario=producto.precio_venta,
+            precio_costo_unitario=producto.precio_costo,
+        )
+
+    def test_top_por_venta_y_margen(self):
+        emitidas = [Cotizacion.ESTADO_EMITIDA]
+        por_venta = analitica_productos(estados=emitidas, orden='venta')
+        self.assertEqual([fila['producto__nombre'] for fila in por_venta], ['Cámara', 'Cable'])
+        self.assertEqual(por_venta[0]['total_venta'], Decimal('100.00'))
+
+        por_margen = analitica_productos(estados=emitidas, orden='margen')
+        self.assertEqual(por_margen[0]['producto__nombre'], 'Cable')
+        self.assertEqual(round(por_margen[0]['margen'], 1), Decimal('75.0'))
+
+        todos = analitica_productos(orden='cantidad', limite=1)
+        self.assertEqual([(fila['producto__nombre'], fila['cantidad']) for fila in todos], [('Cable', Decimal('10.00'))])
+
+    def test_rango_combina_meses_completos_y_dias_sueltos(self):
+        cliente = Cliente.objects.create(nombre='Cliente Rango')
+        fechas = {'2026-01-20': '1.00', '2026-02-10': '2.00', '2026-03-05': '4.00'}
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            for fecha, cantidad in fechas.items():
+                cotizacion = Cotizacion.objects.create(
+                    cliente=cliente, estado=Cotizacion.ESTADO_ANULADA, fecha_emision=date.fromisoformat(fecha),
+                )
+                CotizacionItem.objects.create(
+                    cotizacion=cotizacion, producto_servicio=self.barato, cantidad=Decimal(cantidad),
+                    precio_venta_unitario=Decimal('4.00'), precio_costo_unitario=Decimal('1.00'),
+                )
+
+        def cantidad(desde, hasta):
+            filas = analitica_productos(
+                desde=date.fromisoformat(desde), hasta=date.fromisoformat(hasta), estados=[Cotizacion.ESTADO_ANULADA],
+            )
+            return filas[0]['cantidad'] if filas else None
+
+        self.assertEqual(cantidad('2026-01-15', '2026-03-10'), Decimal('7.00'))
+        self.assertEqual(cantidad('2026-02-01', '2026-02-28'), Decimal('2.00'))
+        self.assertEqual(cantidad('2026-01-25', '2026-03-01'), Decimal('2.00'))
+        self.assertEqual(cantidad('2026-01-01', '2026-03-04'), Decimal('3.00'))
+        self.assertIsNone(cantidad('2026-01-21', '2026-02-09'))
+
+    def test_cambio_de_producto_actualiza_resumen(self):
+        item = CotizacionItem.objects.get(pk=self.item.pk)
+        item.producto_servicio = self.caro
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        filas = ResumenProductoDiario.objects.filter(estado=Cotizacion.ESTADO_EMITIDA)
+        self.assertEqual([(fila.producto_id, fila.lineas) for fila in filas], [(self.caro.pk, 2)])
+
+    def test_vista_solo_staff(self):
+        user_model = get_user_model()
+        self.client.force_login(user_model.objects.create_user(username='vendedor', password='password'))
+        self.assertEqual(self.client.get(reverse('cotizaciones:producto_analitica')).status_code, 403)
+
+        self.client.force_login(user_model.objects.create_user(username='jefe', password='password', is_staff=True))
+        response = self.client.get(reverse('cotizaciones:producto_analitica'), {'orden': 'margen'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([fila['producto__nombre'] for fila in response.context['productos']], ['Cable', 'Cámara'])
+        self.assertContains(response, '75,0 %')
+
+
+@override_settings(COTIZACIONES_PDF_WORKERS=0)
+class CotizacionExportacionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='contador', password='password')
+        self.client.force_login(self.user)
+        producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_SERVICIO, nombre='Instalación', precio_costo=Decimal('3.00'), precio_venta=Decimal('5.00'),
+        )
+        for nombre, estado in (('Ñandú S.A.', Cotizacion.ESTADO_EMITIDA), ('Otro', Cotizacion.ESTADO_BORRADOR)):
+            cotizacion = Cotizacion.objects.create(cliente=Cliente.objects.create(nombre=nombre), estado=estado)
+            for _ in range(2):
+                CotizacionItem.objects.create(
+                    cotizacion=cotizacion, producto_servicio=producto,
+                    precio_venta_unitario=producto.precio_venta, precio_costo_unitario=producto.precio_costo,
+                )
+
+    def test_csv_filtrado_y_en_streaming(self):
+        response = self.client.get(reverse('cotizaciones:cotizacion_export'), {'estado': Cotizacion.ESTADO_EMITIDA})
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        lineas = contenido.strip().splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertNotIn('Ganancia', lineas[0])
+        self.assertIn('Ñandú S.A.', lineas[1])
+        self.assertIn('Emitida', lineas[1])
+
+    def test_xlsx_detalle_por_item_con_costos(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('cotizaciones:cotizacion_export'), {'formato': 'xlsx', 'detalle': '1'})
+        libro = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        filas = list(libro.active.values)
+        self.assertEqual(len(filas), 5)
+        self.assertEqual(filas[0][-1], 'Ganancia')
+        self.assertEqual({fila[2] for fila in filas[1:]}, {'Ñandú S.A.', 'Otro'})
+        self.assertEqual(sum(fila[-1] for fila in filas[1:]), 8)
+
+
+class ImportarCatalogoTests(TestCase):
+    def setUp(self):
+        self.directorio = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+
+    def importar(self, catalogo, contenido, *opciones):
+        ruta = self.directorio / 'catalogo.csv'
+        ruta.write_text(contenido, encoding='utf-8')
+        salida, errores = StringIO(), StringIO()
+        call_command('importar_catalogo', catalogo, str(ruta), *opciones, stdout=salida, stderr=errores)
+        return salida.getvalue(), errores.getvalue()
+
+    def test_productos_crea_actualiza_y_reporta_errores(self):
+        existente = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Cable UTP', precio_costo=Decimal('1.00'), precio_venta=Decimal('2.00'),
+            activo=False,
+        )
+        filas = ['nombre,tipo,unidad,precio_costo,precio_venta']
+        filas += [f'Producto {indice},Producto,unidad,1.50,3' for indice in range(30)]
+        filas += ['cable  utp,PRODUCTO,metro,"1,25",2.75', 'Sin tipo,,,1,2', 'Negativo,Servicio,,-1,2']
+        version = ProductoServicio.version_catalogo()
+        with CaptureQueriesContext(connection) as consultas:
+            salida, errores = self.importar('productos', '\n'.join(filas), '--lote', '10')
+        self.assertNotEqual(ProductoServicio.version_catalogo(), version)
+
+        # Carga de claves + inserciones y actualizaciones por lote, no por fila.
+        self.assertLess(len(consultas), 20)
+        self.assertEqual(ProductoServicio.objects.count(), 31)
+        existente.refresh_from_db()
+        self.assertEqual((existente.unidad, existente.precio_costo, existente.precio_venta), ('metro', Decimal('1.25'), Decimal('2.75')))
+        # Sin columna "activo" en el archivo no se toca el estado.
+        self.assertFalse(existente.activo)
+        self.assertIn('Fila 33: tipo', errores)
+        self.assertIn('Fila 34: precio_costo', errores)
+        self.assertIn('30 nuevos, 1 actualizados, 2 con errores', salida)
+
+    def test_clientes_por_nit_y_dry_run(self):
+        Cliente.objects.create(nombre='Antiguo', nit='1234567-8')
+        contenido = 'Nombre,NIT,Email\nNuevo nombre,12345678,a@b.com\nOtro,999,\nConsumidor,CF,\n'
+        salida, errores = self.importar('clientes', contenido, '--dry-run')
+        self.assertIn('Simulación', salida)
+        self.assertIn('Fila 4: nit', errores)
+        self.assertEqual(Cliente.objects.get().nombre, 'Antiguo')
+
+        self.importar('clientes', contenido)
+        self.assertEqual(Cliente.objects.count(), 2)
+        self.assertEqual(Cliente.objects.get(nit='1234567-8').email, 'a@b.com')
+
+
+@override_settings(COTIZACIONES_PDF_WORKERS=0)
+class AjustePreciosTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='compras', password='password', is_staff=True)
+        self.client.force_login(self.user)
+        self.cable = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Cable UTP', precio_costo=Decimal('10.00'), precio_venta=Decimal('15.00'),
+        )
+        self.conector = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Conector RJ45', precio_costo=Decimal('0.99'), precio_venta=Decimal('2.00'),
+        )
+        self.servicio = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_SERVICIO, nombre='Instalación', precio_costo=Decimal('50.00'), precio_venta=Decimal('80.00'),
+        )
+        cliente = Cliente.objects.create(nombre='Cliente')
+        self.borrador = Cotizacion.objects.create(cliente=cliente)
+        self.emitida = Cotizacion.objects.create(cliente=cliente, estado=Cotizacion.ESTADO_EMITIDA)
+        for cotizacion in (self.borrador, self.emitida):
+            for producto in (self.cable, self.servicio):
+                CotizacionItem.objects.create(
+                    cotizacion=cotizacion, producto_servicio=producto, cantidad=Decimal('2.00'),
+                    precio_venta_unitario=producto.precio_venta, precio_costo_unitario=producto.precio_costo,
+                )
+
+    def post(self, **datos):
+        datos = {'tipo': ProductoServicio.TIPO_PRODUCTO, 'campo': 'ambos', 'modo': 'PORCENTAJE', 'valor': '10', 'propagar': 'on', **datos}
+        return self.client.post(reverse('cotizaciones:producto_ajuste_precios'), datos)
+
+    def test_vista_previa_no_modifica_y_aplicar_exige_la_misma_firma(self):
+        response = self.post(accion='previsualizar')
+        self.assertEqual(response.context['vista_previa']['productos'], 2)
+        self.assertEqual(response.context['vista_previa']['lineas'], 1)
+        self.assertEqual(response.context['vista_previa']['cotizaciones'], 1)
+        self.cable.refresh_from_db()
+        self.assertEqual(self.cable.precio_venta, Decimal('15.00'))
+
+        # Con otro valor distinto al previsualizado solo se vuelve a mostrar la vista previa.
+        response = self.post(accion='aplicar', firma=response.context['firma'], valor='20')
+        self.assertEqual(response.status_code, 200)
+        self.cable.refresh_from_db()
+        self.assertEqual(self.cable.precio_venta, Decimal('15.00'))
+
+    def test_aplicar_actualiza_productos_y_borradores_por_conjuntos(self):
+        firma = self.post(accion='previsualizar').context['firma']
+        antes = ProductoServicio.version_catalogo()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.post(accion='aplicar', firma=firma)
+        self.assertLess(len(consultas), 20)
+        self.assertRedirects(response, reverse('cotizaciones:producto_list'))
+        self.assertNotEqual(ProductoServicio.version_catalogo(), antes)
+
+        self.cable.refresh_from_db()
+        self.conector.refresh_from_db()
+        self.servicio.refresh_from_db()
+        self.assertEqual((self.cable.precio_costo, self.cable.precio_venta), (Decimal('11.00'), Decimal('16.50')))
+        self.assertEqual(self.conector.precio_costo, Decimal('1.09'))
+        self.assertEqual(self.servicio.precio_venta, Decimal('80.00'))
+
+        item = self.borrador.items.get(producto_servicio=self.cable)
+        self.assertEqual((item.precio_venta_unitario, item.total_linea_venta, item.ganancia_linea), (Decimal('16.50'), Decimal('33.00'), Decimal('11.00')))
+        self.borrador.refresh_from_db()
+        self.assertEqual(self.borrador.subtotal_venta, Decimal('193.00'))
+        self.assertEqual(self.emitida.items.get(producto_servicio=self.cable).precio_venta_unitario, Decimal('15.00'))
+
+    def test_monto_fijo_no_deja_precios_negativos(self):
+        firma = self.post(accion='previsualizar', campo='precio_costo', modo='MONTO', valor='-5', propagar='').context['firma']
+        self.post(accion='aplicar', firma=firma, campo='precio_costo', modo='MONTO', valor='-5', propagar='')
+        self.conector.refresh_from_db()
+        self.cable.refresh_from_db()
+        self.assertEqual((self.conector.precio_costo, self.conector.precio_venta), (Decimal('0.00'), Decimal('2.00')))
+        self.assertEqual(self.cable.precio_costo, Decimal('5.00'))
+        self.assertEqual(self.borrador.items.get(producto_servicio=self.cable).precio_costo_unitario, Decimal('10.00'))
+
+    def test_solo_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('cotizaciones:producto_ajuste_precios')).status_code, 403)
+
+    def test_accion_admin(self):
+        self.user.is_superuser = True
+        self.user.save()
+        url = reverse('admin:cotizaciones_app_productoservicio_changelist')
+        datos = {'action': 'ajustar_precios', 'index': '0', '_selected_action': [self.servicio.pk], 'campo': 'precio_venta', 'modo': 'MONTO', 'valor': '5'}
+        response = self.client.post(url, {**datos, 'accion': 'previsualizar'})
+        self.assertEqual(response.context['vista_previa']['productos'], 1)
+        response = self.client.post(url, {**datos, 'accion': 'aplicar', 'firma': response.context['firma']})
+        self.assertRedirects(response, url)
+        self.servicio.refresh_from_db()
+        self.assertEqual(self.servicio.precio_venta, Decimal('85.00'))
+
+
+@override_settings(COTIZACIONES_PDF_WORKERS=0)
+class CotizacionDuplicarTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='vendedor', password='password')
+        self.client.force_login(self.user)
+        self.original_cliente = Cliente.objects.create(nombre='Original')
+        self.nuevo_cliente = Cliente.objects.create(nombre='Nuevo')
+        self.producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Cámara', precio_costo=Decimal('100.00'), precio_venta=Decimal('150.00'),
+        )
+        self.cotizacion = Cotizacion.objects.create(
+            cliente=self.original_cliente, titulo='Kit CCTV', estado=Cotizacion.ESTADO_EMITIDA, fecha_emision=date(2024, 1, 5),
+        )
+        with totales_diferidos():
+            for indice in range(30):
+                CotizacionItem.objects.create(
+                    cotizacion=self.cotizacion, producto_servicio=self.producto, descripcion_editable=f'Línea {indice}',
+                    cantidad=Decimal('2.00'), precio_venta_unitario=Decimal('120.00'), precio_costo_unitario=Decimal('90.00'),
+                )
+
+    def duplicar(self, **datos):
+        url = reverse('cotizaciones:cotizacion_duplicar', args=[self.cotizacion.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, {'cliente': self.nuevo_cliente.pk, **datos})
+
+    def test_copia_encabezado_e_items_con_pocas_consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.duplicar()
+        # Sin consultas por línea: 30 ítems se copian en un único INSERT.
+        inserciones = [q['sql'] for q in consultas if q['sql'].startswith('INSERT INTO "cotizaciones_app_cotizacionitem"')]
+        self.assertEqual(len(inserciones), 1)
+        self.assertLess(len(consultas), 25)
+        copia = Cotizacion.objects.exclude(pk=self.cotizacion.pk).get()
+        self.assertRedirects(response, reverse('cotizaciones:cotizacion_update', args=[copia.pk]))
+
+        self.assertNotEqual(copia.correlativo, self.cotizacion.correlativo)
+        self.assertEqual((copia.cliente, copia.titulo, copia.estado), (self.nuevo_cliente, 'Kit CCTV', Cotizacion.ESTADO_BORRADOR))
+        self.assertEqual(copia.fecha_emision, timezone.localdate())
+        self.assertEqual(copia.subtotal_venta, Decimal('7200.00'))
+        self.assertEqual(copia.ganancia_total, Decimal('1800.00'))
+        self.assertEqual(
+            list(copia.items.values_list('descripcion_editable', flat=True)),
+            [f'Línea {indice}' for indice in range(30)],
+        )
+        self.assertEqual(
+            ResumenVentaDiaria.objects.get(cliente=self.nuevo_cliente).subtotal_venta, Decimal('7200.00'),
+        )
+        self.assertEqual(
+            ResumenProductoDiario.objects.get(estado=Cotizacion.ESTADO_BORRADOR).lineas, 30,
+        )
+
+    def test_actualizar_precios_toma_el_catalogo(self):
+        self.duplicar(actualizar_precios='on')
+        copia = Cotizacion.objects.exclude(pk=self.cotizacion.pk).get()
+        item = copia.items.first()
+        self.assertEqual((item.precio_venta_unitario, item.total_linea_venta), (Decimal('150.00'), Decimal('300.00')))
+        self.assertEqual(copia.subtotal_venta, Decimal('9000.00'))
+        self.assertEqual(copia.subtotal_costo, Decimal('6000.00'))
+
+
+@override_settings(COTIZACIONES_PDF_WORKERS=0)
+class InstantaneaCotizacionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='auditor', password='password', is_staff=True)
+        self.client.force_login(self.user)
+        self.cliente = Cliente.objects.create(nombre='Municipalidad', nit='123-4')
+        self.producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Switch 24p', descripcion='Administrable',
+            precio_costo=Decimal('900.00'), precio_venta=Decimal('1250.50'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cotizacion = Cotizacion.objects.create(cliente=self.cliente, estado=Cotizacion.ESTADO_EMITIDA)
+            self.item = CotizacionItem.objects.create(
+                cotizacion=self.cotizacion, producto_servicio=self.producto, cantidad=Decimal('2.00'),
+                precio_venta_unitario=self.producto.precio_venta, precio_costo_unitario=self.producto.precio_costo,
+            )
+
+    def test_emitida_se_renderiza_desde_la_instantanea(self):
+        datos = CotizacionInstantanea.objects.get(pk=self.cotizacion.pk).datos
+        self.assertEqual(datos['subtotal_venta'], '2501,00')
+        self.assertEqual(datos['items'][0]['descripcion'], 'Administrable')
+
+        # Editar cliente o catálogo no altera una cotización ya emitida.
+        Cliente.objects.filter(pk=self.cliente.pk).update(nombre='Otro nombre')
+        ProductoServicio.objects.filter(pk=self.producto.pk).update(nombre='Otro producto')
+        url = reverse('cotizaciones:cotizacion_detail', args=[self.cotizacion.pk])
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        tablas = ' '.join(q['sql'] for q in consultas)
+        self.assertNotIn('cotizaciones_app_cotizacionitem', tablas)
+        self.assertNotIn('cotizaciones_app_cliente', tablas)
+        self.assertContains(response, 'Municipalidad')
+        self.assertContains(response, 'Switch 24p')
+        self.assertContains(response, 'Q 2501,00')
+
+    def test_cambios_en_la_cotizacion_regeneran_y_borrador_no_guarda(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.cantidad = Decimal('3.00')
+            self.item.save()
+        self.assertEqual(CotizacionInstantanea.objects.get(pk=self.cotizacion.pk).datos['items'][0]['cantidad'], '3,00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cotizacion.refresh_from_db()
+            self.cotizacion.estado = Cotizacion.ESTADO_BORRADOR
+            self.cotizacion.save()
+        self.assertFalse(CotizacionInstantanea.objects.filter(pk=self.cotizacion.pk).exists())
+        Cliente.objects.filter(pk=self.cliente.pk).update(nombre='Nombre nuevo')
+        self.assertContains(self.client.get(reverse('cotizaciones:cotizacion_detail', args=[self.cotizacion.pk])), 'Nombre nuevo')
+
+    def test_regenerar_conserva_cliente_y_producto(self):
+        self.cliente.nombre = 'Otro nombre'
+        self.cliente.save()
+        self.producto.nombre = 'Otro producto'
+        self.producto.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.cantidad = Decimal('3.00')
+            self.item.save()
+            CotizacionItem.objects.create(
+                cotizacion=self.cotizacion, producto_servicio=self.producto, cantidad=Decimal('1.00'),
+                precio_venta_unitario=self.producto.precio_venta, precio_costo_unitario=self.producto.precio_costo,
+            )
+
+        datos = CotizacionInstantanea.objects.get(pk=self.cotizacion.pk).datos
+        self.assertEqual(datos['cliente']['nombre'], 'Municipalidad')
+        self.assertEqual(datos['items'][0]['nombre'], 'Switch 24p')
+        self.assertEqual(datos['items'][0]['cantidad'], '3,00')
+        # Una línea agregada después toma el producto como está ahora.
+        self.assertEqual(datos['items'][1]['nombre'], 'Otro producto')
+
+        # Cambiar de cliente sí es un cambio de la cotización.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cotizacion.refresh_from_db()
+            self.cotizacion.cliente = Cliente.objects.create(nombre='Ministerio')
+            self.cotizacion.save()
+        self.assertEqual(CotizacionInstantanea.objects.get(pk=self.cotizacion.pk).datos['cliente']['nombre'], 'Ministerio')
+
+    def test_emitida_sin_instantanea_la_crea_al_leerla(self):
+        CotizacionInstantanea.objects.all().delete()
+        response = self.client.get(reverse('cotizaciones:cotizacion_print', args=[self.cotizacion.pk]))
+        self.assertContains(response, 'Switch 24p')
+        self.assertTrue(CotizacionInstantanea.objects.filter(pk=self.cotizacion.pk).exists())
+
+
+class FragmentoDetalleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(username='fragmento', password='password', is_staff=True)
+        self.client.force_login(self.user)
+        cliente = Cliente.objects.create(nombre='Colegio', nit='555')
+        self.producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_SERVICIO, nombre='Cableado', descripcion='Punto de red',
+            precio_costo=Decimal('60.00'), precio_venta=Decimal('100.00'),
+        )
+        self.cotizacion = Cotizacion.objects.create(cliente=cliente)
+        self.items = [
+            CotizacionItem.objects.create(
+                cotizacion=self.cotizacion, producto_servicio=self.producto, cantidad=Decimal(cantidad),
+                precio_venta_unitario=Decimal('100.00'), precio_costo_unitario=Decimal('60.00'),
+            )
+            for cantidad in ('1.00', '2.00', '3.00')
+        ]
+        self.url = reverse('cotizaciones:cotizacion_detail', args=[self.cotizacion.pk])
+
+    def _get(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url)
+        return response, ' '.join(q['sql'] for q in consultas)
+
+    def test_vista_repetida_no_consulta_items(self):
+        primera, sql = self._get()
+        self.assertIn('cotizaciones_app_cotizacionitem', sql)
+        segunda, sql = self._get()
+        self.assertNotIn('cotizaciones_app_cotizacionitem', sql)
+        self.assertEqual(primera.content, segunda.content)
+        self.assertContains(segunda, 'Q 600,00')
+
+    def test_cambios_se_reflejan_de_inmediato(self):
+        self._get()
+        self.items[0].cantidad = Decimal('5.00')
+        self.items[0].save()
+        self.assertContains(self._get()[0], 'Q 1000,00')
+
+        self.items[1].descripcion_editable = 'Certificado categoría 6'
+        self.items[1].save()
+        self.assertContains(self._get()[0], 'Certificado categoría 6')
+
+        self.items[2].delete()
+        self.assertContains(self._get()[0], 'Q 700,00')
+
+        self.producto.nombre = 'Cableado estructurado'
+        self.producto.save()
+        self.assertContains(self._get()[0], 'Cableado estructurado')
+
+    def test_version_del_catalogo_no_consulta_productos(self):
+        self._get()
+        version = ProductoServicio.version_catalogo()
+        sql = self._get()[1]
+        self.assertNotIn('cotizaciones_app_productoservicio', sql)
+
+        ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='Patch cord',
+            precio_costo=Decimal('5.00'), precio_venta=Decimal('9.00'),
+        )
+        self.assertNotEqual(ProductoServicio.version_catalogo(), version)
+        self.assertIn('cotizaciones_app_productoservicio', self._get()[1])
+
+    def test_fragmento_separado_por_rol(self):
+        self.assertContains(self._get()[0], 'Ganancia total')
+        self.client.force_login(get_user_model().objects.create_user(username='vendedor', password='password'))
+        response = self._get()[0]
+        self.assertContains(response, 'Q 600,00')
+        self.assertNotContains(response, 'Ganancia total')
+
+
+@override_settings(COTIZACIONES_PDF_WORKERS=0)
+class MetricasTests(TestCase):
+    def setUp(self):
+        metricas.registro.reiniciar()
+        self.addCleanup(metricas.registro.reiniciar)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        overrides = override_settings(COTIZACIONES_PDF_CACHE_DIR=cache_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_login(get_user_model().objects.create_user(username='metricas', password='password', is_staff=True))
+        producto = ProductoServicio.objects.create(
+            tipo=ProductoServicio.TIPO_PRODUCTO, nombre='UPS', precio_costo=Decimal('300.00'), precio_venta=Decimal('450.00'),
+        )
+        self.cotizacion = Cotizacion.objects.create(cliente=Cliente.objects.create(nombre='Banco', nit='77'))
+        CotizacionItem.objects.create(
+            cotizacion=self.cotizacion, producto_servicio=producto,
+            precio_venta_unitario=producto.precio_venta, precio_costo_unitario=producto.precio_costo,
+        )
+
+    def _metricas(self):
+        response = self.client.get(reverse('cotizaciones:metricas'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        valores = {}
+        for linea in response.content.decode().splitlines():
+            if linea and not linea.startswith('#'):
+                nombre, valor = linea.rsplit(' ', 1)
+                valores[nombre] = float(valor)
+        return valores
+
+    def test_registra_por_vista(self):
+        self.client.get(reverse('cotizaciones:cotizacion_detail', args=[self.cotizacion.pk]))
+        self.client.get(reverse('cotizaciones:cotizacion_pdf', args=[self.cotizacion.pk]))
+        valores = self._metricas()
+
+        detalle = 'vista="cotizaciones:cotizacion_detail"'
+        self.assertEqual(valores[f'cotizaciones_solicitudes_total{{{detalle}}}'], 1)
+        self.assertEqual(valores[f'cotizaciones_solicitud_segundos_bucket{{{detalle},le="+Inf"}}'], 1)
+        self.assertGreater(valores[f'cotizaciones_db_consultas_total{{{detalle}}}'], 0)
+        self.assertGreater(valores[f'cotizaciones_plantillas_segundos_total{{{detalle}}}'], 0)
+        self.assertEqual(valores[f'cotizaciones_pdf_total{{{detalle}}}'], 0)
+        self.assertEqual(valores['cotizaciones_pdf_total{vista="cotizaciones:cotizacion_pdf"}'], 1)
+        self.assertGreater(valores['cotizaciones_pdf_segundos_total{vista="cotizaciones:cotizacion_pdf"}'], 0)
+
+        metricas.registrar_segundo_plano(1.5, 2)
+        self.assertEqual(self._metricas()['cotizaciones_pdf_total{vista="(segundo plano)"}'], 2)
+
+    def test_solo_staff(self):
+        self.client.force_login(get_user_model().objects.create_user(username='vendedor', password='password'))
+        self.assertEqual(self.client.get(reverse('cotizaciones:metricas')).status_code, 403)
+
+
+def _normalizar_sql(sql):
+    """SQL sin literales, listas IN ni nombres de savepoint, para comparar consultas entre escenarios."""
+    sql = re.sub(r"'(?:[^']|'')*'", "'?'", sql)
+    sql = re.sub(r'"s\d+_x\d+"', '"s?"', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'IN \(\?(?:, \?)*\)', 'IN (...)', sql)
+    return re.sub(r'(\([^()]*\))(?:, \([^()]*\))+', r'\1, ...', sql)
+
+
+def _unir_lotes(consultas):
+    """Cuenta como una sola escritura los lotes consecutivos de un mismo INSERT de varias filas.
+
+    SQLite limita los parámetros por sentencia y Django parte cada ``bulk_create`` en lotes
+    de ~100 filas; en PostgreSQL es una sola sentencia. Los INSERT de una fila (un ``save()``
+    por objeto) no se unen, así que un N+1 de escrituras sigue contando.
+    """
+    unidas = []
+    for sql in consultas:
+        if unidas and sql == unidas[-1] and sql.startswith('INSERT') and '), ...' in sql:
+            continue
+        unidas.append(sql)
+    return unidas
+
+
+# Consultas exactas por URL con una sesión de staff y la caché general vacía (los tokens de
+# almacen_app/versiones.py siguen vigentes, como en producción). Deben ser las mismas con
+# 1, 50 o 500 ítems y con 20 o 2000 clientes y productos; si una vista las cambia a propósito,
+# se ajusta aquí.
+PRESUPUESTO_CONSULTAS = {
+    'cliente_list': 7,
+    'cliente_create': 4,
+    'cliente_update': 5,
+    'producto_list': 7,
+    'producto_create': 4,
+    'producto_update': 5,
+    'cotizacion_list': 7,
+    'cotizacion_export': 3,
+    'cotizacion_export?detalle=1': 3,
+    'cotizacion_create': 5,
+    'cotizacion_detail': 7,
+    'cotizacion_update': 7,
+    'cotizacion_update:post': 12,
+    'cotizacion_duplicar': 7,
+    'cotizacion_duplicar:post': 9,
+    'producto_buscar': 3,
+    'producto_precios': 3,
+    'producto_ajuste_precios': 4,
+    'producto_analitica': 5,
+    'producto_precio': 3,
+    'cotizacion_pdf': 5,
+    'cotizacion_pdf_estado': 5,
+    'cotizacion_jpg': 5,
+    'cotizacion_print': 5,
+    'cotizacion_pdf_interno': 5,
+    'cotizacion_jpg_interno': 5,
+    'metricas': 2,
+}
+
+
+# Con un límite de conteo exacto menor que cualquier listado, todos siguen siempre el mismo camino.
+@override_settings(COTIZACIONES_PDF_WORKERS=0, COTIZACIONES_CONTEO_EXACTO_HASTA=2)
+class PresupuestoConsultasTests(TestCase):
+    TAMANOS_COTIZACION = (1, 50, 500)
+    TAMANOS_CATALOGO = (20, 2000)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Maquetar 500 líneas con pisa tarda segundos y no consulta la base: se escribe un PDF
+        # mínimo real (la plantilla se sigue renderizando y el JPG se sigue rasterizando).
+        destino = BytesIO()
+        pdf.pisa.CreatePDF('<p>Cotización</p>', dest=destino)
+        minimo = destino.getvalue()
+        parche = mock.patch.object(pdf.pisa, 'CreatePDF', side_effect=lambda html, dest, **kwargs: dest.write(minimo))
+        parche.start()
+        cls.addClassCleanup(parche.stop)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='presupuesto', password='password', is_staff=True)
+        cls.cotizaciones = {}
+        cls._completar_catalogo(cls.TAMANOS_CATALOGO[0])
+        productos = list(ProductoServicio.objects.order_by('pk'))
+        for tamano in cls.TAMANOS_COTIZACION:
+            cotizacion = Cotizacion.objects.create(cliente=Cliente.objects.first(), titulo=f'{tamano} ítems')
+            items = []
+            for indice in range(tamano):
+                producto = productos[indice % len(productos)]
+                item = CotizacionItem(
+                    cotizacion=cotizacion, producto_servicio=producto, cantidad=Decimal('2.00'),
+                    precio_venta_unitario=producto.precio_venta, precio_costo_unitario=producto.precio_costo,
+                )
+                item.calcular_totales()
+                items.append(item)
+            CotizacionItem.objects.bulk_create(items)
+            cls.cotizaciones[tamano] = cotizacion
+        Cotizacion.recalcular_totales([cotizacion.pk for cotizacion in cls.cotizaciones.values()])
+
+    @staticmethod
+    def _completar_catalogo(total):
+        for modelo, crear in (
+            (Cliente, lambda i: Cliente(nombre=f'Cliente {i:04d}', nit=f'{i:06d}')),
+            (ProductoServicio, lambda i: ProductoServicio(
+                tipo=ProductoServicio.TIPO_PRODUCTO, nombre=f'Producto {i:04d}', descripcion=f'Descripción {i}',
+                precio_costo=Decimal('10.00') + i, precio_venta=Decimal('15.00') + i,
+            )),
+        ):
+            modelo.objects.bulk_create([crear(i) for i in range(modelo.objects.count(), total)], batch_size=500)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        overrides = override_settings(COTIZACIONES_PDF_CACHE_DIR=cache_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client.force_login(self.user)
+
+    def _solicitudes(self, cotizacion):
+        """(clave de presupuesto, método, URL, datos POST) de cada endpoint de cotizaciones_app.urls."""
+        pk = cotizacion.pk
+        cliente = Cliente.objects.order_by('pk').first()
+        producto = ProductoServicio.objects.order_by('pk').first()
+        items = list(cotizacion.items.order_by('pk').values_list('pk', 'producto_servicio_id', 'cantidad'))
+        edicion = {
+            'fecha_emision': '2026-01-15',
+            'cliente': cotizacion.cliente_id,
+            'titulo': 'Editada',
+            'validez_dias': 15,
+            'garantia_texto': 'Garantía',
+            'estado': Cotizacion.ESTADO_BORRADOR,
+            'items-TOTAL_FORMS': len(items),
+            'items-INITIAL_FORMS': len(items),
+            'items-MIN_NUM_FORMS': 0,
+            'items-MAX_NUM_FORMS': 1000,
+        }
+        for indice, (item_pk, producto_pk, cantidad) in enumerate(items):
+            edicion.update({
+                f'items-{indice}-id': item_pk,
+                f'items-{indice}-cotizacion': pk,
+                f'items-{indice}-producto_servicio': producto_pk,
+                f'items-{indice}-cantidad': cantidad + 1 if indice == 0 else cantidad,
+            })
+
+        def ruta(nombre, *args):
+            return reverse(f'cotizaciones:{nombre}', args=args)
+
+        ids = ','.join(map(str, ProductoServicio.objects.order_by('pk').values_list('pk', flat=True)[:20]))
+        return [
+            ('cliente_list', 'get', ruta('cliente_list') + '?q=Cliente', None),
+            ('cliente_create', 'get', ruta('cliente_create'), None),
+            ('cliente_update', 'get', ruta('cliente_update', cliente.pk), None),
+            ('producto_list', 'get', ruta('producto_list') + '?q=Producto', None),
+            ('producto_create', 'get', ruta('producto_create'), None),
+            ('producto_update', 'get', ruta('producto_update', producto.pk), None),
+            ('cotizacion_list', 'get', ruta('cotizacion_list'), None),
+            ('cotizacion_export', 'get', ruta('cotizacion_export'), None),
+            ('cotizacion_export?detalle=1', 'get', ruta('cotizacion_export') + '?detalle=1', None),
+            ('cotizacion_create', 'get', ruta('cotizacion_create'), None),
+            ('cotizacion_detail', 'get', ruta('cotizacion_detail', pk), None),
+            ('cotizacion_update', 'get', ruta('cotizacion_update', pk), None),
+            ('cotizacion_update:post', 'post', ruta('cotizacion_update', pk), edicion),
+            ('cotizacion_duplicar', 'get', ruta('cotizacion_duplicar', pk), None),
+            ('cotizacion_duplicar:post', 'post', ruta('cotizacion_duplicar', pk), {'cliente': cliente.pk}),
+            ('producto_buscar', 'get', ruta('producto_buscar') + '?q=Producto', None),
+            ('producto_precios', 'get', ruta('producto_precios') + f'?ids={ids}', None),
+            ('producto_ajuste_precios', 'get', ruta('producto_ajuste_precios'), None),
+            ('producto_analitica', 'get', ruta('producto_analitica'), None),
+            ('producto_precio', 'get', ruta('producto_precio', producto.pk), None),
+            ('cotizacion_pdf', 'get', ruta('cotizacion_pdf', pk), None),
+            ('cotizacion_pdf_estado', 'get', ruta('cotizacion_pdf_estado', pk), None),
+            ('cotizacion_jpg', 'get', ruta('cotizacion_jpg', pk), None),
+            ('cotizacion_print', 'get', ruta('cotizacion_print', pk), None),
+            ('cotizacion_pdf_interno', 'get', ruta('cotizacion_pdf_interno', pk), None),
+            ('cotizacion_jpg_interno', 'get', ruta('cotizacion_jpg_interno', pk), None),
+            ('metricas', 'get', ruta('metricas'), None),
+        ]
+
+    def _medir(self, metodo, url, datos):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            response = getattr(self.client, metodo)(url, datos)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            # Se copian aquí: la siguiente solicitud del cliente de pruebas reinicia connection.queries.
+            capturadas = _unir_lotes([_normalizar_sql(consulta['sql']) for consulta in consultas.captured_queries])
+        self.assertIn(response.status_code, (200, 302), f'{url} respondió {response.status_code}')
+        return capturadas
+
+    def _mensaje(self, clave, escenario, capturadas, referencia):
+        presupuesto = PRESUPUESTO_CONSULTAS.get(clave)
+        encabezado = f'{clave}: {len(capturadas)} consultas, presupuesto {presupuesto} ({escenario})'
+        if referencia is None:
+            return '\n'.join([encabezado] + [f'{i}. {sql}' for i, sql in enumerate(capturadas, 1)])
+        diferencias = difflib.unified_diff(
+            referencia[1], capturadas, fromfile=referencia[0], tofile=escenario, lineterm='', n=1,
+        )
+        return '\n'.join([encabezado, *diferencias])
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        claves = {clave.split('?')[0].split(':')[0] for clave in PRESUPUESTO_CONSULTAS}
+        nombres = {patron.name for patron in get_resolver('cotizaciones_app.urls').url_patterns}
+        self.assertEqual(nombres - claves, set())
+        solicitudes = {clave for clave, *_ in self._solicitudes(self.cotizaciones[1])}
+        self.assertEqual(set(PRESUPUESTO_CONSULTAS), solicitudes)
+
+    def test_presupuesto_no_crece_con_items_ni_catalogo(self):
+        # Pasada sin medir: comprobaciones que se hacen una vez por proceso o por sesión.
+        for clave, metodo, url, datos in self._solicitudes(self.cotizaciones[1]):
+            self._medir(metodo, url, datos)
+        referencias = {}
+        for catalogo in self.TAMANOS_CATALOGO:
+            self._completar_catalogo(catalogo)
+            for tamano, cotizacion in self.cotizaciones.items():
+                escenario = f'catálogo {catalogo}, {tamano} ítems'
+                for clave, metodo, url, datos in self._solicitudes(cotizacion):
+                    capturadas = self._medir(metodo, url, datos)
+                    referencia = referencias.setdefault(clave, (escenario, capturadas))
+                    with self.subTest(clave=clave, escenario=escenario):
+                        self.assertEqual(
+                            len(capturadas), PRESUPUESTO_CONSULTAS.get(clave),
+                            self._mensaje(clave, escenario, capturadas, None if referencia[1] is capturadas else referencia),
+                        )
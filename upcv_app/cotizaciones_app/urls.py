@@ -13,13 +13,21 @@ urlpatterns = [
     path('productos/nuevo/', views.ProductoServicioCreateView.as_view(), name='producto_create'),
     path('productos/<int:pk>/editar/', views.ProductoServicioUpdateView.as_view(), name='producto_update'),
     path('', views.CotizacionListView.as_view(), name='cotizacion_list'),
+    path('exportar/', views.cotizacion_exportar, name='cotizacion_export'),
     path('nueva/', views.CotizacionCreateView.as_view(), name='cotizacion_create'),
     path('<int:pk>/', views.CotizacionDetailView.as_view(), name='cotizacion_detail'),
     path('<int:pk>/editar/', views.CotizacionUpdateView.as_view(), name='cotizacion_update'),
+    path('<int:pk>/duplicar/', views.cotizacion_duplicar, name='cotizacion_duplicar'),
+    path('productos/buscar/', views.producto_buscar, name='producto_buscar'),
+    path('productos/precios/', views.producto_precios, name='producto_precios'),
+    path('productos/ajuste-precios/', views.producto_ajuste_precios, name='producto_ajuste_precios'),
+    path('productos/analitica/', views.producto_analitica, name='producto_analitica'),
     path('producto-precio/<int:pk>/', views.producto_precio, name='producto_precio'),
     path('<int:pk>/pdf/', views.cotizacion_pdf, name='cotizacion_pdf'),
+    path('<int:pk>/pdf/estado/', views.cotizacion_pdf_estado, name='cotizacion_pdf_estado'),
     path('<int:pk>/jpg/', views.cotizacion_cliente_jpg, name='cotizacion_jpg'),
     path('<int:pk>/print/', views.cotizacion_print, name='cotizacion_print'),
     path('<int:pk>/pdf-interno/', views.cotizacion_pdf_interno, name='cotizacion_pdf_interno'),
     path('<int:pk>/jpg-interno/', views.cotizacion_jpg_interno, name='cotizacion_jpg_interno'),
+    path('metricas/', views.metricas, name='metricas'),
 ]
@@ -1,32 +1,44 @@
+import hashlib
+import zipfile
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-import os
-
-from django.conf import settings
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Case, IntegerField, Value, When
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.template.loader import render_to_string
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.views import View
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
 from django.views.generic import CreateView, DetailView, ListView, UpdateView
-from xhtml2pdf import pisa
 
+from almacen_app import roles
 from almacen_app.models import Institucion
-from django.contrib.staticfiles import finders
 
+from . import instantaneas
+from .busqueda import buscar
+from .conteo import PaginadorConteo, contar
+from .exportacion import filas_cotizaciones, filas_items, respuesta_csv, respuesta_xlsx
 from .forms import (
+    AjustePreciosForm,
     ClienteForm,
     ProductoServicioForm,
     CotizacionForm,
     CotizacionItemFormSet,
+    DuplicarCotizacionForm,
 )
-from .models import Cliente, ProductoServicio, Cotizacion
+from .metricas import registro as metricas_registro
+from .models import Cliente, ProductoServicio, Cotizacion, CotizacionItem
+from .paginacion import paginar_keyset
+from .pdf import PDF_CLIENTE, PDF_INTERNO, abrir_jpg, abrir_pdf, estado_pdf
+from .precios import aplicar_ajuste, describir_ajuste, filtrar_productos, previsualizar
+from .resumenes import ORDENES_PRODUCTOS, analitica_productos
 
 
 class ClienteListView(LoginRequiredMixin, ListView):
@@ -34,18 +46,11 @@ class ClienteListView(LoginRequiredMixin, ListView):
     template_name = 'cotizaciones_app/cliente_list.html'
     context_object_name = 'clientes'
     paginate_by = 20
+    paginator_class = PaginadorConteo
 
     def get_queryset(self):
         queryset = super().get_queryset().order_by('nombre')
-        q = self.request.GET.get('q')
-        if q:
-            queryset = queryset.filter(
-                Q(nombre__icontains=q)
-                | Q(telefono__icontains=q)
-                | Q(email__icontains=q)
-                | Q(nit__icontains=q)
-            )
-        return queryset
+        return buscar(queryset, self.request.GET.get('q'))
 
 
 class ClienteCreateView(LoginRequiredMixin, CreateView):
@@ -75,13 +80,11 @@ class ProductoServicioListView(LoginRequiredMixin, ListView):
     template_name = 'cotizaciones_app/producto_list.html'
     context_object_name = 'productos'
     paginate_by = 20
+    paginator_class = PaginadorConteo
 
     def get_queryset(self):
         queryset = super().get_queryset().order_by('nombre')
-        q = self.request.GET.get('q')
-        if q:
-            queryset = queryset.filter(Q(nombre__icontains=q) | Q(descripcion__icontains=q))
-        return queryset
+        return buscar(queryset, self.request.GET.get('q'))
 
 
 class ProductoServicioCreateView(LoginRequiredMixin, CreateView):
@@ -106,6 +109,56 @@ class ProductoServicioUpdateView(LoginRequiredMixin, UpdateView):
         return super().form_valid(form)
 
 
+@login_required
+def producto_ajuste_precios(request):
+    """Ajuste masivo de precios por porcentaje o monto, con vista previa obligatoria (solo staff)."""
+    _require_staff(request.user)
+    form = AjustePreciosForm(request.POST or None, initial=request.GET.dict())
+    vista_previa = None
+    if request.method == 'POST' and form.is_valid():
+        productos = filtrar_productos(ProductoServicio.objects.all(), **form.filtros)
+        argumentos = (form.campos, form.cleaned_data['modo'], form.cleaned_data['valor'], form.cleaned_data['propagar'])
+        if request.POST.get('accion') == 'aplicar' and request.POST.get('firma') == form.firma():
+            resumen = aplicar_ajuste(productos, *argumentos)
+            messages.success(request, f'Precios ajustados: {describir_ajuste(resumen)}.')
+            return redirect('cotizaciones:producto_list')
+        vista_previa = previsualizar(productos, *argumentos)
+    return render(
+        request,
+        'cotizaciones_app/producto_ajuste_precios.html',
+        {
+            'form': form,
+            'vista_previa': vista_previa,
+            'firma': form.firma() if vista_previa is not None else '',
+        },
+    )
+
+
+def filtrar_cotizaciones(queryset, params):
+    """Aplica los filtros del listado de cotizaciones (también los usa la exportación)."""
+    cliente_id = params.get('cliente')
+    q_cliente = params.get('q_cliente')
+    estado = params.get('estado')
+    fecha_inicio = parse_date(params.get('fecha_inicio', ''))
+    fecha_fin = parse_date(params.get('fecha_fin', ''))
+    q = params.get('q')
+
+    if cliente_id:
+        queryset = queryset.filter(cliente_id=cliente_id)
+    if q_cliente:
+        queryset = queryset.filter(cliente__in=buscar(Cliente.objects.all(), q_cliente).values('pk'))
+    if estado:
+        queryset = queryset.filter(estado=estado)
+    if fecha_inicio:
+        queryset = queryset.filter(fecha_emision__gte=fecha_inicio)
+    if fecha_fin:
+        queryset = queryset.filter(fecha_emision__lte=fecha_fin)
+    if q:
+        queryset = queryset.filter(correlativo__icontains=q)
+
+    return queryset
+
+
 class CotizacionListView(LoginRequiredMixin, ListView):
     model = Cotizacion
     template_name = 'cotizaciones_app/cotizacion_list.html'
@@ -113,33 +166,12 @@ class CotizacionListView(LoginRequiredMixin, ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('cliente')
-        cliente_id = self.request.GET.get('cliente')
-        q_cliente = self.request.GET.get('q_cliente')
-        estado = self.request.GET.get('estado')
-        fecha_inicio = parse_date(self.request.GET.get('fecha_inicio', ''))
-        fecha_fin = parse_date(self.request.GET.get('fecha_fin', ''))
-        q = self.request.GET.get('q')
-
-        if cliente_id:
-            queryset = queryset.filter(cliente_id=cliente_id)
-        if q_cliente:
-            queryset = queryset.filter(
-                Q(cliente__nombre__icontains=q_cliente)
-                | Q(cliente__telefono__icontains=q_cliente)
-                | Q(cliente__email__icontains=q_cliente)
-                | Q(cliente__nit__icontains=q_cliente)
-            )
-        if estado:
-            queryset = queryset.filter(estado=estado)
-        if fecha_inicio:
-            queryset = queryset.filter(fecha_emision__gte=fecha_inicio)
-        if fecha_fin:
-            queryset = queryset.filter(fecha_emision__lte=fecha_fin)
-        if q:
-            queryset = queryset.filter(correlativo__icontains=q)
+        return filtrar_cotizaciones(super().get_queryset().select_related('cliente'), self.request.GET)
 
-        return queryset
+    def paginate_queryset(self, queryset, page_size):
+        pagina = paginar_keyset(queryset, self.request.GET.get('cursor'), page_size)
+        pagina.total = contar(queryset)
+        return None, pagina, pagina.object_list, pagina.has_other_pages()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -149,6 +181,45 @@ class CotizacionListView(LoginRequiredMixin, ListView):
         return context
 
 
+ITEM_CAMPOS_ACTUALIZABLES = [
+    'producto_servicio',
+    'descripcion_editable',
+    'cantidad',
+    'precio_venta_unitario',
+    'precio_costo_unitario',
+    'total_linea_venta',
+    'total_linea_costo',
+    'ganancia_linea',
+]
+
+
+def guardar_items(formset, cotizacion):
+    """Persiste los ítems del formset con escrituras masivas y recalcula los totales una vez."""
+    formset.instance = cotizacion
+    nuevos, existentes = [], []
+    for item in formset.save(commit=False):
+        producto = item.producto_servicio
+        item.cotizacion = cotizacion
+        item.precio_venta_unitario = producto.precio_venta
+        item.precio_costo_unitario = producto.precio_costo
+        if not item.descripcion_editable:
+            item.descripcion_editable = producto.descripcion
+        item.calcular_totales()
+        if item.pk:
+            existentes.append(item)
+        else:
+            nuevos.append(item)
+
+    eliminados = [item.pk for item in formset.deleted_objects if item.pk]
+    if eliminados:
+        CotizacionItem.objects.filter(cotizacion=cotizacion, pk__in=eliminados).delete()
+    if existentes:
+        CotizacionItem.objects.bulk_update(existentes, ITEM_CAMPOS_ACTUALIZABLES)
+    if nuevos:
+        CotizacionItem.objects.bulk_create(nuevos)
+    Cotizacion.recalcular_totales([cotizacion.pk])
+
+
 class CotizacionCreateView(LoginRequiredMixin, CreateView):
     model = Cotizacion
     form_class = CotizacionForm
@@ -201,18 +272,7 @@ class CotizacionCreateView(LoginRequiredMixin, CreateView):
             cotizacion.fecha_emision = timezone.now().date()
             cotizacion.save()
 
-            formset.instance = cotizacion
-            items = formset.save(commit=False)
-            for item in items:
-                item.cotizacion = cotizacion
-                item.precio_venta_unitario = item.producto_servicio.precio_venta
-                item.precio_costo_unitario = item.producto_servicio.precio_costo
-                if not item.descripcion_editable:
-                    item.descripcion_editable = item.producto_servicio.descripcion
-                item.save()
-            if hasattr(formset, 'deleted_objects'):
-                for item in formset.deleted_objects:
-                    item.delete()
+            guardar_items(formset, cotizacion)
 
         messages.success(self.request, 'Cotización creada correctamente.')
         return redirect('cotizaciones:cotizacion_detail', pk=cotizacion.pk)
@@ -268,33 +328,39 @@ class CotizacionUpdateView(LoginRequiredMixin, UpdateView):
             cotizacion = form.save(commit=False)
             cotizacion.fecha_emision = timezone.now().date()
             cotizacion.save()
-            for item_form in formset.forms:
-                if not item_form.cleaned_data:
-                    continue
-                if item_form.cleaned_data.get('DELETE') and item_form.instance.pk:
-                    item_form.instance.delete()
-            items = formset.save(commit=False)
-            for item in items:
-                item.cotizacion = cotizacion
-                item.precio_venta_unitario = item.producto_servicio.precio_venta
-                item.precio_costo_unitario = item.producto_servicio.precio_costo
-                if not item.descripcion_editable:
-                    item.descripcion_editable = item.producto_servicio.descripcion
-                item.save()
+            guardar_items(formset, cotizacion)
         messages.success(self.request, 'Cotización actualizada correctamente.')
         return redirect('cotizaciones:cotizacion_detail', pk=cotizacion.pk)
 
 
+@login_required
+def cotizacion_duplicar(request, pk):
+    """Crea un borrador con los mismos ítems para otro cliente (o el mismo)."""
+    cotizacion = get_object_or_404(Cotizacion.objects.select_related('cliente'), pk=pk)
+    form = DuplicarCotizacionForm(request.POST or None, initial={'cliente': cotizacion.cliente_id})
+    if request.method == 'POST' and form.is_valid():
+        copia = cotizacion.duplicar(form.cleaned_data['cliente'], form.cleaned_data['actualizar_precios'])
+        messages.success(request, f'Cotización {copia.correlativo} creada a partir de {cotizacion.correlativo}.')
+        return redirect('cotizaciones:cotizacion_update', pk=copia.pk)
+    return render(
+        request,
+        'cotizaciones_app/cotizacion_duplicar.html',
+        {'cotizacion': cotizacion, 'form': form, 'total_items': cotizacion.items.count()},
+    )
+
+
 def user_can_view_costs(user):
-    return user.is_staff or user.is_superuser
+    return roles.puede_ver_costos(user)
 
 
 class CotizacionDetailView(LoginRequiredMixin, DetailView):
     model = Cotizacion
     context_object_name = 'cotizacion'
 
-    def get_queryset(self):
-        return super().get_queryset().select_related('cliente')
+    def get_object(self, queryset=None):
+        # Datos de render ya formateados (instantánea si está emitida), no la instancia del modelo.
+        # Los ítems de un borrador solo se consultan si la tabla no está en la caché de fragmentos.
+        return _datos_cotizacion(self.kwargs['pk'], diferir_items=True)
 
     def get_template_names(self):
         if user_can_view_costs(self.request.user):
@@ -303,33 +369,28 @@ class CotizacionDetailView(LoginRequiredMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['items'] = self.object.items.select_related('producto_servicio')
+        context['items'] = self.object['items']
         context['show_costs'] = user_can_view_costs(self.request.user)
-        context['institucion'] = Institucion.objects.first()
+        context['institucion'] = Institucion.obtener()
+        version = self.object['version']
+        if self.object['estado'] != Cotizacion.ESTADO_EMITIDA:
+            # Sin instantánea, nombre y descripción de los ítems salen del catálogo vigente.
+            version = f'{version}-{ProductoServicio.version_catalogo()}'
+        context['version_fragmento'] = version
+        context['fragmento_ttl'] = getattr(settings, 'COTIZACIONES_FRAGMENTO_TTL', 60 * 60 * 24)
         return context
 
 
-def _get_cotizacion_context(pk):
-    cotizacion = get_object_or_404(Cotizacion.objects.select_related('cliente'), pk=pk)
-    items = cotizacion.items.select_related('producto_servicio')
-    institucion = Institucion.objects.first()
-    return cotizacion, items, institucion
-
-
-def link_callback(uri, rel):
-    if uri.startswith(settings.MEDIA_URL):
-        path = os.path.join(settings.MEDIA_ROOT, uri.replace(settings.MEDIA_URL, ""))
-    elif uri.startswith(settings.STATIC_URL):
-        path = finders.find(uri.replace(settings.STATIC_URL, ""))
-        if path is None:
-            path = os.path.join(settings.STATIC_ROOT, uri.replace(settings.STATIC_URL, ""))
-    else:
-        return uri
+def _datos_cotizacion(pk, diferir_items=False):
+    try:
+        return instantaneas.obtener(pk, diferir_items=diferir_items)
+    except Cotizacion.DoesNotExist:
+        raise Http404
 
-    if not path or not os.path.isfile(path):
-        return uri
 
-    return path
+def _get_cotizacion_context(pk):
+    cotizacion = _datos_cotizacion(pk)
+    return cotizacion, cotizacion['items'], Institucion.obtener()
 
 
 def _require_staff(user):
@@ -339,9 +400,9 @@ def _require_staff(user):
 
 @login_required
 def cotizacion_print(request, pk):
+    if request.GET.get('download') == 'jpg':
+        return redirect('cotizaciones:cotizacion_jpg', pk=pk)
     cotizacion, items, institucion = _get_cotizacion_context(pk)
-    download_jpg = request.GET.get('download') == 'jpg'
-    logo_url = _get_logo_url(request, for_pdf=False)
     return render(
         request,
         'cotizaciones_app/cotizacion_cliente_jpg.html',
@@ -352,197 +413,229 @@ def cotizacion_print(request, pk):
             'account_number': '123-456789-0',
             'bank_name': None,
             'show_costs': False,
-            'download_jpg': download_jpg,
             'is_internal': False,
-            'is_jpg': download_jpg,
         },
     )
 
 
+def _respuesta_pdf(pk, tipo, filename_template):
+    cotizacion, items, institucion = _get_cotizacion_context(pk)
+    archivo = abrir_pdf(tipo, cotizacion, items, institucion)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=filename_template.format(correlativo=cotizacion['correlativo']),
+        content_type='application/pdf',
+    )
+
+
 @login_required
 def cotizacion_pdf(request, pk):
+    return _respuesta_pdf(pk, PDF_CLIENTE, 'cotizacion_{correlativo}.pdf')
+
+
+def _respuesta_jpg(request, pk, tipo, filename_template):
+    """Una página (o ``?pagina=N``) se entrega como JPG; varias páginas, como ZIP de JPG."""
     cotizacion, items, institucion = _get_cotizacion_context(pk)
-    html_string = render_to_string(
-        'cotizaciones_app/cotizacion_cliente_pdf.html',
-        {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'account_number': '123-456789-0',
-            'bank_name': None,
-            'show_costs': False,
-            'download_jpg': False,
-            'is_internal': False,
-            'is_jpg': False,
-        },
-        request=request,
-    )
-    response = HttpResponse(content_type='application/pdf')
-    pisa.CreatePDF(html_string, dest=response, link_callback=link_callback)
-    filename = f"cotizacion_{cotizacion.correlativo}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    archivo = abrir_jpg(tipo, cotizacion, items, institucion)
+    nombre = filename_template.format(correlativo=cotizacion['correlativo'])
+    with zipfile.ZipFile(archivo) as paquete:
+        paginas = paquete.namelist()
+        pagina = request.GET.get('pagina')
+        if pagina is None and len(paginas) > 1:
+            archivo.seek(0)
+            return FileResponse(archivo, as_attachment=True, filename=f'{nombre}.zip', content_type='application/zip')
+        try:
+            indice = int(pagina or 1)
+        except ValueError:
+            indice = 0
+        contenido = paquete.read(paginas[indice - 1]) if 1 <= indice <= len(paginas) else None
+    archivo.close()
+    if contenido is None:
+        raise Http404
+    if len(paginas) > 1:
+        nombre = f'{nombre}_p{indice}'
+    response = HttpResponse(contenido, content_type='image/jpeg')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.jpg"'
     return response
 
 
 @login_required
 def cotizacion_cliente_jpg(request, pk):
-    cotizacion, items, institucion = _get_cotizacion_context(pk)
-    return render(
-        request,
-        'cotizaciones_app/cotizacion_cliente_jpg.html',
-        {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'account_number': '123-456789-0',
-            'bank_name': None,
-            'show_costs': False,
-            'download_jpg': True,
-            'is_internal': False,
-            'is_jpg': True,
-        },
-    )
+    return _respuesta_jpg(request, pk, PDF_CLIENTE, 'cotizacion_{correlativo}')
 
 
 @login_required
 def cotizacion_pdf_interno(request, pk):
     _require_staff(request.user)
+    return _respuesta_pdf(pk, PDF_INTERNO, 'cotizacion_{correlativo}_interna.pdf')
+
+
+@login_required
+def cotizacion_pdf_estado(request, pk):
     cotizacion, items, institucion = _get_cotizacion_context(pk)
-    html_string = render_to_string(
-        'cotizaciones_app/cotizacion_print.html',
-        {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'show_costs': True,
-            'download_jpg': False,
-            'is_internal': True,
-            'is_jpg': False,
-        },
-        request=request,
-    )
-    response = HttpResponse(content_type='application/pdf')
-    pisa.CreatePDF(html_string, dest=response, link_callback=link_callback)
-    filename = f"cotizacion_{cotizacion.correlativo}_interna.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    tipos = [PDF_CLIENTE]
+    if user_can_view_costs(request.user):
+        tipos.append(PDF_INTERNO)
+    return JsonResponse(estado_pdf(tipos, cotizacion, items, institucion))
 
 
 @login_required
 def cotizacion_jpg_interno(request, pk):
     _require_staff(request.user)
-    cotizacion, items, institucion = _get_cotizacion_context(pk)
-    return render(
-        request,
-        'cotizaciones_app/cotizacion_cliente_jpg.html',
-        {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'account_number': '123-456789-0',
-            'bank_name': None,
-            'show_costs': False,
-            'download_jpg': download_jpg,
-            'is_internal': False,
-            'is_jpg': download_jpg,
-        },
-    )
+    return _respuesta_jpg(request, pk, PDF_INTERNO, 'cotizacion_{correlativo}_interna')
+
+
+PRODUCTOS_POR_PAGINA = 20
 
 
 @login_required
-def cotizacion_pdf(request, pk):
-    cotizacion, items, institucion = _get_cotizacion_context(pk)
-    html_string = render_to_string(
-        'cotizaciones_app/cotizacion_cliente_pdf.html',
+def producto_buscar(request):
+    """Autocompletado de productos activos: primero los que empiezan con el texto buscado."""
+    termino = request.GET.get('q', '').strip()
+    try:
+        pagina = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        pagina = 1
+
+    productos = ProductoServicio.objects.filter(activo=True).order_by('nombre', 'pk')
+    if termino:
+        # buscar() filtra con los índices trigram (PostgreSQL) o FTS5 (SQLite); el orden por
+        # prefijo solo se evalúa sobre las filas que ya coincidieron.
+        productos = buscar(productos, termino).annotate(
+            prefijo=Case(
+                When(nombre__istartswith=termino, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+        productos = productos.order_by('prefijo', *productos.query.order_by)
+
+    inicio = (pagina - 1) * PRODUCTOS_POR_PAGINA
+    resultados = list(productos.values('pk', 'nombre')[inicio:inicio + PRODUCTOS_POR_PAGINA + 1])
+    return JsonResponse(
         {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'account_number': '123-456789-0',
-            'bank_name': None,
-            'show_costs': False,
-            'download_jpg': False,
-            'is_internal': False,
-            'is_jpg': False,
-        },
-        request=request,
+            'results': [
+                {'id': producto['pk'], 'text': producto['nombre']}
+                for producto in resultados[:PRODUCTOS_POR_PAGINA]
+            ],
+            'more': len(resultados) > PRODUCTOS_POR_PAGINA,
+        }
     )
-    response = HttpResponse(content_type='application/pdf')
-    pisa.CreatePDF(html_string, dest=response, link_callback=link_callback)
-    filename = f"cotizacion_{cotizacion.correlativo}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
 
 
-@login_required
-def cotizacion_cliente_jpg(request, pk):
-    cotizacion, items, institucion = _get_cotizacion_context(pk)
-    return render(
-        request,
-        'cotizaciones_app/cotizacion_cliente_jpg.html',
-        {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'account_number': '123-456789-0',
-            'bank_name': None,
-            'show_costs': False,
-            'download_jpg': True,
-            'is_internal': False,
-            'is_jpg': True,
-        },
+MAX_PRECIOS_POR_CONSULTA = 500
+
+
+def _ids_solicitados(request):
+    ids = []
+    for valor in request.GET.get('ids', '').split(','):
+        valor = valor.strip()
+        if valor.isdigit():
+            ids.append(int(valor))
+    return sorted(set(ids))[:MAX_PRECIOS_POR_CONSULTA]
+
+
+def _etag_precios(request):
+    # La respuesta depende del catálogo, de los ids pedidos y de si el usuario ve costos.
+    clave = '{}|{}|{}'.format(
+        ProductoServicio.version_catalogo(),
+        int(user_can_view_costs(request.user)),
+        ','.join(map(str, _ids_solicitados(request))),
     )
+    return hashlib.sha256(clave.encode()).hexdigest()[:32]
 
 
 @login_required
-def cotizacion_pdf_interno(request, pk):
-    _require_staff(request.user)
-    cotizacion, items, institucion = _get_cotizacion_context(pk)
-    html_string = render_to_string(
-        'cotizaciones_app/cotizacion_print.html',
+@cache_control(private=True, max_age=0, must_revalidate=True)
+@etag(_etag_precios)
+def producto_precios(request):
+    """Precios de varios productos en una sola respuesta (``?ids=1,2,3``)."""
+    ver_costos = user_can_view_costs(request.user)
+    campos = ['pk', 'precio_venta'] + (['precio_costo'] if ver_costos else [])
+    precios = {}
+    for producto in ProductoServicio.objects.filter(pk__in=_ids_solicitados(request)).values(*campos):
+        precio = {'precio_venta': str(producto['precio_venta'])}
+        if ver_costos:
+            precio['precio_costo'] = str(producto['precio_costo'])
+        precios[str(producto['pk'])] = precio
+    return JsonResponse({'precios': precios})
+
+
+@login_required
+def producto_precio(request, pk):
+    producto = get_object_or_404(ProductoServicio, pk=pk)
+    return JsonResponse(
         {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'show_costs': True,
-            'download_jpg': False,
-            'is_internal': True,
-            'is_jpg': False,
-        },
-        request=request,
+            'precio_venta': str(producto.precio_venta),
+            'precio_costo': str(producto.precio_costo),
+        }
     )
-    response = HttpResponse(content_type='application/pdf')
-    pisa.CreatePDF(html_string, dest=response, link_callback=link_callback)
-    filename = f"cotizacion_{cotizacion.correlativo}_interna.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+
+
+LIMITES_ANALITICA = (10, 20, 50, 100)
 
 
 @login_required
-def cotizacion_jpg_interno(request, pk):
+def producto_analitica(request):
+    """Top de productos por venta, ganancia, cantidad o margen en un rango de fechas (solo staff)."""
     _require_staff(request.user)
-    cotizacion, items, institucion = _get_cotizacion_context(pk)
+    fecha_inicio = parse_date(request.GET.get('fecha_inicio', ''))
+    fecha_fin = parse_date(request.GET.get('fecha_fin', ''))
+    # Sin filtro explícito se analizan solo las emitidas; "" (Todos) incluye cualquier estado.
+    estado = request.GET.get('estado', Cotizacion.ESTADO_EMITIDA)
+    if estado not in dict(Cotizacion.ESTADO_CHOICES):
+        estado = ''
+    orden = request.GET.get('orden', 'venta')
+    if orden not in ORDENES_PRODUCTOS:
+        orden = 'venta'
+    try:
+        limite = int(request.GET.get('limite', 20))
+    except ValueError:
+        limite = 20
+    if limite not in LIMITES_ANALITICA:
+        limite = 20
+
+    productos = analitica_productos(
+        desde=fecha_inicio,
+        hasta=fecha_fin,
+        estados=[estado] if estado else None,
+        orden=orden,
+        limite=limite,
+    )
     return render(
         request,
-        'cotizaciones_app/cotizacion_print.html',
+        'cotizaciones_app/producto_analitica.html',
         {
-            'cotizacion': cotizacion,
-            'items': items,
-            'institucion': institucion,
-            'show_costs': True,
-            'download_jpg': True,
-            'is_internal': True,
-            'is_jpg': True,
+            'productos': productos,
+            'estados': Cotizacion.ESTADO_CHOICES,
+            'estado': estado,
+            'orden': orden,
+            'limite': limite,
+            'limites': LIMITES_ANALITICA,
         },
     )
 
 
 @login_required
-def producto_precio(request, pk):
-    producto = get_object_or_404(ProductoServicio, pk=pk)
-    return JsonResponse(
-        {
-            'precio_venta': str(producto.precio_venta),
-            'precio_costo': str(producto.precio_costo),
-        }
-    )
+def cotizacion_exportar(request):
+    """Exporta el listado filtrado en CSV (por defecto) o XLSX; ``detalle=1`` exporta una fila por ítem."""
+    cotizaciones = filtrar_cotizaciones(Cotizacion.objects.order_by('-fecha_emision', '-id'), request.GET)
+    ver_costos = user_can_view_costs(request.user)
+    detalle = request.GET.get('detalle') == '1'
+    if detalle:
+        filas = filas_items(cotizaciones, ver_costos)
+    else:
+        filas = filas_cotizaciones(cotizaciones, ver_costos)
+    nombre = 'cotizaciones_detalle_{}' if detalle else 'cotizaciones_{}'
+    nombre = nombre.format(timezone.localdate().strftime('%Y%m%d'))
+    if request.GET.get('formato') == 'xlsx':
+        return respuesta_xlsx(filas, nombre)
+    return respuesta_csv(filas, nombre)
+
+
+@login_required
+def metricas(request):
+    """Métricas por vista de este proceso en formato de texto de Prometheus (solo staff)."""
+    _require_staff(request.user)
+    return HttpResponse(metricas_registro.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'cotizaciones_app.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,7 +59,8 @@ ROOT_URLCONF = 'upcv_app.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render para cotizaciones_app.metricas
+        'BACKEND': 'cotizaciones_app.metricas.PlantillasMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -100,6 +102,35 @@ DATABASES = {
     }
 }
 
+# El formset de ítems envía unos 5 campos por línea; el límite de Django (1000) rechaza
+# con 400 cualquier cotización de más de ~200 líneas.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+
+# Caché compartida entre los procesos del servidor (frase del día, conteos, fragmentos de detalle).
+# Al pasar MAX_ENTRIES, FileBasedCache borra 1/CULL_FREQUENCY de las entradas; con el valor por
+# omisión (300) los fragmentos de detalle la recortarían a cada rato. Todo lo que guarda es
+# derivado: perder una entrada solo cuesta recalcularla.
+# 'versiones' guarda solo los tokens de almacen_app/versiones.py, unas pocas claves fijas que
+# nunca llegan a MAX_ENTRIES, así que no se recortan junto con la caché general.
+# Con varios servidores, ambas pueden pasar a un backend compartido (p. ej. Redis).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'django',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'versiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'versiones',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
 
 
 # Password validation
@@ -175,3 +206,29 @@ EMAIL_HOST_USER = 'informatica@upcv.gob.gt'
 EMAIL_HOST_PASSWORD = 'xtdj nvwz ymyw lqyr'  
 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+
+# Guarda los grupos del usuario en la sesión (se invalidan al cambiar cualquier grupo)
+ALMACEN_ROLES_EN_SESION = True
+
+# Correlativos de cotizaciones
+# ASIGNADOR: ruta a una clase de cotizaciones_app.correlativos; None elige SEQUENCE en
+# PostgreSQL y reserva por bloques en los demás motores.
+COTIZACIONES_CORRELATIVO_ASIGNADOR = None
+COTIZACIONES_CORRELATIVO_BLOQUE = 20
+COTIZACIONES_CORRELATIVO_DIGITOS = 5
+COTIZACIONES_CORRELATIVO_SERIE_ANUAL = False  # True antepone el año: 2026-00001
+
+# Caché en disco de PDF de cotizaciones (desalojo LRU al superar el tamaño máximo)
+COTIZACIONES_PDF_CACHE_DIR = BASE_DIR / 'cache' / 'cotizaciones'
+COTIZACIONES_PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Cada cuánto se vuelve a medir el directorio aunque el total estimado no pase el máximo
+COTIZACIONES_PDF_CACHE_RECORTE_SEGUNDOS = 300
+# Procesos que generan los PDF en segundo plano al emitir una cotización (0 = desactivado)
+COTIZACIONES_PDF_WORKERS = 2
+# Resolución de los JPG rasterizados desde el PDF
+COTIZACIONES_JPG_DPI = 200
+
+# Conteos de los listados: exactos hasta este límite; por encima, estimados y en caché (segundos)
+COTIZACIONES_CONTEO_EXACTO_HASTA = 1000
+COTIZACIONES_CONTEO_TTL = 60